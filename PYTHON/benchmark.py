@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from ruby_lib import *
+
+# Heavy optional dependencies that must not be loaded by importing ruby_lib
+HEAVY_MODULES = ['scipy', 'matplotlib', 'pandas']
+# Largest admissible import time of ruby_lib on top of NumPy, in seconds
+IMPORT_OVERHEAD_LIMIT = 0.1
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'benchmark_baseline.json')
+DEFAULT_SIZES = [1000, 10000, 100000]
+# Admissible ratios to the baseline before a measure is reported as a
+# regression. Output size is deterministic, time and memory are not
+TOL_TIME = 1.5
+TOL_MEMORY = 1.25
+TOL_BYTES = 1.01
+# Number of rows of the calibration workload
+CALIBRATION_ROWS = 100000
+
+IMPORT_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import %s
+print(time.perf_counter() - start)
+print(' '.join(m for m in %r if m in sys.modules))
+'''
+
+def time_import(module, repeat = 5):
+    """
+    Imports module in fresh interpreters and returns the best wall time, in
+    seconds, with the heavy modules found in sys.modules afterwards.
+
+    Parameters
+    ----------
+    module : str
+        Name of the imported module
+    repeat : int (optional)
+        Number of interpreters started, the fastest one is kept
+
+    """
+    times = []
+    for index in range(repeat):
+        result = subprocess.run([sys.executable, '-c',
+                                 IMPORT_SCRIPT % (module, HEAVY_MODULES)],
+                                cwd = os.path.dirname(os.path.abspath(__file__)),
+                                capture_output = True, text = True, check = True)
+        lines = result.stdout.split('\n')
+        times.append(float(lines[0]))
+        loaded = lines[1].split()
+
+    return min(times), loaded
+
+def benchmark_import(repeat = 5):
+    """
+    Checks that importing ruby_lib requires NumPy alone and adds less than
+    IMPORT_OVERHEAD_LIMIT to the import time of NumPy.
+
+    Returns
+    -------
+    list
+        Failure messages, empty if the benchmark passed
+
+    """
+    numpy_time, _ = time_import('numpy', repeat)
+    ruby_lib_time, loaded = time_import('ruby_lib', repeat)
+    overhead = ruby_lib_time - numpy_time
+
+    print('import numpy    %8.1f ms' % (1000 * numpy_time))
+    print('import ruby_lib %8.1f ms (%+.1f ms)' % (1000 * ruby_lib_time,
+                                                  1000 * overhead))
+
+    failures = []
+    if loaded:
+        failures.append('importing ruby_lib loads ' + ', '.join(loaded))
+    if overhead > IMPORT_OVERHEAD_LIMIT:
+        failures.append('importing ruby_lib takes %.1f ms more than numpy, '
+                        'limit is %.1f ms' % (1000 * overhead,
+                                              1000 * IMPORT_OVERHEAD_LIMIT))
+    return failures
+
+def calibrate(repeat = 9):
+    """
+    Returns the best wall time, in seconds, of a fixed workload of NumPy
+    arithmetic and float formatting, the kind of work done by the ruby_*
+    functions, written without them. Times compared with the baseline are
+    relative to it, so that the baseline holds on other machines too.
+    """
+    values = 1000 * np.random.default_rng(0).random((CALIBRATION_ROWS, 3))
+    best = np.inf
+    for index in range(repeat):
+        start = time.perf_counter()
+        rows = (39.37 * values + 1).tolist()
+        '\n'.join(['[%r,%r,%r]' % tuple(row) for row in rows])
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# Synthetic workloads. Each one builds its data from the size and a random
+# generator and returns a function drawing it into an open script, so that
+# only the ruby_* calls are measured.
+
+def workload_point(rng, size):
+    XYZ = 100 * rng.random((size, 3))
+    return lambda file: ruby_point(file, XYZ)
+
+def workload_point_voxel(rng, size):
+    # Thinned to about a tenth of the points
+    XYZ = 100 * rng.random((size, 3))
+    voxel_size = 100 / np.cbrt(max(1, size // 10))
+    return lambda file: ruby_point(file, XYZ, voxel_size = voxel_size)
+
+def workload_line(rng, size):
+    XYZ = np.cumsum(rng.standard_normal((size, 3)), axis = 0)
+    return lambda file: ruby_line(file, XYZ)
+
+def workload_tin(rng, size):
+    # Regular grid of about size points, split into two triangles per cell
+    n = max(2, int(np.ceil(np.sqrt(size))))
+    x, y = np.meshgrid(np.arange(n, dtype = float), np.arange(n, dtype = float))
+    XYZ = np.column_stack((x.ravel(), y.ravel(), rng.random(n * n)))
+    corner = (np.arange(n - 1)[:, np.newaxis] * n + np.arange(n - 1)).ravel()
+    triangles = np.concatenate((
+        np.column_stack((corner, corner + 1, corner + n + 1)),
+        np.column_stack((corner, corner + n + 1, corner + n))))
+    return lambda file: ruby_tin(file, XYZ, triangles)
+
+def workload_grid_dem(rng, size):
+    # The grid of workload_tin, given by its heights only
+    n = max(2, int(np.ceil(np.sqrt(size))))
+    z = rng.random((n, n))
+    return lambda file: ruby_grid_dem(file, z, 0, 0, 1, 1)
+
+def workload_ellipsoid(rng, size):
+    P = 100 * rng.random((size, 3))
+    A = rng.standard_normal((size, 3, 3))
+    K = np.matmul(A, np.swapaxes(A, 1, 2)) + 0.1 * np.eye(3)
+    return lambda file: ruby_ellipsoid(file, P, K)
+
+def workload_pose(rng, size):
+    P = 100 * rng.random((size, 1, 3))
+    R, _ = np.linalg.qr(rng.standard_normal((size, 3, 3)))
+    def draw(file):
+        for index in range(size):
+            ruby_pose(file, P[index], R[index])
+    return draw
+
+def workload_arrow(rng, size):
+    P = 100 * rng.random((size, 3))
+    v = rng.standard_normal((size, 3))
+    return lambda file: ruby_arrow(file, P, v, layout = 'rows')
+
+def workload_plane(rng, size):
+    # A single polygon with size vertices on a circle
+    angle = 2 * np.pi * np.arange(size) / size
+    XYZ = np.column_stack((np.cos(angle), np.sin(angle), np.zeros(size)))
+    return lambda file: ruby_plane(file, 10 * XYZ)
+
+def workload_resection(rng, size):
+    P_theodolite = np.array([[0., 0, 0]])
+    XYZ_antenna = 100 * rng.random((size, 3))
+    return lambda file: ruby_resection(file, P_theodolite, XYZ_antenna)
+
+WORKLOADS = {'point': workload_point,
+             'point_voxel': workload_point_voxel,
+             'line': workload_line,
+             'tin': workload_tin,
+             'grid_dem': workload_grid_dem,
+             'ellipsoid': workload_ellipsoid,
+             'pose': workload_pose,
+             'arrow': workload_arrow,
+             'plane': workload_plane,
+             'resection': workload_resection}
+
+def run_workload(name, size, directory, unit, seed = 0):
+    """
+    Writes one workload to a fresh script and measures it.
+
+    Parameters
+    ----------
+    name : str
+        Key of WORKLOADS
+    size : int
+        Number of elements drawn
+    directory : str
+        Directory receiving the generated script
+    unit : float
+        Calibration time (s), see calibrate
+    seed : int (optional)
+        Seed of the random data
+
+    Returns
+    -------
+    dict
+        Wall time (s), wall time relative to unit, peak traced memory (bytes)
+        and script size (bytes) per element
+
+    """
+    draw = WORKLOADS[name](np.random.default_rng(seed), size)
+    path = os.path.join(directory, 'benchmark_' + name + '.rb')
+
+    # Time and memory are measured in separate runs, as tracing allocations
+    # slows the generator down. Small workloads keep the best of a few runs
+    elapsed = np.inf
+    for index in range(max(1, min(5, 100000 // size))):
+        file = ruby_create(path)
+        start = time.perf_counter()
+        draw(file)
+        file.close()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    output = os.path.getsize(path)
+
+    file = ruby_create(path)
+    tracemalloc.start()
+    draw(file)
+    file.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    os.remove(path)
+
+    return {'time': elapsed / size,
+            'relative_time': elapsed / size / unit,
+            'memory': peak / size,
+            'bytes': output / size}
+
+def compare(results, baseline):
+    """
+    Compares results with baseline, both dicts of measures keyed by
+    'name:size' as returned by benchmark_primitives. Wall times are compared
+    relative to the calibration time only, absolute times depending on the
+    machine.
+
+    Returns
+    -------
+    list
+        Failure messages, one per measure exceeding its tolerance
+
+    """
+    tolerances = {'relative_time': TOL_TIME, 'memory': TOL_MEMORY,
+                  'bytes': TOL_BYTES}
+    failures = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        for measure, tolerance in tolerances.items():
+            if measure not in baseline[key]:
+                continue
+            ratio = results[key][measure] / max(baseline[key][measure], 1e-300)
+            if ratio > tolerance:
+                failures.append('%s %s is %.2f times the baseline'
+                                % (key, measure, ratio))
+    return failures
+
+def benchmark_primitives(names, sizes):
+    """
+    Runs the workloads names at every size and prints one line per run.
+
+    Returns
+    -------
+    dict
+        Measures of every run, keyed by 'name:size'
+
+    """
+    results = {}
+    unit = calibrate()
+    print('calibration %8.1f ms' % (1000 * unit))
+    print('%-11s %9s %12s %12s %12s %12s' % ('primitive', 'size', 'us/elt',
+                                             'cal/Melt', 'bytes/elt',
+                                             'memory/elt'))
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            for size in sizes:
+                measures = run_workload(name, size, directory, unit)
+                results[name + ':' + str(size)] = measures
+                print('%-11s %9d %12.2f %12.3g %12.1f %12.1f'
+                      % (name, size, 1e6 * measures['time'],
+                         1e6 * measures['relative_time'], measures['bytes'],
+                         measures['memory']))
+    return results
+
+RSS_SCRIPT = '''
+import numpy as np
+from ruby_lib import *
+from loaders import load_array, peak_rss
+load = np.load if %r == 'load' else load_array
+file = ruby_create(%r)
+ruby_ellipsoid(file, load(%r), load(%r))
+ruby_close(file)
+print(peak_rss())
+'''
+
+def benchmark_rss(size):
+    """
+    Compares the peak resident set size of drawing size ellipsoids from .npy
+    files read into memory with np.load, or memory mapped with load_array.
+    Each way runs in a fresh interpreter, as the peak is kept by the process.
+    """
+    rng = np.random.default_rng(0)
+    A = rng.standard_normal((size, 3, 3))
+    with tempfile.TemporaryDirectory() as directory:
+        P_path = os.path.join(directory, 'P.npy')
+        K_path = os.path.join(directory, 'K.npy')
+        np.save(P_path, 100 * rng.random((size, 3)))
+        np.save(K_path, np.matmul(A, np.swapaxes(A, 1, 2)) + 0.1 * np.eye(3))
+        del A
+
+        for way in ['load', 'load_array']:
+            script = RSS_SCRIPT % (way, os.path.join(directory, 'rss.rb'),
+                                   P_path, K_path)
+            result = subprocess.run([sys.executable, '-c', script],
+                                    cwd = os.path.dirname(os.path.abspath(__file__)),
+                                    capture_output = True, text = True,
+                                    check = True)
+            peak = result.stdout.split()[-1]
+            print('ellipsoid %9d %-10s peak RSS %s' % (size, way,
+                'unknown' if peak == 'None' else '%.1f MB' % (int(peak) / 1e6)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmarks ruby_lib. '
+        'Fails when a measure regresses with respect to the stored baseline.')
+    parser.add_argument('--sizes', default = ','.join(map(str, DEFAULT_SIZES)),
+        help = 'comma separated element counts, e.g. 1e3,1e5,1e7')
+    parser.add_argument('--primitives', default = ','.join(WORKLOADS),
+        help = 'comma separated workloads among ' + ', '.join(WORKLOADS))
+    parser.add_argument('--rss', type = float, default = 0,
+        help = 'number of ellipsoids drawn from .npy files to compare the '
+               'peak RSS of np.load and load_array')
+    parser.add_argument('--save', action = 'store_true',
+        help = 'store the results as the new baseline')
+    args = parser.parse_args()
+
+    failures = benchmark_import()
+
+    sizes = [int(float(size)) for size in args.sizes.split(',')]
+    results = benchmark_primitives(args.primitives.split(','), sizes)
+    if args.rss:
+        benchmark_rss(int(args.rss))
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as baseline_file:
+                baseline = json.load(baseline_file)
+        baseline.update(results)
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent = 1, sort_keys = True)
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as baseline_file:
+            failures += compare(results, json.load(baseline_file))
+
+    for failure in failures:
+        print('FAILED: ' + failure)
+    sys.exit(1 if failures else 0)
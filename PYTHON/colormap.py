@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+import copy
+import numpy as np
+import numbers
+
+# Colormaps as evenly spaced RGB stops, linearly interpolated in between.
+# They follow the colormaps of the same name of Matplotlib, which is not
+# required.
+COLORMAPS = {
+    'viridis': [[68, 1, 84], [72, 40, 120], [62, 74, 137], [49, 104, 142],
+                [38, 130, 142], [31, 158, 137], [53, 183, 121],
+                [109, 205, 89], [180, 222, 44], [253, 231, 37]],
+    'jet': [[0, 0, 128], [0, 0, 255], [0, 128, 255], [0, 255, 255],
+            [128, 255, 128], [255, 255, 0], [255, 128, 0], [255, 0, 0],
+            [128, 0, 0]],
+    'coolwarm': [[59, 76, 192], [124, 159, 249], [192, 212, 245],
+                 [242, 203, 183], [238, 132, 104], [180, 4, 38]],
+    'terrain': [[51, 51, 153], [0, 153, 255], [0, 204, 102], [255, 255, 153],
+                [128, 92, 84], [255, 255, 255]],
+    'gray': [[0, 0, 0], [255, 255, 255]]}
+
+class ColorScale:
+    """
+    Colors the elements of ruby_point, ruby_tin or ruby_arrow after one scalar
+    value each, passed as their color. The range [vmin, vmax] is divided into
+    levels equal bins, and each bin is drawn with the color of the colormap
+    at its center. Only levels materials are therefore ever created, however
+    many elements there are, and the elements of a bin are written together
+    with their common material.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        N or N-by-1 array of values, one per element. May be memory-mapped
+    colormap : str, np.ndarray (optional)
+        One of 'viridis' (default), 'jet', 'coolwarm', 'terrain', 'gray', or
+        M-by-3 array of RGB stops in [0, 255]
+    levels : int (optional)
+        Number of colors of the palette, 16 by default
+    vmin, vmax : float (optional)
+        Values drawn with the first and last color, the range of values by
+        default. Values out of the range take the nearest color
+
+    Examples
+    --------
+    Colors a point cloud by height
+    >>>ruby_point(file, XYZ, issymbolic = 1, mode = 'components',
+    >>>    color = ColorScale(XYZ[:, 2], 'terrain', levels = 32))
+
+    Colors the triangles of a TIN by the mean slope of their points
+    >>>ruby_tin(file, XYZ, triangles, color = ColorScale(slope, vmax = 45))
+
+    """
+
+    def __init__(self, values, colormap = 'viridis', levels = 16, vmin = None,
+                 vmax = None):
+        if not (isinstance(values, np.ndarray) and values.ndim in (1, 2) \
+                and (values.ndim == 1 or values.shape[1] == 1)):
+            raise ValueError('Error in ColorScale. values should be an N or ' \
+                'N-by-1 numpy.array.')
+        if not (np.issubdtype(values.dtype, np.integer) \
+                or np.issubdtype(values.dtype, np.floating)):
+            raise TypeError('Error in ColorScale. values should consist of ' \
+                'only numeric values.')
+        if not (isinstance(levels, numbers.Integral) and levels >= 1):
+            raise ValueError('Error in ColorScale. levels should be a ' \
+                'positive integer.')
+
+        if isinstance(colormap, str):
+            if colormap not in COLORMAPS:
+                raise ValueError('Error in ColorScale. Not a valid colormap, ' \
+                    'expects one of ' + ', '.join(COLORMAPS))
+            stops = np.array(COLORMAPS[colormap], dtype = float)
+        else:
+            stops = np.asarray(colormap, dtype = float)
+            if not (stops.ndim == 2 and stops.shape[0] >= 1 \
+                    and stops.shape[1] == 3 \
+                    and ((stops >= 0) & (stops <= 255)).all()):
+                raise ValueError('Error in ColorScale. colormap should be an ' \
+                    'M-by-3 array of RGB values in [0, 255].')
+
+        # A view, so that memory-mapped values are not loaded
+        self.values = values.reshape(-1)
+        if np.issubdtype(values.dtype, np.floating) \
+            and not np.isfinite(self.values).all():
+            raise ValueError('Error in ColorScale. values should consist of ' \
+                'only finite values.')
+        if self.values.size == 0 and (vmin is None or vmax is None):
+            raise ValueError('Error in ColorScale. vmin and vmax are ' \
+                'required without values.')
+        self.vmin = float(self.values.min()) if vmin is None else float(vmin)
+        self.vmax = float(self.values.max()) if vmax is None else float(vmax)
+        self.levels = int(levels)
+
+        # Colors of the bins, at their centers
+        centers = (np.arange(self.levels) + 0.5) / self.levels \
+                * (stops.shape[0] - 1)
+        self.palette = np.rint(np.column_stack(
+            [np.interp(centers, np.arange(stops.shape[0]), stops[:, i])
+             for i in range(3)])).astype(int)
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def quantize(self, values):
+        """
+        Returns the palette entries of an array of values.
+        """
+        if not (self.vmax > self.vmin):
+            return np.zeros(np.shape(values), dtype = np.intp)
+        entries = np.floor((np.asarray(values, dtype = float) - self.vmin) \
+                           / (self.vmax - self.vmin) * self.levels)
+        return np.clip(entries, 0, self.levels - 1).astype(np.intp)
+
+    def entries(self, start = 0, stop = None):
+        """
+        Returns the palette entries of the elements start to stop.
+        """
+        return self.quantize(self.values[start:stop])
+
+    def blocks(self, entries):
+        """
+        Yields the color of each palette entry used in entries, with the
+        boolean mask of the elements of that entry, in palette order.
+        """
+        for entry in np.unique(entries):
+            yield self.color(entry), entries == entry
+
+    def runs(self, entries):
+        """
+        Yields the color of each run of consecutive elements of the same
+        palette entry in entries, with the slice of the run, in order.
+        """
+        if len(entries) == 0:
+            return
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(entries)) + 1,
+                                 [len(entries)]))
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            yield self.color(entries[start]), slice(start, stop)
+
+    def take(self, rows):
+        """
+        Returns the color scale of the given rows of values, with the same
+        range and palette. Given several rows per entry, e.g. the points of
+        triangles, each entry takes the mean value of its rows.
+        """
+        scale = copy.copy(self)
+        scale.values = self.values[rows]
+        if scale.values.ndim > 1:
+            scale.values = np.mean(scale.values, axis = -1)
+        return scale
+
+    def color(self, entry):
+        """
+        Returns the color of a palette entry as an (r, g, b) tuple, which is
+        a valid color for every ruby_* function.
+        """
+        return tuple(int(c) for c in self.palette[entry])
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+import numpy as np
+
+from validation import check_array, check_number, check_rotation
+
+# Regions of interest outside of which Scene drops the recorded elements
+# before anything is written. Elements are tested as a whole, as arrays of
+# their vertices: an element is kept when it may reach into the region, so
+# that elements crossing the boundary are drawn entirely. The box and the
+# frustum are convex and given by their bounding planes, an element being
+# dropped when all its vertices lie outside the same plane. This may keep a
+# few elements passing close to an edge of the region, never drops one that
+# reaches into it.
+#
+# Culling is applied by Scene only: the ruby_* functions take no region and
+# write everything they are given. When calling them directly, select the
+# elements beforehand with the same vectorized tests, e.g.
+#
+#   region = Box([0, 0, 0], [100, 100, 20])
+#   ruby_point(file, XYZ[region.contains(XYZ)])
+#   ruby_tin(file, XYZ, triangles[region.reaches(XYZ[triangles])])
+#   keep = region.reaches(np.stack((P, P + v), axis = 1))
+#   ruby_arrow(file, P[keep], v[keep])
+
+class Region:
+    """
+    Convex region of the points X such that normals X <= offsets, for each
+    row of the M-by-3 array normals and M array offsets.
+    """
+
+    def __init__(self, normals, offsets):
+        self.normals = np.asarray(normals, dtype = float)
+        self.offsets = np.asarray(offsets, dtype = float)
+
+    def contains(self, XYZ):
+        """
+        Returns whether each row of the N-by-3 array XYZ is in the region.
+        """
+        return np.all(np.matmul(XYZ, self.normals.T) <= self.offsets, axis = 1)
+
+    def reaches(self, vertices):
+        """
+        Returns whether each element given by the N-by-K-by-3 array of its
+        K vertices may reach into the region.
+        """
+        outside = np.matmul(vertices, self.normals.T) > self.offsets
+        return ~np.any(np.all(outside, axis = 1), axis = 1)
+
+class Box(Region):
+    """
+    Axis-aligned box.
+
+    Parameters
+    ----------
+    low, high : np.ndarray, list
+        Corners of the box with the smallest and largest coordinates (m)
+
+    Examples
+    --------
+    Keeps the elements of a scene in the site
+    >>>scene = Scene(file, region = Box([2600100, 1200100, 400],
+    >>>                                 [2600300, 1200250, 480]))
+
+    """
+
+    def __init__(self, low, high):
+        low = np.asarray(low, dtype = float).reshape(-1)
+        high = np.asarray(high, dtype = float).reshape(-1)
+        if not (low.size == 3 and high.size == 3 \
+                and np.isfinite(low).all() and np.isfinite(high).all() \
+                and (low <= high).all()):
+            raise ValueError('Error in Box. low and high should be 3 ' \
+                + 'finite values, with low <= high.')
+
+        Region.__init__(self, np.concatenate((np.eye(3), -np.eye(3))),
+                        np.concatenate((high, -low)))
+
+class Frustum(Region):
+    """
+    Field of view of a pose drawn by ruby_pose, with the same parameters:
+    the pyramid with apex P through the image of half width width and half
+    height height at distance focal along -Z.
+
+    Parameters
+    ----------
+    P : np.ndarray
+        1-by-3 array of coordinates of the center of the projection (m)
+    R : np.ndarray
+        3-by-3 orientation of the pose
+    focal, width, height : float (optional)
+        See ruby_pose
+    far : float (optional)
+        Largest distance (m) along the view, unbounded by default
+
+    Examples
+    --------
+    Keeps the elements of a scene seen from a pose
+    >>>ruby_pose(file, P, R, focal = 0.5)
+    >>>scene = Scene(file, region = Frustum(P, R, focal = 0.5, far = 200))
+
+    """
+
+    def __init__(self, P, R, focal = 0.2, width = 0.1, height = 0.1,
+                 far = None):
+        check_array('Frustum', 'P', P, (1, 3))
+        check_rotation('Frustum', 'R', R)
+        for label, value in (('focal', focal), ('width', width),
+                             ('height', height)) \
+                + ((('far', far),) if far is not None else ()):
+            check_number('Frustum', label, value)
+            if not (value > 0):
+                raise ValueError('Error in Frustum. ' + label + ' should be ' \
+                    + 'strictly positive.')
+
+        # Planes in the frame of the pose, where the view is along -Z
+        local = np.array([[focal, 0, width], [-focal, 0, width],
+                          [0, focal, height], [0, -focal, height],
+                          [0, 0, 1]], dtype = float)
+        offsets = np.zeros(5)
+        if far is not None:
+            local = np.concatenate((local, [[0, 0, -1]]))
+            offsets = np.append(offsets, far)
+        normals = np.matmul(local, np.asarray(R, dtype = float).T)
+        Region.__init__(self, normals,
+                        offsets + np.matmul(normals, np.reshape(P, 3)))
+
+class Polygon(Region):
+    """
+    Vertical prism over a polygon of the XY plane, e.g. the boundary of a
+    construction site. The polygon need not be convex. Elements are kept
+    when their projection on the XY plane meets the polygon, the vertices of
+    elements of more than two vertices going around a convex outline in XY.
+
+    Parameters
+    ----------
+    XY : np.ndarray
+        N-by-2 array of the vertices of the polygon, in order
+    zmin, zmax : float (optional)
+        Heights (m) bounding the prism, unbounded by default
+
+    Examples
+    --------
+    Keeps the elements of a scene in the site below 500 m
+    >>>scene = Scene(file, region = Polygon(site_XY, zmax = 500))
+
+    """
+
+    def __init__(self, XY, zmin = None, zmax = None):
+        check_array('Polygon', 'XY', XY, (None, 2))
+        if not (XY.shape[0] >= 3):
+            raise ValueError('Error in Polygon. XY should have at least 3 ' \
+                + 'vertices.')
+        normals = []
+        offsets = []
+        for label, value, sign in (('zmin', zmin, -1), ('zmax', zmax, 1)):
+            if value is not None:
+                check_number('Polygon', label, value)
+                normals.append([0, 0, sign])
+                offsets.append(sign * value)
+
+        Region.__init__(self, np.reshape(normals, (-1, 3)), offsets)
+        self.XY = np.asarray(XY, dtype = float)
+        self.edges = np.stack((self.XY, np.roll(self.XY, -1, axis = 0)),
+                              axis = 1)
+
+    def contains(self, XYZ):
+        return Region.contains(self, XYZ) & self._inside(XYZ[:, 0:2])
+
+    def reaches(self, vertices):
+        reaches = Region.reaches(self, vertices)
+        count, corners = vertices.shape[0:2]
+        # A vertex in the polygon
+        meets = np.any(self._inside(vertices[:, :, 0:2].reshape(-1, 2))
+                       .reshape(count, corners), axis = 1)
+        # An edge crossing the outline
+        for k in range(corners if corners > 2 else 1):
+            meets |= self._crosses(vertices[:, k, 0:2],
+                                   vertices[:, (k + 1) % corners, 0:2])
+        # The polygon within the element, in a triangle of its outline
+        for k in range(1, corners - 1):
+            meets |= _in_triangle(self.XY[0], vertices[:, [0, k, k + 1], 0:2])
+        return reaches & meets
+
+    def _inside(self, XY):
+        """
+        Returns whether each row of XY is inside the polygon, by the parity
+        of the crossings of a ray along +X with the edges.
+        """
+        inside = np.zeros(XY.shape[0], dtype = bool)
+        x = XY[:, 0]
+        y = XY[:, 1]
+        for (x1, y1), (x2, y2) in self.edges:
+            if y1 == y2:
+                continue
+            spans = (y1 > y) != (y2 > y)
+            inside ^= spans & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+        return inside
+
+    def _crosses(self, A, B):
+        """
+        Returns whether each segment of rows A to B crosses an edge of the
+        polygon, touching included.
+        """
+        crosses = np.zeros(A.shape[0], dtype = bool)
+        low = np.minimum(A, B)
+        high = np.maximum(A, B)
+        for C, D in self.edges:
+            overlap = np.all((low <= np.maximum(C, D)) \
+                             & (high >= np.minimum(C, D)), axis = 1)
+            crosses |= overlap \
+                & (_side(A, B, C) * _side(A, B, D) <= 0) \
+                & (_side(C, D, A) * _side(C, D, B) <= 0)
+        return crosses
+
+def _side(A, B, C):
+    """
+    Returns the sign of the turn from A to B to C in the XY plane, with
+    broadcasting.
+    """
+    return np.sign((B[..., 0] - A[..., 0]) * (C[..., 1] - A[..., 1]) \
+                   - (B[..., 1] - A[..., 1]) * (C[..., 0] - A[..., 0]))
+
+def _in_triangle(point, triangles):
+    """
+    Returns whether point is in each triangle of the N-by-3-by-2 array
+    triangles, edges included.
+    """
+    sides = np.stack([_side(triangles[:, k], triangles[:, (k + 1) % 3], point)
+                      for k in range(3)], axis = 1)
+    return np.all(sides >= 0, axis = 1) | np.all(sides <= 0, axis = 1)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+import numpy as np
+
+# Relative tolerance on the area of triangles in the XY plane, below which
+# a collapse is taken to fold the surface
+TOL_AREA = 1e-12
+
+# Simplification of TIN surfaces by edge collapse, ordered by the quadric
+# error metric of Garland and Heckbert. Each pass collapses a set of vertices
+# that are not neighbours, so that the collapses are independent and every
+# step is a whole-array NumPy operation. Vertices are collapsed onto one of their neighbours and
+# keep their measured position, and boundary vertices are kept, so the outline
+# of the surface does not change. Every removed vertex is tracked in the
+# triangle above or below it, which gives its exact vertical error.
+
+def decimate_tin(XYZ, triangles, target_faces = None, max_vertical_error = None):
+    """
+    Removes vertices of the TIN (XYZ, triangles) until it has at most
+    target_faces triangles, or until no vertex can be removed without a
+    vertical error above max_vertical_error, whichever comes first.
+
+    The vertical error is the largest vertical distance between a vertex of
+    the given TIN and the simplified surface. Collapses that would fold a
+    triangle over in the XY plane are not made.
+
+    Parameters
+    ----------
+    XYZ : np.ndarray
+        N-by-3 array of coordinates
+    triangles : np.ndarray
+        M-by-3 array of indices of the rows of XYZ
+    target_faces : int (optional)
+        Number of triangles to reach
+    max_vertical_error : float (optional)
+        Largest vertical error allowed, in the units of XYZ
+
+    Returns
+    -------
+    np.ndarray
+        Coordinates of the remaining vertices
+    np.ndarray
+        Triangles, as indices of the remaining vertices
+    np.ndarray
+        Indices of the remaining vertices in XYZ
+    dict
+        'faces': number of triangles left, 'ratio': that number over the
+        number of triangles given, 'max_vertical_error': vertical error
+
+    Examples
+    --------
+    Keeps a tenth of the triangles
+    >>>XYZ, triangles, kept, report = decimate_tin(XYZ, triangles,
+    >>>    target_faces = triangles.shape[0] // 10)
+
+    """
+    V = np.asarray(XYZ, dtype = float)
+    T = np.array(triangles, dtype = np.intp)
+    n = V.shape[0]
+    faces = T.shape[0]
+
+    target = 0 if target_faces is None else target_faces
+    budget = np.inf if max_vertical_error is None else max_vertical_error
+    if target_faces is None and max_vertical_error is None:
+        target = faces
+
+    extent = np.ptp(V[:, :2], axis = 0).max() if n > 0 else 0
+    tol_area = TOL_AREA * max(extent, 1) ** 2
+
+    sign = np.sign(xy_area(V, T))
+    Q = vertex_quadrics(V, T)
+    H = np.column_stack((V, np.ones(n)))
+    # Outer products of the homogeneous coordinates, so that the error of
+    # the quadric Q at a vertex is the dot product with Q
+    HH = (H[:, :, np.newaxis] * H[:, np.newaxis, :]).reshape(n, 16)
+    # Triangle above or below each removed vertex, -1 for the others
+    host = np.full(n, -1, dtype = np.intp)
+    error = np.zeros(n)
+
+    rejected = np.zeros(n, dtype = bool)
+    retried = False
+    while T.shape[0] > target:
+        a, b, locked = edges(T, n)
+
+        # Collapses along the edges either way, costed by the quadric error
+        # at the position of the kept vertex
+        remove = np.concatenate((a, b))
+        keep = np.concatenate((b, a))
+        M = Q.reshape(n, 16)
+        cost = np.einsum('ij,ij->i', M[remove] + M[keep], HH[keep])
+        allowed = ~locked[remove] & ~rejected[remove]
+
+        selected = independent_collapses(remove, keep, cost, allowed, n)
+        if selected.size == 0:
+            if retried or not rejected.any():
+                break
+            # The surface changed around some rejected vertices, try them
+            # again
+            rejected[:] = False
+            retried = True
+            continue
+        if target_faces is not None:
+            # Interior collapses remove two triangles each
+            selected = selected[:max(1, (T.shape[0] - target + 1) // 2)]
+
+        remove = remove[selected]
+        keep = keep[selected]
+        valid, moves = check_collapses(V, T, sign, host, remove, keep,
+                                       tol_area, budget)
+        rejected[remove[~valid]] = True
+        if not valid.any():
+            continue
+        retried = False
+
+        T, sign, host, points, distance = collapse(T, sign, host, valid, moves)
+        error[points] = distance
+        np.add.at(Q, keep[valid], Q[remove[valid]])
+
+    kept = np.unique(T)
+    index = np.full(n, -1, dtype = np.intp)
+    index[kept] = np.arange(kept.size)
+
+    report = {'faces': T.shape[0],
+              'ratio': T.shape[0] / faces if faces > 0 else 1.0,
+              'max_vertical_error': float(error.max()) if n > 0 else 0.0}
+    return V[kept], index[T], kept, report
+
+def xy_area(V, T):
+    """
+    Returns the signed area of the triangles T in the XY plane, positive for
+    counterclockwise triangles.
+    """
+    A = V[T[:, 0]]
+    B = V[T[:, 1]]
+    C = V[T[:, 2]]
+    return 0.5 * ((B[:, 0] - A[:, 0]) * (C[:, 1] - A[:, 1]) \
+                  - (C[:, 0] - A[:, 0]) * (B[:, 1] - A[:, 1]))
+
+def vertex_quadrics(V, T):
+    """
+    Returns the n-by-4-by-4 sums of the fundamental quadrics of the planes of
+    the triangles around each vertex.
+    """
+    A = V[T[:, 0]]
+    normal = np.cross(V[T[:, 1]] - A, V[T[:, 2]] - A)
+    length = np.linalg.norm(normal, axis = 1)
+    normal[length > 0] /= length[length > 0, np.newaxis]
+    plane = np.column_stack((normal, -np.einsum('ij,ij->i', normal, A)))
+    K = plane[:, :, np.newaxis] * plane[:, np.newaxis, :]
+
+    Q = np.zeros((V.shape[0], 4, 4))
+    for corner in range(3):
+        np.add.at(Q, T[:, corner], K)
+    return Q
+
+def edges(T, n):
+    """
+    Returns the ends a < b of the edges of the triangles T, and the mask of
+    the vertices that cannot be removed: the vertices on the boundary or on
+    an edge shared by more than two triangles.
+    """
+    E = np.sort(T[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis = 1)
+    key, count = np.unique(E[:, 0] * n + E[:, 1], return_counts = True)
+    a = key // n
+    b = key % n
+
+    locked = np.zeros(n, dtype = bool)
+    locked[a[count != 2]] = True
+    locked[b[count != 2]] = True
+    return a, b, locked
+
+def independent_collapses(remove, keep, cost, allowed, n):
+    """
+    Returns the allowed collapses of a vertex remove onto its neighbour keep
+    among the cheaper half that cost less than every other collapse of that
+    vertex and of its neighbours, by increasing cost. No two removed vertices are then
+    neighbours, so that the triangles around them are all distinct and the
+    collapses can be made together.
+    """
+    order = np.lexsort((np.arange(cost.size), np.where(allowed, cost, np.inf)))
+    rank = np.empty(cost.size, dtype = np.intp)
+    rank[order] = np.arange(cost.size)
+    rank[~allowed] = cost.size
+
+    # Lowest rank of each vertex, then over the vertex and its neighbours
+    lowest = np.full(n, cost.size, dtype = np.intp)
+    np.minimum.at(lowest, remove, rank)
+    around = lowest.copy()
+    np.minimum.at(around, remove, lowest[keep])
+
+    # Among the cheaper half, which keeps the order of the collapses close
+    # to the order of their costs
+    selected = np.flatnonzero((rank == around[remove]) \
+        & (rank <= np.count_nonzero(allowed) // 2))
+    return selected[np.argsort(rank[selected])]
+
+def check_collapses(V, T, sign, host, remove, keep, tol_area, budget):
+    """
+    Checks the independent collapses of the vertices remove onto the
+    vertices keep. Returns for each one whether it keeps every triangle
+    around it oriented as before in the XY plane and the vertical error
+    within budget. Also returns the moves of the collapses, each with the
+    index of its collapse: the triangles deleted and the triangles
+    remaining around the removed vertices, as indices of T, with the new
+    vertices of the latter, then the removed vertices tracked there, with
+    the index of T of the triangle now above or below each of them and
+    their vertical error.
+    """
+    n = V.shape[0]
+    count = remove.size
+    collapse_of = np.full(n, -1, dtype = np.intp)
+    collapse_of[remove] = np.arange(count)
+
+    touched = np.flatnonzero((collapse_of[T] >= 0).any(axis = 1))
+    c = collapse_of[T[touched]].max(axis = 1)
+
+    # Vertices to locate again: the removed vertex itself and the vertices
+    # in the triangles around it
+    collapse_of_face = np.full(T.shape[0], -1, dtype = np.intp)
+    collapse_of_face[touched] = c
+    hosted = np.flatnonzero(host >= 0)
+    hosted = hosted[collapse_of_face[host[hosted]] >= 0]
+    points = np.concatenate((remove, hosted))
+    point_c = np.concatenate((np.arange(count), collapse_of_face[host[hosted]]))
+
+    # Triangles around the removed vertex, but not around the kept one,
+    # which remain with the removed vertex moved onto the kept one
+    remain = ~(T[touched] == keep[c][:, np.newaxis]).any(axis = 1)
+    dropped = (touched[~remain], c[~remain])
+    touched = touched[remain]
+    c = c[remain]
+    moved = np.where(T[touched] == remove[c][:, np.newaxis],
+                     keep[c][:, np.newaxis], T[touched])
+
+    area = xy_area(V, moved)
+    valid = np.ones(count, dtype = bool)
+    valid[c[~(sign[touched] * area > tol_area)]] = False
+
+    # Every pair of a vertex to locate and a remaining triangle of the same
+    # collapse
+    order = np.argsort(c, kind = 'stable')
+    per_collapse = np.bincount(c, minlength = count)
+    first = np.concatenate(([0], np.cumsum(per_collapse)[:-1]))
+    repeats = per_collapse[point_c]
+    pair_point = np.repeat(np.arange(points.size), repeats)
+    pair_face = order[np.repeat(first[point_c] - np.cumsum(repeats) + repeats,
+                                repeats) + np.arange(repeats.sum())]
+
+    P = V[points[pair_point]]
+    A = V[moved[pair_face, 0]]
+    B = V[moved[pair_face, 1]]
+    C = V[moved[pair_face, 2]]
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        la = ((B[:, 0] - P[:, 0]) * (C[:, 1] - P[:, 1]) \
+              - (C[:, 0] - P[:, 0]) * (B[:, 1] - P[:, 1])) * 0.5 / area[pair_face]
+        lb = ((C[:, 0] - P[:, 0]) * (A[:, 1] - P[:, 1]) \
+              - (A[:, 0] - P[:, 0]) * (C[:, 1] - P[:, 1])) * 0.5 / area[pair_face]
+        lc = 1 - la - lb
+        inside = (la >= -1e-9) & (lb >= -1e-9) & (lc >= -1e-9)
+        distance = np.abs(la * A[:, 2] + lb * B[:, 2] + lc * C[:, 2] - P[:, 2])
+
+    # First triangle containing each vertex
+    inside = np.flatnonzero(inside)
+    inside = inside[np.unique(pair_point[inside], return_index = True)[1]]
+    located = np.zeros(points.size, dtype = bool)
+    located[pair_point[inside]] = True
+    face = np.full(points.size, -1, dtype = np.intp)
+    face[pair_point[inside]] = touched[pair_face[inside]]
+    vertical = np.zeros(points.size)
+    vertical[pair_point[inside]] = distance[inside]
+
+    bound = np.zeros(count)
+    np.maximum.at(bound, point_c, vertical)
+    valid &= (bound <= budget)
+    valid[point_c[~located]] = False
+    return valid, (dropped, (touched, c, moved),
+                   (points, point_c, face, vertical))
+
+def collapse(T, sign, host, valid, moves):
+    """
+    Makes the valid collapses among the moves checked by check_collapses.
+    Triangles around both vertices of a collapse are deleted. Returns the
+    new triangles with their orientation and the new triangle of each
+    removed vertex, then the removed vertices that were located again with
+    their vertical error.
+    """
+    (dropped, dropped_c), (touched, c, moved), \
+        (points, point_c, face, vertical) = moves
+
+    T = T.copy()
+    T[touched[valid[c]]] = moved[valid[c]]
+    points = points[valid[point_c]]
+    host = host.copy()
+    host[points] = face[valid[point_c]]
+
+    alive = np.ones(T.shape[0], dtype = bool)
+    alive[dropped[valid[dropped_c]]] = False
+    index = np.cumsum(alive) - 1
+    host[host >= 0] = index[host[host >= 0]]
+    return T[alive], sign[alive], host, points, vertical[valid[point_c]]
@@ -24,7 +24,6 @@
 
 from ruby_lib import *
 import math
-from scipy.spatial import Delaunay
 
 
 # CREATE
@@ -170,11 +169,15 @@ p3 = np.random.rand(100, 1)
 points = np.concatenate((p1, p2), axis = 1)
 points = np.concatenate((points, p3), axis = 1)
 
-triangles = Delaunay(points[:, 0:2])
+triangles = delaunay_triangles(points[:, 0:2])
 
-ruby_tin(file, points, triangles.simplices.copy(),
+ruby_tin(file, points, triangles,
     texture = '/images/rainbow.jpeg')
 
+# Draws a DEM given as a regular grid of heights, without triangulation
+x, y = np.meshgrid(np.arange(0, 10, 0.5), np.arange(0, 10, 0.5))
+ruby_grid_dem(file, np.sin(x) * np.cos(y), 25, 0, 0.5, 0.5, color = 'g')
+
 # QUIVER PLOT
 
 # Draws an arrow at 5,5,5, pointing along x axis
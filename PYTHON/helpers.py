@@ -22,13 +22,14 @@
 # DEALINGS IN THE SOFTWARE.
 
 import numpy as np
-from scipy.linalg import expm
 
 def ruby_newline(file):
     file.write('\n')
 
 def ruby_rgb_color(color):
-    if color == 'w':
+    if not isinstance(color, str):
+        color_code = '[%d,%d,%d]' % tuple(color)
+    elif color == 'w':
         color_code = '[255,255,255]'
     elif color =='r':
         color_code = '[255,0,0]'
@@ -48,6 +49,24 @@ def ruby_rgb_color(color):
         ValueError('Unknown color')
     return color_code
 
+def color_key(color):
+    """
+    Returns the letter of a named color, or the hexadecimal code RRGGBB of an
+    (r, g, b) color, to name the ruby variables of that color.
+    """
+    if isinstance(color, str):
+        return color
+    return '%02x%02x%02x' % tuple(color)
+
+def delaunay_triangles(XY):
+    """
+    Delaunay triangulation of the N-by-2 array XY, as an M-by-3 array of
+    point indices for ruby_tin. SciPy is only imported on the first call, so
+    that importing ruby_lib requires NumPy alone.
+    """
+    from scipy.spatial import Delaunay
+    return Delaunay(XY).simplices.copy()
+
 def cross_ten(x):
     X = x[0]
     Y = x[1]
@@ -57,30 +76,66 @@ def cross_ten(x):
                      [-Y,  X,  0]])
 
 def M_to_rodriges(R):
-    D, V = np.linalg.eig(R)
-    print(R)
-    print(D)
-    print(V)
-    theta = max(np.angle(D))
-    k = np.argmin(np.abs(D - 1))
-    v1 = theta * V[:, k]
-    v2 = -theta * V[:, k]
-    R1 = expm(cross_ten(v1))
-    R2 = expm(cross_ten(v2))
-
-    w1, temp = np.linalg.eig(np.matmul(R, np.transpose(R1)))
-    w2, temp = np.linalg.eig(np.matmul(R, np.transpose(R2)))
-
-    if(max(np.angle(w2)) > max(np.angle(w1))):
-        phi = np.linalg.norm(v1)
-        if(phi > 1e-10):
-            u = v1 / phi;
-        else:
-            u = np.zeros((3, 1))
+    """
+    Axis and angle of the rotation matrix R, see rotation_to_axis_angle.
+    The axis is a zero vector for rotations below 1e-10 rad.
+    """
+    axis, angle = rotation_to_axis_angle(R)
+    phi = angle[0]
+    if(phi > 1e-10):
+        u = axis[0]
     else:
-        phi = np.linalg.norm(v2)
-        if(phi > 1e-10):
-            u = v2 / phi;
-        else:
-            u = np.zeros((3, 1))
+        u = np.zeros((3, 1))
     return u, phi
+
+def rotation_to_axis_angle(R):
+    """
+    Converts rotation matrices to axis-angle form in closed form. The angle is
+    obtained from the trace and the norm of the skew-symmetric part of each
+    matrix, the axis from its skew-symmetric part. Close to pi, where the
+    skew-symmetric part vanishes, the axis is taken from the symmetric part
+    instead. Rotations by a null angle get the z axis.
+
+    Parameters
+    ----------
+    R : np.ndarray
+        3-by-3 rotation matrix or N-by-3-by-3 stack of rotation matrices
+
+    Returns
+    -------
+    axis : np.ndarray
+        N-by-3 array of unit rotation axes
+    angle : np.ndarray
+        N array of rotation angles in [0, pi]
+
+    """
+    R = np.asarray(R, dtype = float).reshape(-1, 3, 3)
+
+    # skew = 2 * sin(angle) * axis
+    skew = np.stack((R[:, 2, 1] - R[:, 1, 2],
+                     R[:, 0, 2] - R[:, 2, 0],
+                     R[:, 1, 0] - R[:, 0, 1]), axis = 1)
+    sin_angle = 0.5 * np.linalg.norm(skew, axis = 1)
+    cos_angle = 0.5 * (np.trace(R, axis1 = 1, axis2 = 2) - 1)
+    angle = np.arctan2(sin_angle, cos_angle)
+
+    axis = np.zeros((R.shape[0], 3))
+    axis[:, 2] = 1
+
+    small = (cos_angle >= 0) & (sin_angle > 0)
+    axis[small] = skew[small] / (2 * sin_angle[small, np.newaxis])
+
+    # Beyond pi/2: (R + R^T) / 2 = cos * I + (1 - cos) * axis * axis^T, the
+    # column of largest diagonal gives the best conditioned axis
+    large = cos_angle < 0
+    if large.any():
+        S = 0.5 * (R[large] + np.transpose(R[large], (0, 2, 1)))
+        c = cos_angle[large, np.newaxis]
+        outer = (S - c[:, :, np.newaxis] * np.eye(3)) / (1 - c[:, :, np.newaxis])
+        k = np.argmax(np.diagonal(outer, axis1 = 1, axis2 = 2), axis = 1)
+        index = np.arange(k.shape[0])
+        u = outer[index, :, k] / np.sqrt(outer[index, k, k])[:, np.newaxis]
+        u[np.sum(u * skew[large], axis = 1) < 0] *= -1
+        axis[large] = u
+
+    return axis, angle
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import sys
+import zipfile
+
+# Coordinates and covariances written by other software as .npy or .npz
+# files are opened memory mapped. Slicing them returns views on the file, so
+# that ruby_ellipsoid, ruby_axis or ruby_pose read only the rows they draw.
+
+def load_array(path, key = None):
+    """
+    Opens an array of a .npy or .npz file without reading it into memory.
+
+    Members of a .npz file written by np.savez are mapped in place. Members
+    of np.savez_compressed files cannot be mapped and are read into memory.
+
+    Parameters
+    ----------
+    path : str
+        Path to a .npy or .npz file
+    key : str (optional)
+        Name of the array in a .npz file, mandatory for .npz files
+
+    Returns
+    -------
+    np.ndarray
+        Read-only memory-mapped array (np.memmap)
+
+    Examples
+    --------
+    Draws the error ellipsoids of a network block by block
+    >>>ruby_ellipsoid(file, load_array('network.npz', 'P'),
+    >>>    load_array('network.npz', 'K'), color = 'r')
+
+    Draws the poses of a trajectory from row views of the files
+    >>>P = load_array('P.npy')
+    >>>R = load_array('R.npy')
+    >>>for index in range(P.shape[0]):
+    >>>    ruby_pose(file, P[index:index + 1], R[index])
+
+    """
+    if not isinstance(path, str):
+        raise TypeError('Error in load_array. Not a valid type for path. ',
+                        'Expects a string')
+
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode = 'r')
+
+    if not path.endswith('.npz'):
+        raise ValueError('Error in load_array. Not a valid file name. ',
+                         'File extension .npy or .npz is expected')
+
+    if not isinstance(key, str):
+        raise ValueError('Error in load_array. The name of the array is ',
+                         'required for .npz files')
+
+    with zipfile.ZipFile(path) as archive:
+        try:
+            info = archive.getinfo(key + '.npy')
+        except KeyError:
+            raise KeyError('Error in load_array. No array ' + key + ' in ' \
+                           + path)
+
+        if info.compress_type != zipfile.ZIP_STORED:
+            with archive.open(info) as member:
+                return np.lib.format.read_array(member)
+
+    # The local header of a stored member is followed by the raw .npy file
+    with open(path, 'rb') as file:
+        file.seek(info.header_offset)
+        local_header = file.read(zipfile.sizeFileHeader)
+        name_length = int.from_bytes(local_header[26:28], 'little')
+        extra_length = int.from_bytes(local_header[28:30], 'little')
+        file.seek(info.header_offset + zipfile.sizeFileHeader + name_length \
+                  + extra_length)
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        offset = file.tell()
+
+    return np.memmap(path, dtype = dtype, mode = 'r', offset = offset,
+                     shape = shape, order = 'F' if fortran_order else 'C')
+
+def peak_rss():
+    """
+    Returns the peak resident set size of the current process in bytes, or
+    None where it cannot be queried (Windows).
+    """
+    # On Linux, getrusage also counts the peak of the parent process before
+    # exec, the high water mark of /proc is the one of this program only
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return 1024 * int(line.split()[1])
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else 1024 * peak
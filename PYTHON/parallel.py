@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import concurrent.futures
+import functools
+import io
+import os
+
+from writer import ScriptWriter
+
+# Independent drawing calls are rendered by a pool of processes into
+# in-memory fragments, which are written to the script in call order. The
+# definitions shared between calls (see ScriptWriter.define_once), the
+# points where the script may be split and the starts of new parts (see
+# ScriptWriter.split_point and new_part) are kept apart in the fragments and
+# replayed on the script, so that it is identical to the one of
+# the same calls made one after the other.
+
+class FragmentWriter(ScriptWriter):
+    """
+    Writer collecting the output of one drawing call in memory, as a list of
+    text pieces, (key, lines) definitions, None split points and (layer,)
+    starts of new parts.
+    """
+
+    def __init__(self, decimals = None, validate = True, layer = ''):
+        ScriptWriter.__init__(self, io.StringIO(), decimals = decimals,
+                              validate = validate)
+        # Layer of the merging writer, changed by new_part
+        self.layer = layer
+        self.pieces = []
+
+    def _cut(self):
+        self.flush()
+        text = self.file.getvalue()
+        if text:
+            self.pieces.append(text)
+            self.file = io.StringIO()
+
+    def define_once(self, key, lines):
+        """
+        Records the definition, to be written by the merging writer if it
+        is not defined yet. Whether it is written is not known in the
+        fragment, so None is returned.
+        """
+        self._cut()
+        self.pieces.append((key, lines))
+        return None
+
+    def split_point(self):
+        """
+        Records a point where the merging writer may split the script.
+        """
+        self._cut()
+        self.pieces.append(None)
+
+    def new_part(self, layer = ''):
+        """
+        Records the start of a new part, to be made by the merging writer.
+        """
+        self._cut()
+        self.layer = layer
+        self.pieces.append((layer,))
+
+    def fragment(self):
+        self._cut()
+        return self.pieces
+
+def render(call, decimals = None, validate = True, origin = None,
+           layer = ''):
+    """
+    Runs one drawing call on a FragmentWriter and returns its pieces.
+
+    Parameters
+    ----------
+    call : tuple
+        (function, args) or (function, args, kwargs), function being one of
+        the ruby_* drawing functions, called as function(file, *args, **kwargs)
+    decimals, validate, origin
+        Settings of the script, see ScriptWriter
+    layer : str (optional)
+        Current layer of the script, see ShardedWriter
+
+    Returns
+    -------
+    list
+        Text pieces, (key, lines) definitions, None split points and (layer,)
+        starts of new parts, in order
+
+    """
+    function, args = call[0], call[1]
+    kwargs = call[2] if len(call) > 2 else {}
+    file = FragmentWriter(decimals, validate, layer)
+    file.origin = origin
+    function(file, *args, **kwargs)
+    return file.fragment()
+
+def ruby_parallel(file, calls, processes = None, chunksize = 1):
+    """
+    Renders independent drawing calls in a pool of processes and writes them
+    to file in the order of calls. The script is byte-identical to the one
+    of the same calls made in turn, in sharded scripts too.
+
+    Parameters
+    ----------
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
+    calls : iterable
+        Tuples (function, args) or (function, args, kwargs) of ruby_*
+        drawing functions and their arguments after file. Functions and
+        arguments must be picklable
+    processes : int (optional)
+        Number of processes, defaults to the number of CPUs
+    chunksize : int (optional)
+        Number of calls sent to a process at once, larger values suit many
+        small calls
+
+    Examples
+    --------
+    Draws the ellipsoids and poses of a network on all cores
+    >>>calls = [(ruby_ellipsoid, (P[i:i + 1], K[i]), {'color': 'r'})
+    >>>         for i in range(P.shape[0])]
+    >>>calls += [(ruby_pose, (P[i:i + 1], R[i])) for i in range(P.shape[0])]
+    >>>ruby_parallel(file, calls)
+
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        fragments = executor.map(functools.partial(render,
+                                                   decimals = file.decimals,
+                                                   validate = file.validate,
+                                                   origin = file.origin,
+                                                   layer = getattr(file,
+                                                                   'layer',
+                                                                   '')),
+                                 calls, chunksize = chunksize)
+        for pieces in fragments:
+            file.split_point()
+            for piece in pieces:
+                if isinstance(piece, str):
+                    file.write(piece)
+                elif piece is None:
+                    file.split_point()
+                elif len(piece) == 1:
+                    file.new_part(*piece)
+                else:
+                    file.define_once(*piece)
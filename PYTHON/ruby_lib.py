@@ -23,17 +23,46 @@
 
 import numpy as np
 from helpers import *
+from writer import ScriptWriter, ShardedWriter, decimals_for_tolerance
+from validation import *
+from loaders import load_array, peak_rss
+from parallel import ruby_parallel
+from colormap import ColorScale
+from decimation import decimate_tin
+from voxels import octree_levels, voxel_filter
+from streaming import CHUNK_ROWS, is_stream, iter_chunks, release, take_rows
 import os
 import cmath
+import functools
 import numbers
+import zlib
 
 SCALE_FACTOR = 39.3700787402
 TOL_COPLANARITY = 1e-5
 TOL_CROSS_PRODUCT = 1e-7
 
+def primitive(function):
+    """
+    Decorates the ruby_* drawing functions, marking the start of each
+    top-level call as a point where a sharded script may be split. Calls
+    made from within another drawing function are never split from it.
+    """
+    @functools.wraps(function)
+    def draw(file, *args, **kwargs):
+        if file.depth == 0:
+            file.split_point()
+        file.depth += 1
+        try:
+            return function(file, *args, **kwargs)
+        finally:
+            file.depth -= 1
+    return draw
+
 # Opens ruby script file for output, returns file descriptor
 # Mandatory
-def ruby_create(name_or_path = 'script_ruby_sketchup.rb'):
+def ruby_create(name_or_path = 'script_ruby_sketchup.rb', precision = None,
+                tolerance = None, validate = True, shard_size = None,
+                origin = None):
     """
     Opens output file for generated ruby script.
     Raises exceptions if file connot be opened.
@@ -42,11 +71,50 @@ def ruby_create(name_or_path = 'script_ruby_sketchup.rb'):
     ----------
     name_or_path : string (optional)
         File name of output file. .rb file extension is mandatory.
+    precision : int (optional)
+        Number of decimals of the coordinates written to the script, in
+        SketchUp units (inches). By default coordinates are written with full
+        float64 precision
+    tolerance : float (optional)
+        Largest admissible rounding error of the written coordinates, in the
+        units of the input coordinates (m). Overrides precision
+    validate : bool (optional)
+        Checks the arguments of every ruby_* call (default). Pass False for
+        trusted data that is known to be valid, to skip the checks
+    shard_size : int (optional)
+        Splits the script into part files of about shard_size characters,
+        loaded in order by a manifest script written at name_or_path (see
+        ShardedWriter and ruby_layer). By default a single script is written
+    origin : np.ndarray, list (optional)
+        Local origin x, y, z (m), subtracted from every position drawn to the
+        script, so that coordinates of a national grid (e.g. LV95, x about
+        2600000 m) are written as a few digits around zero. It is recorded in
+        the script and in the attribute dictionary 'ruby_lib' of the model
+
+    Examples
+    --------
+    Coordinates written to the nearest 1/1000 inch
+    >>>file = ruby_create('model.rb', precision = 3)
+
+    Coordinates written with an error below 1 mm
+    >>>file = ruby_create('model.rb', tolerance = 0.001)
+
+    Writes already validated data without checking it again
+    >>>file = ruby_create('model.rb', validate = False)
+
+    Writes parts of about 10 MB, loaded by model.rb
+    >>>file = ruby_create('model.rb', shard_size = 10000000)
+
+    Writes LV95 coordinates relative to a local origin, rounded to the inch
+    and therefore written as integers
+    >>>file = ruby_create('model.rb', origin = [2600000, 1200000, 400],
+    >>>    precision = 0)
 
     Returns
     -------
-    file object
-        File descriptor of opened file
+    ScriptWriter
+        Buffered writer on the opened file, to be passed to the ruby_*
+        functions and closed by ruby_close
 
     """
     if not isinstance(name_or_path, str):
@@ -60,109 +128,299 @@ def ruby_create(name_or_path = 'script_ruby_sketchup.rb'):
     if '/' not in name_or_path:
         name_or_path = os.getcwd()+ '/' + name_or_path
 
+    if tolerance is not None:
+        if not isinstance(tolerance, numbers.Real) or not tolerance > 0:
+            raise ValueError('Error in ruby_create. ',
+                             'tolerance must be a strictly positive number')
+        precision = decimals_for_tolerance(2 * SCALE_FACTOR * tolerance)
+
+    if precision is not None:
+        if not isinstance(precision, int) or precision < 0:
+            raise ValueError('Error in ruby_create. ',
+                             'precision must be a non-negative integer')
+
+    if origin is not None:
+        origin = np.asarray(origin, dtype = float).ravel()
+        if not (origin.shape == (3,) and np.isfinite(origin).all()):
+            raise ValueError('Error in ruby_create. ',
+                             'origin must consist of 3 finite coordinates')
+
     try:
-        file = open(name_or_path, 'w')
+        if shard_size is None:
+            file = ScriptWriter(open(name_or_path, 'w'), decimals = precision,
+                                validate = validate)
+        else:
+            file = ShardedWriter(name_or_path, shard_size, decimals = precision,
+                                 validate = validate)
     except OSError:
         raise OSError('Error in ruby_create. ',
                       'Not a valid type for file name.')
 
-    file.write('model = Sketchup.active_model')
-    ruby_newline(file)
-    ruby_newline(file)
-
-    file.write('sph0 = Sketchup.active_model.entities.add_group')
-    ruby_newline(file)
-
-    file.write('c1 = sph0.entities.add_circle(ORIGIN,Z_AXIS,' \
-        + str(SCALE_FACTOR) + ',24)')
-    ruby_newline(file)
-
-    file.write('c2 = sph0.entities.add_circle(ORIGIN,X_AXIS,50,24)')
-    ruby_newline(file)
-
-    file.write('f  = sph0.entities.add_face(c1)')
-    ruby_newline(file)
-
-    file.write('f.followme(c2)')
-    ruby_newline(file)
-
-    file.write('c2.each {|edge| edge.erase!}')
-    ruby_newline(file)
-    ruby_newline(file)
-
-    file.write('arr0 = Sketchup.active_model.entities.add_group')
-    ruby_newline(file)
-
+    # Prototypes of the ellipsoids and arrows, model constants written
+    # exactly whatever the precision of the coordinates
     arrow_shape = np.array([[0,    0],\
                             [0.05, 0],\
                             [0.05, 0.8],\
                             [0.1,  0.8],\
                             [0,    1]])
 
-    file.write('pts=[[')
-    for i in range(arrow_shape.shape[0] - 1):
-        file.write(str(SCALE_FACTOR * arrow_shape[i,  0]) + ',0,' \
-                 + str(SCALE_FACTOR * arrow_shape[i,  1]) + '],[')
-    file.write(str(SCALE_FACTOR * arrow_shape[arrow_shape.shape[0] - 1,  0]) + ',0,' \
-             + str(SCALE_FACTOR * arrow_shape[arrow_shape.shape[0] - 1,  1]) + ']]')
-    ruby_newline(file)
-
-    file.write('f = arr0.entities.add_face(pts)')
-    ruby_newline(file)
-
-    file.write('c1 = arr0.entities.add_circle(ORIGIN,Z_AXIS,39.3701,24)')
-    ruby_newline(file)
-
-    file.write('f.followme(c1)')
-    ruby_newline(file)
-
-    file.write('c1.each {|edge| edge.erase!}')
-    ruby_newline(file)
-    ruby_newline(file)
+    file.write_lines([
+        'model = Sketchup.active_model',
+        '',
+        'sph0 = Sketchup.active_model.entities.add_group',
+        file.format_block('c1 = sph0.entities.add_circle(ORIGIN,Z_AXIS,%r,24)',
+                          np.array([SCALE_FACTOR])),
+        'c2 = sph0.entities.add_circle(ORIGIN,X_AXIS,50,24)',
+        'f  = sph0.entities.add_face(c1)',
+        'f.followme(c2)',
+        'c2.each {|edge| edge.erase!}',
+        '',
+        'arr0 = Sketchup.active_model.entities.add_group',
+        'pts=[[' + '],['.join(file.format_rows('%r,0,%r',
+                                              SCALE_FACTOR * arrow_shape)) + ']]',
+        'f = arr0.entities.add_face(pts)',
+        'c1 = arr0.entities.add_circle(ORIGIN,Z_AXIS,39.3701,24)',
+        'f.followme(c1)',
+        'c1.each {|edge| edge.erase!}',
+        ''])
+    file.persist('sph0')
+    file.persist('arr0')
+
+    if origin is not None:
+        file.origin = origin
+        file.write_lines([
+            '# Coordinates relative to the local origin (m)',
+            file.format_block('ruby_lib_origin = [%r,%r,%r]', origin),
+            'model.set_attribute(\'ruby_lib\', \'origin\', ruby_lib_origin)',
+            ''])
 
     return file
 
+def _local(file, XYZ):
+    """
+    Returns the coordinates XYZ (m) relative to the local origin of the
+    script, see ruby_create.
+    """
+    if file.origin is None:
+        return XYZ
+    return XYZ - file.origin
+
 def ruby_close(file):
     """
     Closes file, printing the required ruby console command for file import.
 
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
 
     """
 
-    ruby_newline(file)
+    # Always loaded, whatever the layers selected in a sharded script
+    file.new_part()
+    file.newline()
     file.write('sph0.entities.clear!')
-    ruby_newline(file)
+    file.newline()
     file.write('arr0.entities.clear!')
 
     print('Open a ruby console in sketchup, and copy/paste:')
     print('require \'' + file.name + '\'')
     file.close()
 
-def ruby_point(file, XYZ, issymbolic = 0, symbol = 'triangle', color = 'n', name = ''):
+def ruby_layer(file, layer):
+    """
+    Starts a new part of a sharded script (see ruby_create), holding the
+    following calls up to the next ruby_layer. The manifest can load the
+    parts of selected layers only. Has no effect on a single script.
+
+    Parameters
+    ----------
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
+    layer : str
+        Name of the layer, '' for parts that are always loaded
+
+    Examples
+    --------
+    Writes the ellipsoids in parts of their own, which the manifest loads
+    unless ruby_lib_layers is set to another list of layers
+    >>>ruby_layer(file, 'ellipsoids')
+    >>>ruby_ellipsoid(file, XYZ, K)
+    >>>ruby_layer(file, '')
+
+    """
+    check_layer('ruby_layer', 'layer name', layer)
+
+    file.new_part(layer)
+
+def ruby_material(file, color = 'n', texture = '', size = None):
+    """
+    Returns the ruby variable of the material with the given color or
+    texture, which is created the first time it is used in the script.
+    Every later use refers to the same SketchUp material, instead of
+    creating a new material and loading the texture image again.
+
+    Parameters
+    ----------
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
+    color : str, tuple (optional)
+        One of the following colors:
+        'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k', or an (r, g, b) tuple of
+        integers in [0, 255]
+    texture : str (optional)
+        Path to an image file, relative to the script. Overrides color
+    size : float (optional)
+        Size of the texture image in model units (inches)
+
+    Returns
+    -------
+    str
+        Ruby variable of the material
+
+    Examples
+    --------
+    Paints the current group in red
+    >>>file.write('group.material = ' + ruby_material(file, 'r') + '\\n')
+
+    """
+    if texture == '':
+        variable = 'mat_' + color_key(color)
+        lines = [variable + ' = Sketchup.active_model.materials.add(' \
+                     + '\'ruby_lib_' + color_key(color) + '\')',
+                 variable + '.color = ' + ruby_rgb_color(color)]
+    else:
+        size_text = '' if size is None \
+            else file.format_block('%s', np.array([size]))
+        # Named after the texture and its size, so that a material keeps its
+        # variable in every part or fragment of the script, and its own name
+        # in SketchUp
+        key = 't%08x' % zlib.crc32((texture + ' ' + size_text).encode())
+        variable = 'mat_' + key
+        lines = [variable + ' = Sketchup.active_model.materials.add(' \
+                     + '\'ruby_lib_' + key + '\')',
+                 variable + '.texture = "#{File.dirname(__FILE__)}' + texture + '"']
+        if size is not None:
+            lines.append(variable + '.texture.size = ' + size_text)
+
+    file.define_once(variable, [''] + lines)
+    return variable
+
+def ruby_symbol_definition(file, symbol, color = 'n'):
+    """
+    Defines the point symbol of the given color as a SketchUp component, the
+    first time it is requested for the file. Returns the name of the ruby
+    variable holding the ComponentDefinition.
+
+    Parameters
+    ----------
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
+    symbol : str
+        Symbol of the list 'triangle', 'cross', 'circle', 'square'
+    color : str, tuple (optional)
+        One of the following colors:
+        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k',
+        or an (r, g, b) tuple of integers in [0, 255]
+
+    Returns
+    -------
+    str
+        Ruby variable of the component definition
+
+    """
+    variable = 'sym_' + symbol + '_' + color_key(color)
+
+    lines = [variable + ' = Sketchup.active_model.definitions.add(\'ruby_point_' \
+                 + symbol + '_' + color_key(color) + '\')',
+             variable + '.entities.add_cpoint Geom::Point3d.new(0,0,0)']
+    if symbol == 'cross':
+        lines += [variable + '.entities.add_line([-10,-10,0],[10,10,0])',
+                  variable + '.entities.add_line([-10,10,0],[10,-10,0])']
+    else:
+        sides = {'triangle': ',3', 'circle': '', 'square': ',4'}[symbol]
+        lines += ['f=' + variable + '.entities.add_circle([0,0,0],Z_AXIS,20' \
+                      + sides + ')',
+                  'f=' + variable + '.entities.add_face(f)']
+        if not (color == 'n'):
+            material = ruby_material(file, color)
+            lines += ['f.material = ' + material,
+                      'f.back_material = ' + material]
+
+    file.define_once(variable, [''] + lines)
+    return variable
+
+@primitive
+def ruby_point(file, XYZ, issymbolic = 0, symbol = 'triangle', color = 'n', name = '',
+               mode = 'groups', voxel_size = None, voxel_policy = 'centroid',
+               lod_levels = None, lod_points = 10000):
     """
     Writes the array of points XYZ to the given file. Symbol, color and name of
     the point can be given.
 
+    In mode 'components', each (symbol, color) is defined once as a SketchUp
+    component, and every point with a symbol is one instance of it placed by
+    a translation. All points of the call are drawn in a single group. Points
+    without a symbol are drawn as construction points, which SketchUp cannot
+    name: individual names are only given to the points with a symbol.
+
+    Given voxel_size, the cloud is first thinned to one point per voxel of a
+    cubic grid (see voxels.voxel_filter), which also merges the duplicates of
+    overlapping scans. Symbols and names are those of the first point of each
+    voxel.
+
+    Given lod_levels, the cloud is split into levels of detail by an octree
+    (see voxels.octree_levels): a coarse overview of about lod_points points,
+    levels adding detail where cells are still empty, and a last level with
+    all remaining points. Each level is drawn by itself, in mode 'components'
+    as a group named lod<k>, or <name>_lod<k> given a single name. In a
+    sharded script each level is a part of layer lod<k> (or <name>_lod<k>),
+    so that the manifest can load the overview only (see ruby_layer). The
+    name must then be a valid layer name, without quotes.
+
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
-    XYZ : np.ndarray, np.array
-        N-by-3 array of point coordinates
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
+    XYZ : np.ndarray, str, iterator
+        N-by-3 array of point coordinates. Data larger than memory can be
+        given as a path to a .npy file, a memory-mapped array or an iterator
+        of N-by-3 arrays, which are written block by block
     issymbolic : np.ndarray, np.array, int (optional)
         List or single value defining whether or not specific or all points
-        have a symbol (1) or not (0, default)
+        have a symbol (1) or not (0, default). Lists may be memory-mapped
     symbol : str (optional)
         Symbol of the list 'triangle' (default), 'cross', 'circle', 'square'
-    color : str (optional)
+    color : str, tuple, ColorScale (optional)
         One of the following colors:
-        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k'
+        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k',
+        an (r, g, b) tuple of integers in [0, 255], or a ColorScale of one
+        value per point, which colors the symbols (see colormap.ColorScale)
     name : np.ndarray, np.array, str (optional)
-        Global name for all points or list of individual names
+        Global name for all points or list of individual names. In mode
+        'components', a global name is the name of the group, and points
+        without a symbol must have an empty individual name
+    mode : str (optional)
+        'groups' (default), one group per point with a symbol, or
+        'components'
+    voxel_size : float (optional)
+        Edge (m) of the voxels the cloud is thinned on
+    voxel_policy : str (optional)
+        'centroid' (default), each voxel is drawn at the mean of its points,
+        with the mean value of a ColorScale, or 'first', at its first point
+    lod_levels : int (optional)
+        Number of levels of detail
+    lod_points : int (optional)
+        Largest number of points of the first level of detail, 10000 by
+        default
+
+    Returns
+    -------
+    dict
+        Only when the cloud is thinned or split into levels. When thinned:
+        'points', number of points given, 'kept', number of points drawn,
+        'ratio', kept over given. When split: 'levels', number of points of
+        each level
 
     Examples
     --------
@@ -188,168 +446,269 @@ def ruby_point(file, XYZ, issymbolic = 0, symbol = 'triangle', color = 'n', name
     >>>    issymbolic = np.array([[0], [1]]), symbol = 'circle', color = 'g',
     >>>    name = np.array([["point1"], ["point2"]]))
 
+    Draws 1000 red crosses as instances of a single component
+    >>>ruby_point(file, np.random.rand(1000, 3), issymbolic = 1,
+    >>>    symbol = 'cross', color = 'r', mode = 'components')
+
+    Draws a point cloud stored in a .npy file, without loading it in memory
+    >>>ruby_point(file, 'lidar_tile.npy', mode = 'components')
+
+    Draws a point cloud colored by height, with 32 colors at most
+    >>>ruby_point(file, XYZ, issymbolic = 1, mode = 'components',
+    >>>    color = ColorScale(XYZ[:, 2], 'terrain', levels = 32))
+
+    Draws merged scans, one point per 5 cm voxel
+    >>>report = ruby_point(file, 'scans.npy', mode = 'components',
+    >>>    voxel_size = 0.05)
+    >>>print(report['kept'])
+
+    Draws a large scan as an overview and three levels of detail, loaded by
+    the manifest of the sharded script up to level lod1 when ruby_lib_layers
+    is set to ['lod0', 'lod1']
+    >>>file = ruby_create('scan.rb', shard_size = 50000000)
+    >>>ruby_point(file, 'scan.npy', mode = 'components', lod_levels = 4,
+    >>>    lod_points = 100000)
+
     """
 
-    valid_symbols = ['triangle', 'cross', 'circle', 'square']
-    valid_colors = ['n', 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k']
-
-    if type(XYZ) is not np.ndarray and type(XYZ) is not np.array:
-        raise TypeError('Error in ruby_point. XYZ should be a numpy.array.')
-
-    if not(XYZ.shape[1] == 3):
-        raise ValueError('Error in ruby_point. Dimension of XYZ is invalid.')
-
-    for elt in XYZ:
-        if not(isinstance(elt[0], numbers.Real) \
-           and isinstance(elt[1], numbers.Real) \
-           and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_point. ',
-                            ' XYZ should consist of only numeric values.')
-
-    if symbol not in valid_symbols or not isinstance(symbol, str):
-        raise TypeError('Error in ruby_point. Not a valid symbol.')
-
-    if color not in valid_colors or not isinstance(color, str):
-        raise TypeError('Error in ruby_point. Not a valid color.')
-    if type(issymbolic) is not np.ndarray \
-        and type(issymbolic) is not np.array \
-        and not isinstance(issymbolic, numbers.Real):
-        raise TypeError('Error in ruby_point. Not a valid type for issymbolic. ',
-                        'issymbolic must be either an numpy.array or a list.')
-
-    if not isinstance(issymbolic, int):
-        if not (issymbolic.shape[0] == XYZ.shape[0]) \
-            or not (issymbolic.shape[1] == 1):
-            raise ValueError('Error in ruby_point. ',
-                             'Dimension of issymbolic is invalid.')
-
-    if not isinstance(issymbolic, int):
-        for elt in issymbolic:
-            if not isinstance(elt[0], numbers.Real):
-                raise TypeError('Error in ruby_point. ',
-                                'Not a valid type for issymbolic. ',
-                                'Expects an integer')
-            if not( elt[0] == 0 or elt[0] == 1):
-                raise ValueError('Error in ruby_point. ',
-                                 'Not a valid value for issymbolic. ',
-                                 'Expects 0 or 1')
-
-    if type(name) is not np.ndarray and type(name) is not np.array \
-        and not isinstance(name, str):
-        raise TypeError('Error in ruby_point. ',
-                        'Not a valid type for name. ',
-                        'name must be either a str or a numpy.ndarray.')
+    if file.validate:
+        check_symbol('ruby_point', symbol)
+        check_choice('ruby_point', 'mode', mode, ['groups', 'components'])
+        check_choice('ruby_point', 'voxel_policy', voxel_policy,
+                     ['centroid', 'first'])
+        if voxel_size is not None:
+            check_number('ruby_point', 'voxel_size', voxel_size)
+            if not (voxel_size > 0):
+                raise ValueError('Error in ruby_point. voxel_size must be ' \
+                    + 'strictly positive.')
+        for label, value in (('lod_levels', lod_levels),
+                             ('lod_points', lod_points)):
+            if value is not None and not (isinstance(value, numbers.Integral) \
+                                          and value >= 1):
+                raise ValueError('Error in ruby_point. ' + label + ' must be ' \
+                    + 'a strictly positive integer.')
+        if not is_stream(XYZ):
+            check_array('ruby_point', 'XYZ', XYZ, (None, 3))
+            check_rows('ruby_point', 'issymbolic', issymbolic, XYZ.shape[0])
+            check_rows('ruby_point', 'name', name, XYZ.shape[0])
+            check_color('ruby_point', color, XYZ.shape[0])
+        elif not isinstance(color, ColorScale):
+            check_color('ruby_point', color)
+
+    report = None
+    if voxel_size is not None:
+        # Thinned before anything is written, the points kept then being
+        # drawn as an array
+        scaled = isinstance(color, ColorScale)
+        XYZ, rows, values, report = voxel_filter(
+            XYZ, voxel_size, voxel_policy, color.values if scaled else None)
+        if file.validate:
+            check_rows('ruby_point', 'issymbolic', issymbolic, report['points'])
+            check_rows('ruby_point', 'name', name, report['points'])
+            check_color('ruby_point', color, report['points'])
+        issymbolic = _subset(issymbolic, rows)
+        name = _subset(name, rows)
+        if scaled:
+            color = color.take(rows)
+            color.values = values
+
+    if lod_levels is not None:
+        report = report or {}
+        report['levels'] = _point_levels(file, XYZ, issymbolic, symbol, color,
+                                         name, mode, lod_levels, lod_points)
+        return report
+
+    if mode == 'components':
+        file.write('\ngroup = Sketchup.active_model.entities.add_group\n')
+    else:
+        file.write('group = Sketchup.active_model.entities.add_group')
 
-    if not isinstance(name, str):
-        if not (name.shape[0] == XYZ.shape[0]) or not (name.shape[1] == 1):
-            raise ValueError('Error in ruby_point. Dimension of name is invalid.')
+    start = 0
+    instances = 0
+    for chunk in (iter_chunks(XYZ) if is_stream(XYZ) else [XYZ]):
+        if file.validate:
+            check_array('ruby_point', 'XYZ', chunk, (None, 3))
+        stop = start + chunk.shape[0]
+        if isinstance(color, ColorScale):
+            if file.validate and len(color) < stop:
+                raise ValueError('Error in ruby_point. Dimension of color is invalid.')
+            flags = take_rows(issymbolic, start, stop)
+            names = take_rows(name, start, stop)
+            entries = color.entries(start, stop)
+            if mode == 'components':
+                # One block per palette entry, which is then drawn with a
+                # single component definition
+                blocks = color.blocks(entries)
+            else:
+                # Points without a symbol are added to the group of the
+                # previous point, so the order is kept and they take its entry
+                if not isinstance(flags, numbers.Real):
+                    previous = np.where(flags[:, 0] == 1,
+                                        np.arange(flags.shape[0]), 0)
+                    entries = entries[np.maximum.accumulate(previous)]
+                blocks = color.runs(entries)
+            for entry_color, rows in blocks:
+                instances = _point_chunk(file, chunk[rows], _subset(flags, rows),
+                                         symbol, entry_color,
+                                         _subset(names, rows), mode, instances)
+        else:
+            instances = _point_chunk(file, chunk,
+                                     take_rows(issymbolic, start, stop), symbol,
+                                     color, take_rows(name, start, stop), mode,
+                                     instances)
+        start = stop
+
+    if file.validate and is_stream(XYZ):
+        check_rows('ruby_point', 'issymbolic', issymbolic, start)
+        check_rows('ruby_point', 'name', name, start)
+        check_color('ruby_point', color, start)
+
+    if mode == 'components' and isinstance(name, str) and not (name == ''):
+        file.write('group.name =\'' + name + '\'\n')
 
-    if isinstance(issymbolic, int):
-        issymbolic = np.full((XYZ.shape[0], 1), issymbolic)
+    return report
 
-    XYZ = np.concatenate((XYZ, issymbolic), axis = 1)
+def _point_levels(file, XYZ, issymbolic, symbol, color, name, mode, levels,
+                  points):
+    """
+    Draws the points of ruby_point level of detail by level of detail, see
+    lod_levels, and returns the number of points of each level.
+    """
+    if isinstance(XYZ, str):
+        XYZ = load_array(XYZ)
+    elif is_stream(XYZ) and not isinstance(XYZ, np.ndarray):
+        XYZ = np.concatenate(list(iter_chunks(XYZ)))
+    if file.validate:
+        check_rows('ruby_point', 'issymbolic', issymbolic, XYZ.shape[0])
+        check_rows('ruby_point', 'name', name, XYZ.shape[0])
+        check_color('ruby_point', color, XYZ.shape[0])
+
+    layer = getattr(file, 'layer', '')
+    prefix = name + '_' if isinstance(name, str) and not (name == '') else ''
+    # Names of the layers of the levels, quoted in the manifest
+    check_layer('ruby_point', 'name for levels of detail', prefix)
+    counts = []
+    for level, rows in enumerate(octree_levels(XYZ, levels, points)[0]):
+        counts.append(int(rows.size))
+        if rows.size == 0:
+            continue
+        file.new_part(prefix + 'lod' + str(level))
+        ruby_point(file, np.asarray(XYZ[rows]), _subset(issymbolic, rows),
+                   symbol, color.take(rows) if isinstance(color, ColorScale) \
+                   else color,
+                   prefix + 'lod' + str(level) if mode == 'components' \
+                   and isinstance(name, str) else _subset(name, rows), mode)
+        release(XYZ)
+    file.new_part(layer)
+    return counts
+
+def _subset(values, rows):
+    """
+    Returns the rows of values selected by the boolean mask or indices rows if
+    it is an array, and values itself otherwise (single value shared by all
+    rows).
+    """
+    if isinstance(values, np.ndarray):
+        return np.asarray(values[rows])
+    return values
+
+def _point_chunk(file, XYZ, issymbolic, symbol, color, name, mode, instances):
+    """
+    Writes a block of rows of ruby_point, after the group opened by
+    ruby_point. instances is the number of component instances written by
+    the previous blocks, the updated count is returned.
+    """
+    if file.validate:
+        check_flags('ruby_point', 'issymbolic', issymbolic, XYZ.shape[0])
+        check_name('ruby_point', name, XYZ.shape[0])
+
+    if isinstance(issymbolic, numbers.Real):
+        symbolic = np.full(XYZ.shape[0], issymbolic == 1)
+    else:
+        symbolic = issymbolic[:, 0] == 1
+
+    coords = SCALE_FACTOR * _local(file, XYZ)
+
+    if mode == 'components':
+        # Construction points have no name, names would be lost
+        if not isinstance(name, str) and (name[~symbolic, 0] != '').any():
+            raise ValueError('Error in ruby_point. Points without a symbol ' \
+                + 'cannot be named in mode \'components\'.')
+        if not symbolic.all():
+            file.write_array('pt_c', '%s,%s,%s', coords[~symbolic])
+            file.write('pt_c.each_slice(3) {|p| ' \
+                       + 'group.entities.add_cpoint(Geom::Point3d.new(p))}\n')
+        if symbolic.any():
+            definition = ruby_symbol_definition(file, symbol, color)
+            file.write_array('pt_s', '%s,%s,%s', coords[symbolic])
+            file.write(('pt_i = []\n' if instances == 0 else '') \
+                       + 'pt_s.each_slice(3) {|p| pt_i << group.entities.add_instance(' \
+                       + definition + ', Geom::Transformation.new(p))}\n')
+
+        if not isinstance(name, str):
+            named = np.flatnonzero(name[symbolic, 0] != '')
+            file.write(''.join(['pt_i[' + str(index) + '].name =\'' + n + '\'\n'
+                                for index, n in zip(named + instances,
+                                                    name[symbolic, 0][named])]))
+        return instances + np.count_nonzero(symbolic)
+
+    cpoint = 'group.entities.add_cpoint Geom::Point3d.new(%s,%s,%s)\n'
+
+    if symbol == 'cross':
+        symbol_template = '\ngroup.entities.add_line([%s,%s,%s],[%s,%s,%s])\n' \
+                        + 'group.entities.add_line([%s,%s,%s],[%s,%s,%s])\n'
+        symbol_values = np.column_stack((
+            coords[:, 0] - 10, coords[:, 1] - 10, coords[:, 2],
+            coords[:, 0] + 10, coords[:, 1] + 10, coords[:, 2],
+            coords[:, 0] - 10, coords[:, 1] + 10, coords[:, 2],
+            coords[:, 0] + 10, coords[:, 1] - 10, coords[:, 2]))
+    else:
+        sides = {'triangle': ',3', 'circle': '', 'square': ',4'}[symbol]
+        symbol_template = '\nf=group.entities.add_circle([%s,%s,%s],Z_AXIS,20' \
+                        + sides + ')\ngroup.entities.add_face(f)\n'
+        if not (color == 'n'):
+            symbol_template += 'group.material = ' + ruby_material(file, color) \
+                             + '\n'
+        symbol_values = coords
+
+    rows = np.empty(XYZ.shape[0], dtype = object)
+    rows[~symbolic] = file.format_rows('\n' + cpoint + '\n', coords[~symbolic])
+    rows[symbolic] = file.format_rows(
+        '\ngroup = Sketchup.active_model.entities.add_group\n' + cpoint \
+        + symbol_template + '\n',
+        np.concatenate((coords, symbol_values), axis = 1)[symbolic])
 
     if isinstance(name, str):
-        name = np.full((XYZ.shape[0], 1), name)
-
-    file.write('group = Sketchup.active_model.entities.add_group')
-    index = 0
-    for P in XYZ:
-        if P[3] == 0:
-            ruby_newline(file)
-            file.write('group.entities.add_cpoint Geom::Point3d.new(' + \
-                       str(SCALE_FACTOR * P[0]) + ',' + \
-                       str(SCALE_FACTOR * P[1]) + ',' + \
-                       str(SCALE_FACTOR * P[2]) + ')' \
-                      )
-            ruby_newline(file)
-        elif P[3] == 1:
-            ruby_newline(file)
-            file.write('group = Sketchup.active_model.entities.add_group')
-            ruby_newline(file)
-            file.write('group.entities.add_cpoint Geom::Point3d.new(' + \
-                       str(SCALE_FACTOR * P[0]) + ',' + \
-                       str(SCALE_FACTOR * P[1]) + ',' + \
-                       str(SCALE_FACTOR * P[2]) + ')' \
-                      )
-            ruby_newline(file)
-            if symbol == 'triangle':
-                ruby_newline(file)
-                file.write('f=group.entities.add_circle([' + \
-                           str(SCALE_FACTOR * P[0]) + ',' + \
-                           str(SCALE_FACTOR * P[1]) + ',' + \
-                           str(SCALE_FACTOR * P[2]) + '],Z_AXIS,20,3)' \
-                          )
-                ruby_newline(file)
-                file.write('group.entities.add_face(f)')
-                ruby_newline(file)
-                if not (color == 'n'):
-                    file.write('group.material = ' + ruby_rgb_color(color))
-                    ruby_newline(file)
-            elif symbol == 'circle':
-                ruby_newline(file)
-                file.write('f=group.entities.add_circle([' + \
-                           str(SCALE_FACTOR * P[0]) + ',' + \
-                           str(SCALE_FACTOR * P[1]) + ',' + \
-                           str(SCALE_FACTOR * P[2]) + '],Z_AXIS,20)' \
-                          )
-                ruby_newline(file)
-                file.write('group.entities.add_face(f)')
-                ruby_newline(file)
-                if not (color == 'n'):
-                    file.write('group.material = ' + ruby_rgb_color(color))
-                    ruby_newline(file)
-            elif symbol == 'cross':
-                ruby_newline(file)
-                file.write('group.entities.add_line([' + \
-                           str(SCALE_FACTOR * P[0] - 10) + ',' + \
-                           str(SCALE_FACTOR * P[1] - 10) + ',' + \
-                           str(SCALE_FACTOR * P[2]) + '],[' + \
-                           str(SCALE_FACTOR * P[0] + 10) + ',' + \
-                           str(SCALE_FACTOR * P[1] + 10) + ',' + \
-                           str(SCALE_FACTOR * P[2]) + '])' \
-                          )
-                ruby_newline(file)
-                file.write('group.entities.add_line([' + \
-                           str(SCALE_FACTOR * P[0] - 10) + ',' + \
-                           str(SCALE_FACTOR * P[1] + 10) + ',' + \
-                           str(SCALE_FACTOR * P[2]) + '],[' + \
-                           str(SCALE_FACTOR * P[0] + 10) + ',' + \
-                           str(SCALE_FACTOR * P[1] - 10) + ',' + \
-                           str(SCALE_FACTOR * P[2]) + '])' \
-                          )
-                ruby_newline(file)
-            elif symbol == 'square':
-                ruby_newline(file)
-                file.write('f=group.entities.add_circle([' + \
-                           str(SCALE_FACTOR * P[0]) + ',' + \
-                           str(SCALE_FACTOR * P[1]) + ',' + \
-                           str(SCALE_FACTOR * P[2]) + '],Z_AXIS,20,4)' \
-                          )
-                ruby_newline(file)
-                file.write('group.entities.add_face(f)')
-                ruby_newline(file)
-                if not (color == 'n'):
-                    file.write('group.material = ' + ruby_rgb_color(color))
-                    ruby_newline(file)
-        ruby_newline(file)
-        if not (name[index, 0] == ''):
-            file.write('group.name =\'' + name[index, 0] + '\'')
-            ruby_newline(file)
-        index = index + 1
-
-def ruby_line(file, XYZ, name = ''):
+        suffix = '' if name == '' else 'group.name =\'' + name + '\'\n'
+        file.write(suffix.join(rows) + suffix if rows.size else '')
+    else:
+        file.write(''.join([row if n == '' else row + 'group.name =\'' + n + '\'\n'
+                            for row, n in zip(rows, name[:, 0])]))
+    return instances
+
+@primitive
+def ruby_line(file, XYZ, name = '', mode = 'segments'):
     """
     Draws a line along the array of points XYZ. If required a name can be given.
 
+    In mode 'polyline', the points are written once as a packed array and the
+    line is drawn in a single group by one add_edges call, instead of one
+    group per segment (mode 'segments'). Named segments are then drawn as
+    separate named groups, and the polyline is split around them.
+
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
-    XYZ : np.ndarray
-        N-by-3 array of line coordinates
-    name : np.ndarray, str (optional)
-        Global line name or list of names for each segment
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
+    XYZ : np.ndarray, str, iterator
+        N-by-3 array of line coordinates, or path to a .npy file,
+        memory-mapped array or iterator of arrays for streamed input (see
+        ruby_point). Consecutive blocks are joined by a segment
+    name : np.ndarray, dict, str (optional)
+        Global line name, list of names for each segment, or dict mapping the
+        index of named segments to their name
+    mode : str (optional)
+        'segments' (default) or 'polyline'
 
     Examples
     --------
@@ -364,56 +723,142 @@ def ruby_line(file, XYZ, name = ''):
     >>>ruby_line(file, np.array([[0, 5, 4], [2, 5, 4], [2, 5, 2]]),
     >>>    name = np.array([["line1"], ["line2"]]))
 
+    Draws a trajectory of 100000 points as one polyline, naming its first
+    segment
+    >>>ruby_line(file, np.cumsum(np.random.randn(100000, 3), axis = 0),
+    >>>    name = {0: "start"}, mode = 'polyline')
+
     """
-    if type(XYZ) is not np.ndarray:
-        raise TypeError('Error in ruby_line. XYZ should be a numpy.array.')
+    if file.validate:
+        check_choice('ruby_line', 'mode', mode, ['segments', 'polyline'])
+        if not is_stream(XYZ):
+            check_array('ruby_line', 'XYZ', XYZ, (None, 3))
+            check_segment_names('ruby_line', name, XYZ.shape[0] - 1)
 
-    if not(XYZ.shape[1] == 3):
-        raise ValueError('Error in ruby_line. Dimension of XYZ is invalid.')
+    if mode == 'polyline':
+        count = _polyline(file, XYZ, name)
+    else:
+        count = _segments(file, XYZ, name)
 
-    for elt in XYZ:
-        if not(isinstance(elt[0], numbers.Real) \
-            and isinstance(elt[1], numbers.Real) \
-            and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_line. ',
-                'XYZ should consist of only numeric values.')
+    if file.validate and is_stream(XYZ):
+        check_segment_names('ruby_line', name, count - 1)
 
-    if type(name) is not np.ndarray and not isinstance(name, str):
-        raise TypeError('Error in ruby_line. Not a valid type for name. ',
-            'name must be either a str or a numpy.ndarray.')
+def _segments(file, XYZ, name):
+    """
+    Writes the lines of ruby_line in mode 'segments', one group per segment.
+    The last point of each block of rows is kept to draw the segment joining
+    it to the next block. Returns the number of points.
+    """
+    start = 0
+    last = None
+    for chunk in (iter_chunks(XYZ) if is_stream(XYZ) else [XYZ]):
+        if file.validate:
+            check_array('ruby_line', 'XYZ', chunk, (None, 3))
+        if chunk.shape[0] == 0:
+            continue
+
+        coords = SCALE_FACTOR * _local(file, chunk)
+        if last is not None:
+            coords = np.concatenate((last, coords))
+        last = coords[-1:]
+
+        # Segments start to stop of the line
+        stop = start + coords.shape[0] - 1
+        if isinstance(name, dict):
+            names = np.full((stop - start, 1), '', dtype = object)
+            for index in name:
+                if start <= index < stop:
+                    names[index - start, 0] = name[index]
+        else:
+            names = take_rows(name, start, stop)
+            if file.validate:
+                check_name('ruby_line', names, stop - start)
 
-    if not isinstance(name, str):
-        if not (name.shape[0] == XYZ.shape[0] - 1) or not (name.shape[1] == 1):
-            raise ValueError('Error in ruby_line. Dimension of name is invalid.')
+        rows = file.format_rows('\ngroup = Sketchup.active_model.entities.add_group\n' \
+                                + 'group.entities.add_line([%s,%s,%s], [%s,%s,%s])\n',
+                                np.concatenate((coords[:-1], coords[1:]), axis = 1))
 
-    if isinstance(name, str):
-        name = np.full((XYZ.shape[0], 1), name)
+        if isinstance(names, str):
+            suffix = '' if names == '' else 'group.name =\'' + names + '\'\n'
+            file.write(suffix.join(rows) + suffix if rows else '')
+        else:
+            file.write(''.join([row if n == '' else row + 'group.name =\'' + n + '\'\n'
+                                for row, n in zip(rows, names[:, 0])]))
+        start = stop
 
-    for index in range(XYZ.shape[0] - 1):
-        ruby_newline(file)
-        file.write('group = Sketchup.active_model.entities.add_group')
-        ruby_newline(file)
-        file.write('group.entities.add_line([' + \
-                   str(SCALE_FACTOR * XYZ[index, 0]) + ',' + \
-                   str(SCALE_FACTOR * XYZ[index, 1]) + ',' + \
-                   str(SCALE_FACTOR * XYZ[index, 2]) + '], [' + \
-                   str(SCALE_FACTOR * XYZ[index + 1, 0]) + ',' + \
-                   str(SCALE_FACTOR * XYZ[index + 1, 1]) + ',' + \
-                   str(SCALE_FACTOR * XYZ[index + 1, 2]) + '])' \
-                  )
-        ruby_newline(file)
-        if not (name[index, 0] == ''):
-            file.write('group.name =\'' + name[index, 0] + '\'')
-            ruby_newline(file)
+    return 0 if last is None else start + 1
 
+def _polyline(file, XYZ, name):
+    """
+    Writes the lines of ruby_line in mode 'polyline'. The points are appended
+    to the ruby array ln_v block by block, the edges are drawn once all of
+    them are written. Nothing is written for a line of less than 2 points.
+    Returns the number of points.
+    """
+    count = 0
+    # First rows, held until they make a line
+    held = np.empty((0, 3))
+    for chunk in (iter_chunks(XYZ) if is_stream(XYZ) else [XYZ]):
+        if file.validate:
+            check_array('ruby_line', 'XYZ', chunk, (None, 3))
+        if chunk.shape[0] == 0:
+            continue
+        if count < 2:
+            held = chunk if held.shape[0] == 0 \
+                else np.concatenate((held, chunk))
+            count = held.shape[0]
+            if count >= 2:
+                file.write('\ngroup = Sketchup.active_model.entities.add_group\n')
+                file.write_array('ln_v', '%s,%s,%s',
+                                 SCALE_FACTOR * _local(file, held))
+            continue
+        file.write_array('ln_v', '%s,%s,%s',
+                         SCALE_FACTOR * _local(file, chunk), append = True)
+        count += chunk.shape[0]
+
+    if count < 2:
+        return count
+
+    if isinstance(name, np.ndarray):
+        named = {}
+        for start in range(0, name.shape[0], CHUNK_ROWS):
+            names = take_rows(name, start, start + CHUNK_ROWS)
+            index = np.flatnonzero(names[:, 0] != '')
+            named.update(zip((index + start).tolist(), names[index, 0]))
+        name = named
+
+    file.write('ln_p = ln_v.each_slice(3).to_a\n')
+
+    lines = []
+    start = 0
+    for index in (sorted(name) if isinstance(name, dict) else []):
+        if index > start:
+            lines.append('group.entities.add_edges(ln_p[' + str(start) \
+                         + '..' + str(index) + '])')
+        lines += ['named = Sketchup.active_model.entities.add_group',
+                  'named.entities.add_line(ln_p[' + str(index) + '], ln_p[' \
+                      + str(index + 1) + '])',
+                  'named.name =\'' + name[index] + '\'']
+        start = index + 1
+    if count - 1 > start:
+        lines.append('group.entities.add_edges(ln_p[' + str(start) + '..' \
+                     + str(count - 1) + '])')
+
+    if isinstance(name, str) and not (name == ''):
+        lines.append('group.name =\'' + name + '\'')
+
+    file.write_lines(lines)
+    return count
+
+@primitive
 def ruby_axis(file, P, R, name = ''):
     """
     Draws a 3 axis coordinate system at the position P and orientation R.
 
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
     P : np.ndarray
         1-by-3 array of coordinates
     R : np.ndarray
@@ -430,39 +875,12 @@ def ruby_axis(file, P, R, name = ''):
     >>>                                name = "reference_axis")
 
     """
-    if type(P) is not np.ndarray:
-        TypeError('Error in ruby_axis. Type of P is not valid. ',
-            'Expects an numpy.ndarray')
-
-    if not(P.shape[0] == 1 and P.shape[1] == 3):
-        ValueError('Error in ruby_axis. Dimension of P is not valid')
-
-    if type(R) is not np.ndarray:
-        TypeError('Error in ruby_axis. Type of R is not valid. ',
-            'Expects an numpy.ndarray')
-
-    if not(R.shape[0] == 3 and R.shape[1] == 3):
-        ValueError('Error in ruby_axis. Dimension of R is not valid')
-
-    for elt in P[0]:
-        if not isinstance(elt, numbers.Real):
-            raise TypeError('Error in ruby_axis. ',
-                'P should consist of only numeric values.')
-
-    for elt in R:
-        if not(isinstance(elt[0], numbers.Real) \
-            and isinstance(elt[1], numbers.Real) \
-            and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_axis. ',
-                'R should consist of only numeric values.')
+    if file.validate:
+        check_array('ruby_axis', 'P', P, (1, 3))
+        check_rotation('ruby_axis', 'R', R)
+        check_name('ruby_axis', name)
 
-    if not((np.matmul(R, np.transpose(R)) == np.matmul(np.transpose(R), R)).all()):
-        raise ValueError('Error in ruby_axis. R should be an orthogonal matrix')
-
-    if not isinstance(name, str):
-        TypeError('Error in ruby_axis. Type of name is not valid. Expects str')
-
-    P = P * SCALE_FACTOR
+    P = _local(file, P) * SCALE_FACTOR
     P = P[0]
     R = R * SCALE_FACTOR
 
@@ -470,140 +888,50 @@ def ruby_axis(file, P, R, name = ''):
     ey = R[:, 1]
     ez = R[:, 2]
 
-    ruby_newline(file)
-    file.write('group.entities.add_line([' + \
-               str(P[0]) + ',' + \
-               str(P[1]) + ',' + \
-               str(P[2]) + '], [' + \
-               str(P[0] + ex[0]) + ',' + \
-               str(P[1] + ex[1]) + ',' + \
-               str(P[2] + ex[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0]) + ',' + \
-               str(P[1]) + ',' + \
-               str(P[2]) + '], [' + \
-               str(P[0] + ey[0]) + ',' + \
-               str(P[1] + ey[1]) + ',' + \
-               str(P[2] + ey[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0]) + ',' + \
-               str(P[1]) + ',' + \
-               str(P[2]) + '], [' + \
-               str(P[0] + ez[0]) + ',' + \
-               str(P[1] + ez[1]) + ',' + \
-               str(P[2] + ez[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0] + 0.9 * ez[0] + 0.1 * ex[0]) + ',' + \
-               str(P[1] + 0.9 * ez[1] + 0.1 * ex[1]) + ',' + \
-               str(P[2] + 0.9 * ez[2] + 0.1 * ex[2]) + '], [' + \
-               str(P[0] + ez[0]) + ',' + \
-               str(P[1] + ez[1]) + ',' + \
-               str(P[2] + ez[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0] + 0.9 * ez[0] - 0.1 * ex[0]) + ',' + \
-               str(P[1] + 0.9 * ez[1] - 0.1 * ex[1]) + ',' + \
-               str(P[2] + 0.9 * ez[2] - 0.1 * ex[2]) + '], [' + \
-               str(P[0] + ez[0]) + ',' + \
-               str(P[1] + ez[1]) + ',' + \
-               str(P[2] + ez[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0] + 0.9 * ey[0] + 0.1 * ex[0]) + ',' + \
-               str(P[1] + 0.9 * ey[1] + 0.1 * ex[1]) + ',' + \
-               str(P[2] + 0.9 * ey[2] + 0.1 * ex[2]) + '], [' + \
-               str(P[0] + ey[0]) + ',' + \
-               str(P[1] + ey[1]) + ',' + \
-               str(P[2] + ey[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0] + 0.9 * ey[0] - 0.1 * ex[0]) + ',' + \
-               str(P[1] + 0.9 * ey[1] - 0.1 * ex[1]) + ',' + \
-               str(P[2] + 0.9 * ey[2] - 0.1 * ex[2]) + '], [' + \
-               str(P[0] + ey[0]) + ',' + \
-               str(P[1] + ey[1]) + ',' + \
-               str(P[2] + ey[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0] + 0.9 * ex[0] - 0.1 * ey[0]) + ',' + \
-               str(P[1] + 0.9 * ex[1] - 0.1 * ey[1]) + ',' + \
-               str(P[2] + 0.9 * ex[2] - 0.1 * ey[2]) + '], [' + \
-               str(P[0] + ex[0]) + ',' + \
-               str(P[1] + ex[1]) + ',' + \
-               str(P[2] + ex[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0] + 0.9 * ex[0] - 0.1 * ez[0]) + ',' + \
-               str(P[1] + 0.9 * ex[1] - 0.1 * ez[1]) + ',' + \
-               str(P[2] + 0.9 * ex[2] - 0.1 * ez[2]) + '], [' + \
-               str(P[0] + ex[0]) + ',' + \
-               str(P[1] + ex[1]) + ',' + \
-               str(P[2] + ex[2]) + '])' \
-              )
-    ruby_newline(file)
+    lines = np.array([[P, P + ex],
+                      [P, P + ey],
+                      [P, P + ez],
+                      [P + 0.9 * ez + 0.1 * ex, P + ez],
+                      [P + 0.9 * ez - 0.1 * ex, P + ez],
+                      [P + 0.9 * ey + 0.1 * ex, P + ey],
+                      [P + 0.9 * ey - 0.1 * ex, P + ey],
+                      [P + 0.9 * ex - 0.1 * ey, P + ex],
+                      [P + 0.9 * ex - 0.1 * ez, P + ex]])
+
+    file.newline()
+    file.write_block('group.entities.add_line([%s,%s,%s], [%s,%s,%s])\n',
+                     lines.reshape(-1, 6))
 
     if not (name == ''):
         file.write('group.name =\'' + name + '\'')
-        ruby_newline(file)
-
-    file.write('group.entities.add_text("x", [' + \
-               str(P[0] + ex[0]) + ',' + \
-               str(P[1] + ex[1]) + ',' + \
-               str(P[2] + ex[2]) + '], [0, 0, 0])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_text("y", [' + \
-               str(P[0] + ey[0]) + ',' + \
-               str(P[1] + ey[1]) + ',' + \
-               str(P[2] + ey[2]) + '], [0, 0, 0])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_text("z", [' + \
-               str(P[0] + ez[0]) + ',' + \
-               str(P[1] + ez[1]) + ',' + \
-               str(P[2] + ez[2]) + '], [0, 0, 0])' \
-              )
-    ruby_newline(file)
+        file.newline()
+
+    file.write(file.format_block('group.entities.add_text("x", [%s,%s,%s], [0, 0, 0])\n', P + ex)
+             + file.format_block('group.entities.add_text("y", [%s,%s,%s], [0, 0, 0])\n', P + ey)
+             + file.format_block('group.entities.add_text("z", [%s,%s,%s], [0, 0, 0])\n', P + ez))
 
+@primitive
 def ruby_ellipsoid(file, P, K, color='n', name='', texture=''):
     """
-    Draws error ellipsoid with coordinates P and variance-covariance Matrix K.
-    If required, name and color or texture can be added as well.
+    Draws error ellipsoids with coordinates P and variance-covariance
+    matrices K. If required, name and color or texture can be added as well.
+    All ellipsoids are computed in one batch.
 
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
     P : np.ndarray
-        1-by-3 array of coordinates
+        N-by-3 array of coordinates, possibly memory-mapped (see load_array)
     K : np.ndarray
-        3-by-3 covariance error matrix
-    color : str (optional)
+        3-by-3 covariance error matrix, or N-by-3-by-3 array of one covariance
+        matrix per position, possibly memory-mapped
+    color : str, tuple (optional)
         One of the following colors:
-        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k'
-    name : str (optional)
-        Name of the ellipsoid
+        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k',
+        or an (r, g, b) tuple of integers in [0, 255]
+    name : np.ndarray, str (optional)
+        Name of all ellipsoids or N-by-1 array of individual names
     texture : str (optional)
         Path to an image file with extension .png .jpg or .jpeg
 
@@ -641,132 +969,112 @@ def ruby_ellipsoid(file, P, K, color='n', name='', texture=''):
     Draws a black ellipsoid given orthogonal matrix K
     >>>ruby_ellipsoid(file, np.array([[0, 0, 70]]), K, color = 'k')
 
-    """
-
-    print(K)
-
-    if type(P) is not np.ndarray:
-        TypeError('Error in ruby_ellipsoid. Type of P is not valid. ',
-            'Expects an numpy.ndarray')
-
-    if not(P.shape[0] == 1 and P.shape[1] == 3):
-        ValueError('Error in ruby_ellipsoid. Dimension of P is not valid')
-
-    if type(K) is not np.ndarray:
-        TypeError('Error in ruby_ellipsoid. Type of K is not valid. ',
-            'Expects an numpy.ndarray')
-
-    if not(K.shape[0] == 3 and K.shape[1] == 3):
-        ValueError('Error in ruby_ellipsoid. Dimension of K is not valid')
-
-    for elt in P[0]:
-        if not isinstance(elt, numbers.Real):
-            raise TypeError('Error in ruby_ellipsoid. ',
-                'P should consist of only numeric values.')
-
-    for elt in K:
-        if not(isinstance(elt[0], numbers.Real) \
-            and isinstance(elt[1], numbers.Real) \
-            and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_ellipsoid. ',
-                'R should consist of only numeric values.')
+    Draws the error ellipsoids of a whole network in one call
+    >>>ruby_ellipsoid(file, XYZ, np.stack([K] * XYZ.shape[0]), color = 'r')
 
-    if not((np.matmul(K, np.transpose(K)) == np.matmul(np.transpose(K), K)).all()):
-        raise ValueError('Error in ruby_ellipsoid. ',
-            'R should be an orthogonal matrix')
+    Draws error ellipsoids stored in .npy files, read block by block
+    >>>ruby_ellipsoid(file, load_array('P.npy'), load_array('K.npy'))
 
-    if not isinstance(name, str):
-        TypeError('Error in ruby_ellipsoid. ',
-            'Type of name is not valid. Expects str')
+    """
 
-    valid_colors = ['n', 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k']
+    if isinstance(K, np.ndarray) and K.ndim == 2:
+        K = K[np.newaxis]
 
-    if color not in valid_colors or not isinstance(color, str):
-        raise TypeError('Error in ruby_ellipsoid. Not a valid color.')
+    if file.validate:
+        check_shape('ruby_ellipsoid', 'P', P, (None, 3))
+        check_shape('ruby_ellipsoid', 'K', K, (None, 3, 3))
+        if not(K.shape[0] == P.shape[0] or K.shape[0] == 1):
+            raise ValueError('Error in ruby_ellipsoid. ',
+                'P and K should have the same number of entries')
+        check_name('ruby_ellipsoid', name, P.shape[0])
+        check_color('ruby_ellipsoid', color)
+        check_texture('ruby_ellipsoid', texture)
 
-    if not texture == '':
-        if not isinstance(texture, str):
-            raise TypeError('Error in ruby_ellipsoid. Expects a string path')
+    suffix = ''
+    if not (color == 'n'):
+        suffix += 'sph1.material = ' + ruby_material(file, color) + '\n'
+    if isinstance(name, str) and not (name == ''):
+        suffix += 'sph1.name =\'' + name.replace('%', '%%') + '\'\n'
+    if not (texture == ''):
+        suffix += 'sph1.material = ' + ruby_material(file, texture = texture) \
+                + '\n'
+
+    # Blocks of rows are computed in turn, so that memory-mapped P and K are
+    # never read as a whole
+    for start in range(0, P.shape[0], CHUNK_ROWS):
+        stop = start + CHUNK_ROWS
+        _ellipsoid_rows(file, take_rows(P, start, stop),
+                        K if K.shape[0] == 1 else take_rows(K, start, stop),
+                        take_rows(name, start, stop), suffix)
+        release(P)
+        release(K)
+
+def _ellipsoid_rows(file, P, K, name, suffix):
+    """
+    Writes a block of rows of ruby_ellipsoid, suffix being the ruby code
+    shared by all ellipsoids.
+    """
+    if file.validate:
+        check_array('ruby_ellipsoid', 'P', P, (None, 3))
+        check_symmetric('ruby_ellipsoid', 'K', K)
 
     tol_angle = 0.1 * np.pi / 180
 
-    P = P * SCALE_FACTOR
-    P = P[0]
-
-    K_inv = np.linalg.inv(K)
-
-    D, V = np.linalg.eig(K_inv)
-
-    r = 1 / np.sqrt(D)
-
-    if np.linalg.det(V) < 0:
-        V = -V
-
-    v, t = M_to_rodriges(V)
-
-    if np.any(np.iscomplex(v)):
-        raise TypeError('Error in ruby_ellipsoid. Complex number encountered')
-
-    if np.any(np.iscomplex(r)):
-        raise TypeError('Error in ruby_ellipsoid. Complex number encountered')
-
-#    rotation_vector = ruby_M_to_Rodriges(V)
-#    if not(np.linalg.norm(rotation_vector) == 0):
-#        V = -rotation_vector / np.linalg.norm(rotation_vector)
-#    t = np.linalg.norm(rotation_vector)
-
-#    if(not np.isreal(r).all()):
-#        raise ValueError('Error in ruby_ellipsoid. Complex number encountered')
+    P = _local(file, P) * SCALE_FACTOR
 
-    ruby_newline(file)
-    file.write('sph1 = sph0.copy')
-    ruby_newline(file)
-    file.write('s = Geom::Transformation.scaling(' + str(r[0]) + ',' \
-                                                   + str(r[1]) + ',' \
-                                                   + str(r[2]) + ')')
+    # Semi-axes are the square roots of the eigenvalues of K, along its
+    # eigenvectors
+    D, V = np.linalg.eigh(K)
 
-    if abs(t) >  tol_angle:
-        ruby_newline(file)
-        file.write('r = Geom::Transformation.rotation([0,0,0],[' \
-            + str(np.real(v[0])) + ',' \
-            + str(np.real(v[1])) + ',' \
-            + str(np.real(v[2])) + '],' \
-            + str(np.real(t)) + ')')
-
-    ruby_newline(file)
-    file.write('t = Geom::Transformation.new([' + str(P[0]) + ',' \
-                                                + str(P[1]) + ',' \
-                                                + str(P[2]) + '])')
-    ruby_newline(file)
-    file.write('sph1.entities.transform_entities(s,sph1)')
-#    if abs(t) >  tol_angle:
-
-    if abs(t) >  tol_angle:
-        ruby_newline(file)
-        file.write('sph1.entities.transform_entities(r,sph1)')
-
-    ruby_newline(file)
-    file.write('sph1.entities.transform_entities(t,sph1)')
-    ruby_newline(file)
-    if not (color == 'n'):
-        file.write('sph1.material = ' + ruby_rgb_color(color))
-        ruby_newline(file)
-    if not (name == ''):
-        file.write('sph1.name =\'' + name + '\'')
-        ruby_newline(file)
+    if (D <= 0).any():
+        raise ValueError('Error in ruby_ellipsoid. ',
+            'K should be positive definite')
+
+    r = np.sqrt(D)
+
+    # Eigenvectors are defined up to their sign: make V a proper rotation, then
+    # flip the pair of axes giving the largest trace, which bounds the
+    # rotation angle to 120 degrees
+    V[np.linalg.det(V) < 0] *= -1
+    diag = np.diagonal(V, axis1 = 1, axis2 = 2)
+    flips = np.array([[ 1,  1,  1],
+                      [ 1, -1, -1],
+                      [-1,  1, -1],
+                      [-1, -1,  1]])
+    V = V * flips[np.argmax(np.matmul(diag, flips.T), axis = 1), np.newaxis, :]
+
+    v, t = rotation_to_axis_angle(V)
+
+    r = np.broadcast_to(r, (P.shape[0], 3))
+    v = np.broadcast_to(v, (P.shape[0], 3))
+    t = np.broadcast_to(t, (P.shape[0],))
+    rotated = np.abs(t) > tol_angle
+
+    rows = np.empty(P.shape[0], dtype = object)
+    rows[~rotated] = file.format_rows(
+        '\nsph1 = sph0.copy' \
+        + '\ns = Geom::Transformation.scaling(%r,%r,%r)' \
+        + '\nt = Geom::Transformation.new([%s,%s,%s])' \
+        + '\nsph1.entities.transform_entities(s,sph1)' \
+        + '\nsph1.entities.transform_entities(t,sph1)\n' + suffix,
+        np.concatenate((r, P), axis = 1)[~rotated])
+    rows[rotated] = file.format_rows(
+        '\nsph1 = sph0.copy' \
+        + '\ns = Geom::Transformation.scaling(%r,%r,%r)' \
+        + '\nr = Geom::Transformation.rotation([0,0,0],[%r,%r,%r],%r)' \
+        + '\nt = Geom::Transformation.new([%s,%s,%s])' \
+        + '\nsph1.entities.transform_entities(s,sph1)' \
+        + '\nsph1.entities.transform_entities(r,sph1)' \
+        + '\nsph1.entities.transform_entities(t,sph1)\n' + suffix,
+        np.concatenate((r, v, t[:, np.newaxis], P), axis = 1)[rotated])
 
-    if not (texture == ''):
-        file.write('texture_path = "#{File.dirname(__FILE__)}' + texture + '"')
-        ruby_newline(file)
-        file.write('materials=Sketchup.active_model.materials')
-        ruby_newline(file)
-        file.write('ellips = materials.add "ellipsoid texture"')
-        ruby_newline(file)
-        file.write('ellips.texture = texture_path')
-        ruby_newline(file)
-        file.write('sph1.material = ellips')
-        ruby_newline(file)
+    if isinstance(name, str):
+        file.write(''.join(rows))
+    else:
+        file.write(''.join([row if n == '' else row + 'sph1.name =\'' + n + '\'\n'
+                            for row, n in zip(rows, name[:, 0])]))
 
+@primitive
 def ruby_pose(file, P, R, focal = 0.2, width = 0.1, height = 0.1, color = 'n', name = ''):
     """
     Draws a pose with position P in the center of the projection and
@@ -775,8 +1083,8 @@ def ruby_pose(file, P, R, focal = 0.2, width = 0.1, height = 0.1, color = 'n', n
 
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
     P : np.ndarray
         1-by-3 array of coordinates
     R : np.ndarray
@@ -787,9 +1095,10 @@ def ruby_pose(file, P, R, focal = 0.2, width = 0.1, height = 0.1, color = 'n', n
         Image width (0.1 default)
     height : int, float (optional)
         Image height (0.1 default)
-    color : str (optional)
+    color : str, tuple (optional)
         One of the following colors:
-        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k'
+        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k',
+        or an (r, g, b) tuple of integers in [0, 255]
     name : str (optional)
         Name of the pose
 
@@ -820,56 +1129,16 @@ def ruby_pose(file, P, R, focal = 0.2, width = 0.1, height = 0.1, color = 'n', n
     >>>    height = 0.2, color = 'r')
 
     """
-    if type(P) is not np.ndarray:
-        TypeError('Error in ruby_pose. Type of P is not valid. ',
-            'Expects an numpy.ndarray')
-
-    if not(P.shape[0] == 1 and P.shape[1] == 3):
-        ValueError('Error in ruby_pose. Dimension of P is not valid')
-
-    if type(R) is not np.ndarray:
-        TypeError('Error in ruby_pose. Type of R is not valid. ',
-            'Expects an numpy.ndarray')
-
-    if not(R.shape[0] == 3 and R.shape[1] == 3):
-        ValueError('Error in ruby_pose. Dimension of R is not valid')
-
-    for elt in P[0]:
-        if not isinstance(elt, numbers.Real):
-            raise TypeError('Error in ruby_pose. ',
-                'P should consist of only numeric values.')
-
-    for elt in R:
-        if not(isinstance(elt[0], numbers.Real) \
-            and isinstance(elt[1], numbers.Real) \
-            and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_pose. ',
-                'R should consist of only numeric values.')
-
-    if not((np.matmul(R, np.transpose(R)) == np.matmul(np.transpose(R), R)).all()):
-        raise ValueError('Error in ruby_pose. R should be an orthogonal matrix')
-
-    if not isinstance(name, str):
-        TypeError('Error in ruby_pose. Type of name is not valid. Expects str')
-
-    valid_colors = ['n', 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k']
-
-    if color not in valid_colors or not isinstance(color, str):
-        raise TypeError('Error in ruby_pose. Not a valid color.')
-
-    if not(isinstance(focal, (int, float))):
-        raise TypeError('Error in ruby_pose. Not a valid type for focal. ',
-            'Expects a numeric type')
-
-    if not(isinstance(width, (int, float))):
-        raise TypeError('Error in ruby_pose. Not a valid type for width. ',
-            'Expects a numeric type')
-
-    if not(isinstance(height, (int, float))):
-        raise TypeError('Error in ruby_pose. Not a valid type for height. ',
-            'Expects a numeric type')
-
-    P = P * SCALE_FACTOR
+    if file.validate:
+        check_array('ruby_pose', 'P', P, (1, 3))
+        check_rotation('ruby_pose', 'R', R)
+        check_name('ruby_pose', name)
+        check_color('ruby_pose', color)
+        check_number('ruby_pose', 'focal', focal)
+        check_number('ruby_pose', 'width', width)
+        check_number('ruby_pose', 'height', height)
+
+    P = _local(file, P) * SCALE_FACTOR
     P = P[0]
 
     R = R * SCALE_FACTOR
@@ -883,81 +1152,31 @@ def ruby_pose(file, P, R, focal = 0.2, width = 0.1, height = 0.1, color = 'n', n
     c = P - width * ex - height * ey - focal * ez
     d = P + width * ex - height * ey - focal * ez
 
-    ruby_newline(file)
-    file.write('group = Sketchup.active_model.entities.add_group')
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0]) + ',' + \
-               str(P[1]) + ',' + \
-               str(P[2]) + '], [' + \
-               str(a[0]) + ',' + \
-               str(a[1]) + ',' + \
-               str(a[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0]) + ',' + \
-               str(P[1]) + ',' + \
-               str(P[2]) + '], [' + \
-               str(b[0]) + ',' + \
-               str(b[1]) + ',' + \
-               str(b[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0]) + ',' + \
-               str(P[1]) + ',' + \
-               str(P[2]) + '], [' + \
-               str(c[0]) + ',' + \
-               str(c[1]) + ',' + \
-               str(c[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('group.entities.add_line([' + \
-               str(P[0]) + ',' + \
-               str(P[1]) + ',' + \
-               str(P[2]) + '], [' + \
-               str(d[0]) + ',' + \
-               str(d[1]) + ',' + \
-               str(d[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    file.write('f = group.entities.add_face([' + \
-               str(a[0]) + ',' + \
-               str(a[1]) + ',' + \
-               str(a[2]) + '], [' + \
-               str(b[0]) + ',' + \
-               str(b[1]) + ',' + \
-               str(b[2]) + '], [' + \
-               str(c[0]) + ',' + \
-               str(c[1]) + ',' + \
-               str(c[2]) + '], [' + \
-               str(d[0]) + ',' + \
-               str(d[1]) + ',' + \
-               str(d[2]) + '])' \
-              )
-    ruby_newline(file)
-
-    # Strange why specific fixed material here
-    file.write('f.material = [255,10,1]')
-    ruby_newline(file)
-
-    file.write('f.material.alpha = 0.5')
-    ruby_newline(file)
+    lines = ['',
+             'group = Sketchup.active_model.entities.add_group',
+             file.format_block('group.entities.add_line([%s,%s,%s], [%s,%s,%s])\n' * 3 \
+                             + 'group.entities.add_line([%s,%s,%s], [%s,%s,%s])',
+                               np.concatenate((P, a, P, b, P, c, P, d))),
+             file.format_block('f = group.entities.add_face(' \
+                             + '[%s,%s,%s], [%s,%s,%s], [%s,%s,%s], [%s,%s,%s])',
+                               np.concatenate((a, b, c, d))),
+             # Strange why specific fixed material here
+             'f.material = mat_pose']
+
+    file.define_once('mat_pose', ['',
+        'mat_pose = Sketchup.active_model.materials.add(\'ruby_lib_pose\')',
+        'mat_pose.color = [255,10,1]',
+        'mat_pose.alpha = 0.5'])
 
     if not (color == 'n'):
-        file.write('group.material = ' + ruby_rgb_color(color))
-        ruby_newline(file)
+        lines.append('group.material = ' + ruby_material(file, color))
 
     if not (name == ''):
-        file.write('group.name =\'' + name + '\'')
-        ruby_newline(file)
+        lines.append('group.name =\'' + name + '\'')
 
+    file.write_lines(lines)
+
+@primitive
 def ruby_plane(file, XYZ, color = 'n', texture = '', name = ''):
     """
     Draws the polygon given the coordinates in XYZ. If required, a name and
@@ -965,13 +1184,14 @@ def ruby_plane(file, XYZ, color = 'n', texture = '', name = ''):
 
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
     XYZ : np.ndarray
         N-by-3 array of point coordinates
-    color : str (optional)
+    color : str, tuple (optional)
         One of the following colors:
-        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k'
+        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k',
+        or an (r, g, b) tuple of integers in [0, 255]
     name : str (optional)
         Label
     texture : str (optional)
@@ -987,135 +1207,45 @@ def ruby_plane(file, XYZ, color = 'n', texture = '', name = ''):
     >>>    color = 'b', name = 'myplane')
 
     """
-    if type(XYZ) is not np.ndarray:
-        raise TypeError('Error in ruby_plane. XYZ should be a numpy.array.')
-
-    if not(XYZ.shape[1] == 3):
-        raise ValueError('Error in ruby_plane. Dimension of XYZ is invalid.')
-
-    if XYZ.shape[0] < 3:
-        raise ValueError('Error in ruby_plane. Dimension of XYZ is invalid.')
-
-    for elt in XYZ:
-        if not(isinstance(elt[0], numbers.Real) \
-        and isinstance(elt[1], numbers.Real) \
-        and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_plane. ',
-                'XYZ should consist of only numeric values.')
-
-    if not isinstance(name, str):
-        TypeError('Error in ruby_plane. Type of name is not valid. Expects str')
-
-    valid_colors = ['n', 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k']
-
-    if color not in valid_colors or not isinstance(color, str):
-        raise TypeError('Error in ruby_plane. Not a valid color.')
-
-    if not texture == '':
-        if not isinstance(texture, str):
-            raise TypeError('Error in ruby_ellipsoid. Expects a string path')
-
-    iscolinear = True
-    for index in range(XYZ.shape[0] - 3):
-        A = np.array([[XYZ[index, 0], XYZ[index, 1], XYZ[index, 2]]])
-        B = np.array([[XYZ[index + 1, 0], XYZ[index + 1, 1], XYZ[index + 1, 2]]])
-        C = np.array([[XYZ[index + 2, 0], XYZ[index + 2, 1], XYZ[index + 2, 2]]])
-        cross_product = np.cross(B - A, C - A)
-        if ((np.abs(cross_product) > TOL_CROSS_PRODUCT).any()):
-            iscolinear = False
-
-    if(iscolinear):
-        raise ValueError('Error in ruby_plane. The points are colinear.')
-
-
-    if not XYZ.shape[0] == 3:
-        for index in range(XYZ.shape[0] - 4):
-            volume = np.array([[XYZ[index, 0], XYZ[index, 1], XYZ[index, 2], 1], \
-                               [XYZ[index + 1, 0], XYZ[index + 1, 1], XYZ[index + 1, 2], 1], \
-                               [XYZ[index + 2, 0], XYZ[index + 2, 1], XYZ[index + 2, 2], 1], \
-                               [XYZ[index + 3, 0], XYZ[index + 3, 1], XYZ[index + 3, 2], 1]] \
-                             )
-            if not (np.linalg.det(volume) < TOL_COPLANARITY):
-                raise ValueError('Error in ruby_plane. The points are not coplanar')
-
-    ruby_newline(file)
-    file.write('plane = Sketchup.active_model.entities.add_group')
-
-    ruby_newline(file)
-    file.write('plane_entities = plane.entities')
-
-    ruby_newline(file)
-    file.write('pts=[[')
-
-    for index in range(XYZ.shape[0] - 1):
-        file.write(str(SCALE_FACTOR * XYZ[index, 0]) + ',' + \
-                   str(SCALE_FACTOR * XYZ[index, 1]) + ',' + \
-                   str(SCALE_FACTOR * XYZ[index, 2]) + '],[' \
-                  )
-    file.write(str(SCALE_FACTOR * XYZ[XYZ.shape[0] - 1, 0]) + ',' + \
-                   str(SCALE_FACTOR * XYZ[XYZ.shape[0] - 1, 1]) + ',' + \
-                   str(SCALE_FACTOR * XYZ[XYZ.shape[0] - 1, 2]) + ']]' \
-                  )
-
-    ruby_newline(file)
-    file.write('face = plane_entities.add_face(pts)')
+    if file.validate:
+        check_array('ruby_plane', 'XYZ', XYZ, (None, 3))
+        if XYZ.shape[0] < 3:
+            raise ValueError('Error in ruby_plane. Dimension of XYZ is invalid.')
+        check_name('ruby_plane', name)
+        check_color('ruby_plane', color)
+        check_texture('ruby_plane', texture)
+        check_planar('ruby_plane', XYZ, TOL_CROSS_PRODUCT, TOL_COPLANARITY)
+
+    lines = ['',
+             'plane = Sketchup.active_model.entities.add_group',
+             'plane_entities = plane.entities',
+             'pts=[[' + '],['.join(file.format_rows('%s,%s,%s',
+                                    SCALE_FACTOR * _local(file, XYZ))) + ']]',
+             'face = plane_entities.add_face(pts)']
 
     if not (color == 'n'):
-        ruby_newline(file)
-        file.write('plane.material = ' + ruby_rgb_color(color))
+        lines.append('plane.material = ' + ruby_material(file, color))
 
     if not (name == ''):
-        ruby_newline(file)
-        file.write('plane.name =\'' + name +'\'')
+        lines.append('plane.name =\'' + name +'\'')
 
-    max_x = max(XYZ[:, 0])
-    max_y = max(XYZ[:, 1])
-    max_z = max(XYZ[:, 2])
+    plane_size = np.max(np.max(XYZ, axis = 0) - np.min(XYZ, axis = 0))
 
-    min_x = min(XYZ[:, 0])
-    min_y = min(XYZ[:, 1])
-    min_z = min(XYZ[:, 2])
+    if not(texture == ''):
+        lines.append('plane.material = ' + ruby_material(file, texture = texture,
+                                    size = plane_size * SCALE_FACTOR))
 
-    abs_x = abs(max_x - min_x)
-    abs_y = abs(max_y - min_y)
-    abs_z = abs(max_z - min_z)
+    lines += ['plane = plane.explode',
+              'plane_face = nil',
+              '',
+              'plane.each{|p| ',
+              'if p.is_a?(Sketchup::Face )',
+              'plane_face=p',
+              'end}']
 
-    plane_size = max(max(abs_x, abs_y), abs_z)
-
-    if not(texture == ''):
-        ruby_newline(file)
-        file.write('texture_path = "#{File.dirname(__FILE__)}' + texture + '"')
-
-        ruby_newline(file)
-        file.write('materials=Sketchup.active_model.materials')
-
-        ruby_newline(file)
-        file.write('plane_t = materials.add "plane texture"')
-
-        ruby_newline(file)
-        file.write('plane_t.texture = texture_path')
-
-        ruby_newline(file)
-        file.write('plane_t.texture.size = ' + str(plane_size * SCALE_FACTOR))
-
-        ruby_newline(file)
-        file.write('plane.material = plane_t')
-
-    ruby_newline(file)
-    file.write('plane = plane.explode')
-    ruby_newline(file)
-    file.write('plane_face = nil')
-    ruby_newline(file)
-    ruby_newline(file)
-    file.write('plane.each{|p| ')
-    ruby_newline(file)
-    file.write('if p.is_a?(Sketchup::Face )')
-    ruby_newline(file)
-    file.write('plane_face=p')
-    ruby_newline(file)
-    file.write('end}')
-    ruby_newline(file)
+    file.write_lines(lines)
 
+@primitive
 def ruby_theodolite(file, P, name = ''):
     """
     Places a theodolite at the coordinates P. If required, a name can be
@@ -1123,8 +1253,8 @@ def ruby_theodolite(file, P, name = ''):
 
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
     P : np.ndarray
         1-by-3 array of coordinates
     name : str (optional)
@@ -1132,27 +1262,11 @@ def ruby_theodolite(file, P, name = ''):
 
     """
 
-    if type(P) is not np.ndarray:
-        raise TypeError('Error in ruby_theodolite. P should be a numpy.array.')
-
-    if not(P.shape[1] == 3):
-        raise ValueError('Error in ruby_theodolite. Dimension of P is invalid.')
-
-    if not(P.shape[0] == 1):
-        raise ValueError('Error in ruby_theodolite. Dimension of P is invalid.')
-
-    for elt in P:
-        if not(isinstance(elt[0], numbers.Real) \
-            and isinstance(elt[1], numbers.Real) \
-            and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_theodolite. ',
-                'P should consist of only numeric values.')
+    if file.validate:
+        check_array('ruby_theodolite', 'P', P, (1, 3))
+        check_name('ruby_theodolite', name)
 
-    if not isinstance(name, str):
-        TypeError('Error in ruby_theodolite. ',
-            'Type of name is not valid. Expects str')
-
-    ruby_newline(file)
+    file.newline()
     file.write('theodolite = Sketchup.active_model.entities.add_group')
 
     x = P[0, 0]
@@ -1169,200 +1283,42 @@ def ruby_theodolite(file, P, name = ''):
     ruby_line(file, np.array([[x, y, z + 1],
         [x + r * np.sqrt(3) * 0.5, y - 0.5 * r, z]]))
 
-    ruby_newline(file)
-
-    file.write('face1=[[')
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + ']]'
-              )
-    ruby_newline(file)
-
-    file.write('face2=[[')
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + ']]'
-              )
-    ruby_newline(file)
-
-    file.write('face3=[[')
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + ']]'
-              )
-    ruby_newline(file)
-
-    file.write('face4=[[')
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + ']]'
-              )
-    ruby_newline(file)
-
-    file.write('face5=[[')
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x - l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + ']]'
-              )
-    ruby_newline(file)
-
-    file.write('face6=[[')
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y + l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + '],['
-              )
-    ruby_newline(file)
-
-    file.write(str(SCALE_FACTOR * (x + l)) + ',' + \
-               str(SCALE_FACTOR * (y - l * 0.5)) + ',' + \
-               str(SCALE_FACTOR * (z + 1 + l)) + ']]'
-              )
-    ruby_newline(file)
-
-    file.write('f = theodolite.entities.add_face(face1)')
-    ruby_newline(file)
-
-    file.write('f = theodolite.entities.add_face(face2)')
-    ruby_newline(file)
-
-    file.write('f = theodolite.entities.add_face(face3)')
-    ruby_newline(file)
-
-    file.write('f = theodolite.entities.add_face(face4)')
-    ruby_newline(file)
-
-    file.write('f = theodolite.entities.add_face(face5)')
-    ruby_newline(file)
-
-    file.write('f = theodolite.entities.add_face(face6)')
-    ruby_newline(file)
-
-    file.write('circle1 = theodolite.entities.add_circle([' +  \
-               str(SCALE_FACTOR * (x+l)) + ',' + \
-               str(SCALE_FACTOR * y) + ',' + \
-               str(SCALE_FACTOR * (z + (1 +l * 0.5))) +
-               '],X_AXIS,39.3701 * 0.03,24)' \
-              )
-    ruby_newline(file)
+    # The legs above are shifted by ruby_line, the head is written here
+    x, y, z = _local(file, P)[0]
+
+    xp = x + l
+    xm = x - l
+    ym = y - l * 0.5
+    yp = y + l * 0.5
+    z0 = z + 1
+    z1 = z + 1 + l
+
+    faces = SCALE_FACTOR * np.array([[[xp, ym, z0], [xp, yp, z0], [xm, yp, z0], [xm, ym, z0]],
+                                     [[xm, ym, z1], [xm, yp, z1], [xp, yp, z1], [xp, ym, z1]],
+                                     [[xp, ym, z0], [xm, ym, z0], [xm, ym, z1], [xp, ym, z1]],
+                                     [[xm, ym, z0], [xm, yp, z0], [xm, yp, z1], [xm, ym, z1]],
+                                     [[xp, yp, z0], [xm, yp, z0], [xm, yp, z1], [xp, yp, z1]],
+                                     [[xp, ym, z0], [xp, yp, z0], [xp, yp, z1], [xp, ym, z1]]])
+
+    lines = ['']
+    for index in range(faces.shape[0]):
+        lines.append('face' + str(index + 1) + '=[[')
+        lines.append('],[\n'.join(file.format_rows('%s,%s,%s', faces[index])) + ']]')
+
+    for index in range(faces.shape[0]):
+        lines.append('f = theodolite.entities.add_face(face' + str(index + 1) + ')')
+
+    lines.append(file.format_block(
+        'circle1 = theodolite.entities.add_circle([%s,%s,%s],X_AXIS,39.3701 * 0.03,24)',
+        np.array([SCALE_FACTOR * (x+l), SCALE_FACTOR * y,
+                  SCALE_FACTOR * (z + (1 +l * 0.5))])))
 
     if not (name == ''):
-        file.write('theodolite.name =\'' + name +'\'')
-        ruby_newline(file)
+        lines.append('theodolite.name =\'' + name +'\'')
 
+    file.write_lines(lines)
+
+@primitive
 def ruby_antenna(file, XYZ, name):
     """
     Places antennas at the coordinates XYZ. If required, a name can be
@@ -1370,89 +1326,48 @@ def ruby_antenna(file, XYZ, name):
 
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
     XYZ : np.ndarray
         N-by-3 array of antenna coordinates
     name : str (optional)
         Label
 
     """
-    if type(XYZ) is not np.ndarray:
-        raise TypeError('Error in ruby_antenna. P should be a numpy.array.')
-
-    if not(XYZ.shape[1] == 3):
-        raise ValueError('Error in ruby_antenna. Dimension of P is invalid.')
-
-    if not(XYZ.shape[0] >= 1):
-        raise ValueError('Error in ruby_antenna. Dimension of P is invalid.')
-
-    for elt in XYZ:
-        if not(isinstance(elt[0], numbers.Real) \
-            and isinstance(elt[1], numbers.Real) \
-            and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_antenna. ',
-                'XYZ should consist of only numeric values.')
-
-    if not isinstance(name, str):
-        TypeError('Error in ruby_antenna. ',
-            'Type of name is not valid. Expects str')
+    if file.validate:
+        check_array('ruby_antenna', 'XYZ', XYZ, (None, 3))
+        if not(XYZ.shape[0] >= 1):
+            raise ValueError('Error in ruby_antenna. Dimension of XYZ is invalid.')
+        check_name('ruby_antenna', name)
 
-    ruby_newline(file)
+    file.newline()
     file.write('antenna = Sketchup.active_model.entities.add_group')
 
     width = 0.2
     height = 2
 
-    for p in XYZ:
-        xi = p[0]
-        yi = p[1]
-        zi = p[2]
-        ruby_newline(file)
-        file.write('points=[[')
-
-        file.write(str(SCALE_FACTOR * (xi - width * 0.5)) + ',' + \
-                   str(SCALE_FACTOR * (yi)) + ',' + \
-                   str(SCALE_FACTOR * (zi)) + '],[' \
-                  )
-
-        file.write(str(SCALE_FACTOR * (xi + width * 0.5)) + ',' + \
-                   str(SCALE_FACTOR * (yi)) + ',' + \
-                   str(SCALE_FACTOR * (zi)) + '],[' \
-                  )
-
-        file.write(str(SCALE_FACTOR * (xi + width * 0.5)) + ',' + \
-                   str(SCALE_FACTOR * (yi)) + ',' + \
-                   str(SCALE_FACTOR * (zi + height)) + '],['
-                  )
-
-        file.write(str(SCALE_FACTOR * (xi - width * 0.5)) + ',' + \
-                   str(SCALE_FACTOR * (yi)) + ',' + \
-                   str(SCALE_FACTOR * (zi + height)) + ']]' \
-                  )
-
-        ruby_newline(file)
-        file.write('f2 = antenna.entities.add_face(points)')
-
-        ruby_newline(file)
-        file.write('c2 = antenna.entities.add_circle([' + \
-                    str(SCALE_FACTOR * xi) +  ',' + \
-                    str(SCALE_FACTOR * yi) + ',' + \
-                    str(SCALE_FACTOR * (zi)) + '],Z_AXIS,39.3701* 0.01,24)' \
-                  )
-
-        ruby_newline(file)
-        file.write('f2.followme(c2)')
-
-        ruby_newline(file)
-        file.write('antenna.material = ' +  ruby_rgb_color('r'))
+    XYZ = _local(file, XYZ)
+    xi = XYZ[:, 0]
+    yi = XYZ[:, 1]
+    zi = XYZ[:, 2]
 
-        if not (name == ''):
-            ruby_newline(file)
-            file.write('antenna.name =\'' + name +'\'')
+    template = '\npoints=[[%s,%s,%s],[%s,%s,%s],[%s,%s,%s],[%s,%s,%s]]' \
+             + '\nf2 = antenna.entities.add_face(points)' \
+             + '\nc2 = antenna.entities.add_circle([%s,%s,%s],Z_AXIS,39.3701* 0.01,24)' \
+             + '\nf2.followme(c2)' \
+             + '\nantenna.material = ' + ruby_material(file, 'r')
+    if not (name == ''):
+        template += '\nantenna.name =\'' + name.replace('%', '%%') +'\''
+    template += '\n'
 
-        ruby_newline(file)
+    file.write_block(template, SCALE_FACTOR * np.column_stack((
+        xi - width * 0.5, yi, zi,
+        xi + width * 0.5, yi, zi,
+        xi + width * 0.5, yi, zi + height,
+        xi - width * 0.5, yi, zi + height,
+        xi, yi, zi)))
 
+@primitive
 def ruby_resection(file, P_theodolite, XYZ_antenna, name = ''):
     """
     Draws a resetcion. If required, a name can be
@@ -1460,8 +1375,8 @@ def ruby_resection(file, P_theodolite, XYZ_antenna, name = ''):
 
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
     P_theodolite : np.ndarray
         1-by-3 array of coordinates
     XYZ_antenna : np.ndarray
@@ -1476,52 +1391,18 @@ def ruby_resection(file, P_theodolite, XYZ_antenna, name = ''):
     >>>    np.array([[0, -10, 0], [0, -2, 0], [-3, 0, 0]]))
 
     """
-    if type(P_theodolite) is not np.ndarray:
-        raise TypeError('Error in ruby_resection. ' \
-            + 'P_theodolite should be a numpy.array.')
-
-    if not(P_theodolite.shape[1] == 3):
-        raise ValueError('Error in ruby_resection. ' \
-            + 'Dimension of P_theodolite is invalid.')
-
-    if not(P_theodolite.shape[0] == 1):
-        raise ValueError('Error in ruby_resection. ' \
-            + 'Dimension of P_theodolite is invalid.')
-
-    for elt in P_theodolite:
-        if not(isinstance(elt[0], numbers.Real) \
-            and isinstance(elt[1], numbers.Real) \
-            and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_resection. ',
-                'P_theodolite should consist of only numeric values.')
-
-    if not(XYZ_antenna.shape[1] == 3):
-        raise ValueError('Error in ruby_resection. ',
-            'Dimension of XYZ_antenna is invalid.')
-
-    if not(XYZ_antenna.shape[0] >= 1):
-        raise ValueError('Error in ruby_resection. ',
-            'Dimension of XYZ_antenna is invalid.')
-
-    if type(XYZ_antenna) is not np.ndarray:
-        raise TypeError('Error in ruby_resection. '
-            'XYZ_antenna should be a numpy.array.')
-
-    for elt in XYZ_antenna:
-        if not(isinstance(elt[0], numbers.Real) \
-            and isinstance(elt[1], numbers.Real) \
-            and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_resection. ',
-                'XYZ_antenna should consist of only numeric values.')
-
-    if not isinstance(name, str):
-        TypeError('Error in ruby_resection. ',
-            'Type of name is not valid. Expects str')
-
-    ruby_newline(file)
+    if file.validate:
+        check_array('ruby_resection', 'P_theodolite', P_theodolite, (1, 3))
+        check_array('ruby_resection', 'XYZ_antenna', XYZ_antenna, (None, 3))
+        if not(XYZ_antenna.shape[0] >= 1):
+            raise ValueError('Error in ruby_resection. ',
+                'Dimension of XYZ_antenna is invalid.')
+        check_name('ruby_resection', name)
+
+    file.newline()
     file.write('resection = Sketchup.active_model.entities.add_group')
 
-    ruby_newline(file)
+    file.newline()
 
     x = P_theodolite[0, 0]
     y = P_theodolite[0, 1]
@@ -1537,29 +1418,77 @@ def ruby_resection(file, P_theodolite, XYZ_antenna, name = ''):
         ruby_antenna(file, np.array([[xi, yi, zi]]), name = name)
 
         ruby_line(file, np.array([[xi, yi, zi + 1.5], [x, y, z + 1.07]]))
-        ruby_newline(file)
+        file.newline()
 
-def ruby_tin(file, XYZ, triangles, color = 'n', texture = '', name = ''):
+@primitive
+def ruby_tin(file, XYZ, triangles, color = 'n', texture = '', name = '',
+             mode = 'faces', target_faces = None, max_vertical_error = None,
+             tile_size = None, processes = None):
     """
     Draws DEM (Digital Elevation Model) having TIN structure (Triangular
     Irregular Network). Triangles can be obtained from the points using the
     delaunay function.
 
+    In mode 'mesh', vertices and triangles are written as two packed arrays,
+    from which the ruby script builds a single Geom::PolygonMesh. This is
+    much smaller and faster to import than one variable per vertex and one
+    add_face per triangle (mode 'faces').
+
+    Given target_faces or max_vertical_error, the TIN is first simplified by
+    removing vertices in the order of the quadric error of the surface (see
+    decimation.decimate_tin). Its outline and remaining vertices do not move.
+
+    Given tile_size, the TIN is drawn in tiles of a regular XY grid, each
+    triangle going to the tile of its centroid. Every tile is a group of its
+    own, named after the tile and listed in the ruby hash ruby_lib_tiles, so
+    that tiles can be hidden, erased or drawn again one by one. A sharded
+    script may be split between two tiles: with a small shard_size, every
+    tile is written to a part of its own.
+
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
-    XYZ : np.ndarray
-        N-by-3 array of coordinates
-    triangles : np.ndarray
-        N-by-3 array of triangles, as returned by delaunay.simplices
-    color : str (optional)
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
+    XYZ : np.ndarray, str, iterator
+        N-by-3 array of coordinates, or path to a .npy file, memory-mapped
+        array or iterator of arrays for streamed input (see ruby_point)
+    triangles : np.ndarray, str, iterator
+        N-by-3 array of triangles, as returned by delaunay.simplices, or
+        streamed input. Indices refer to the rows of the whole XYZ
+    color : str, tuple, ColorScale (optional)
         One of the following colors:
-        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k'
+        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k',
+        an (r, g, b) tuple of integers in [0, 255], or a ColorScale of one
+        value per triangle or per point (see colormap.ColorScale)
     texture : str (optional)
         Path to an image file with extension .png .jpg or .jpeg
     name : str (optional)
         Label of the DEM
+    mode : str (optional)
+        'faces' (default) or 'mesh'
+    target_faces : int (optional)
+        Number of triangles the TIN is simplified to
+    max_vertical_error : float (optional)
+        Largest vertical distance (m) between the given vertices and the
+        simplified TIN. The TIN is simplified as much as this allows, or down
+        to target_faces triangles if both are given
+    tile_size : float, tuple (optional)
+        Size (m) of the tiles along X and Y, or one size for both. Tile
+        (i, j) holds the centroids in [i, i + 1) * size along X and
+        [j, j + 1) * size along Y, so that tiles of separate scripts match.
+        Tiled TINs cannot be textured
+    processes : int (optional)
+        Number of processes the tiles are built by (see ruby_parallel).
+        Defaults to building them in turn
+
+    Returns
+    -------
+    dict
+        Only when the TIN is simplified or tiled. When simplified: 'faces',
+        number of triangles drawn, 'ratio', that number over the number of
+        triangles given, and 'max_vertical_error', reached vertical error (m).
+        When tiled: 'tiles', list of one dict per tile, with its group 'name',
+        its grid index 'tile' (i, j), and its numbers of 'faces' and 'points'
 
     Example
     --------
@@ -1577,151 +1506,448 @@ def ruby_tin(file, XYZ, triangles, color = 'n', texture = '', name = ''):
     >>>ruby_tin(file, XYZ, triangles.simplices.copy(),
     texture = '/images/rainbow.jpeg')
 
-    """
-    if type(XYZ) is not np.ndarray:
-        raise TypeError('Error in ruby_tin. XYZ should be a numpy.array.')
+    Create the same DEM as a single polygon mesh
+    >>>ruby_tin(file, XYZ, triangles.simplices.copy(), mode = 'mesh')
 
-    if not(XYZ.shape[1] == 3):
-        raise ValueError('Error in ruby_tin. Dimension of XYZ is invalid.')
+    Create the same DEM colored by height, as one mesh per color
+    >>>ruby_tin(file, XYZ, triangles.simplices.copy(), mode = 'mesh',
+    >>>    color = ColorScale(XYZ[:, 2], 'viridis'))
 
-    if not(XYZ.shape[0] >= 1):
-        raise ValueError('Error in ruby_tin. Dimension of XYZ is invalid.')
+    Create the same DEM simplified to an error of 1 cm
+    >>>report = ruby_tin(file, XYZ, triangles.simplices.copy(), mode = 'mesh',
+    >>>    max_vertical_error = 0.01)
+    >>>print(report['ratio'], report['max_vertical_error'])
 
-    for elt in XYZ:
-        if not(isinstance(elt[0], numbers.Real) \
-            and isinstance(elt[1], numbers.Real) \
-            and isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_tin. ',
-                'XYZ should consist of only numeric values.')
+    Create the same DEM in tiles of 2 m, then hide one tile in sketchup with
+    ruby_lib_tiles['dem_5_2'].hidden = true
+    >>>report = ruby_tin(file, XYZ, triangles.simplices.copy(), mode = 'mesh',
+    >>>    name = 'dem', tile_size = 2)
 
-    if type(triangles) is not np.ndarray:
-        raise TypeError('Error in ruby_tin. triangles should be a numpy.array.')
+    """
+    if file.validate:
+        if not is_stream(XYZ):
+            check_array('ruby_tin', 'XYZ', XYZ, (None, 3))
+        if not is_stream(triangles):
+            check_array('ruby_tin', 'triangles', triangles, (None, 3))
+            if not(triangles.shape[0] >= 1):
+                raise ValueError('Error in ruby_tin. Dimension of triangles is invalid.')
+            if not is_stream(XYZ):
+                check_indices('ruby_tin', 'triangles', triangles, XYZ.shape[0])
+        check_name('ruby_tin', name)
+        check_choice('ruby_tin', 'mode', mode, ['faces', 'mesh'])
+        if not isinstance(color, ColorScale):
+            check_color('ruby_tin', color)
+        elif not (is_stream(XYZ) or is_stream(triangles) \
+                  or len(color) in (XYZ.shape[0], triangles.shape[0])):
+            raise ValueError('Error in ruby_tin. Dimension of color is invalid.')
+        check_texture('ruby_tin', texture)
+        if target_faces is not None and not (isinstance(target_faces,
+            numbers.Integral) and target_faces >= 1):
+            raise ValueError('Error in ruby_tin. target_faces must be a ' \
+                + 'strictly positive integer.')
+        if max_vertical_error is not None:
+            check_number('ruby_tin', 'max_vertical_error', max_vertical_error)
+            if not (max_vertical_error >= 0):
+                raise ValueError('Error in ruby_tin. max_vertical_error must ' \
+                    + 'not be negative.')
+        if tile_size is not None:
+            for size in np.ravel(tile_size):
+                check_number('ruby_tin', 'tile_size', size)
+            if not (np.size(tile_size) in (1, 2) \
+                    and np.all(np.asarray(tile_size) > 0)):
+                raise ValueError('Error in ruby_tin. tile_size must be one ' \
+                    + 'or two strictly positive sizes.')
+    # Tiles are drawn without texture, which would be lost
+    if tile_size is not None and not (texture == ''):
+        raise ValueError('Error in ruby_tin. A tiled TIN cannot be textured.')
+
+    report = None
+    if target_faces is not None or max_vertical_error is not None \
+        or tile_size is not None:
+        # Simplification and tiling need the whole TIN in memory
+        if is_stream(XYZ):
+            XYZ = np.concatenate(list(iter_chunks(XYZ)))
+        if is_stream(triangles):
+            triangles = np.concatenate(list(iter_chunks(triangles)))
+        if file.validate:
+            check_array('ruby_tin', 'XYZ', XYZ, (None, 3))
+            check_indices('ruby_tin', 'triangles', triangles, XYZ.shape[0])
+    if target_faces is not None or max_vertical_error is not None:
+        if isinstance(color, ColorScale):
+            # Values per point follow the remaining points, values per
+            # triangle have no counterpart on the simplified TIN
+            if not (len(color) == XYZ.shape[0] != triangles.shape[0]):
+                raise ValueError('Error in ruby_tin. A simplified TIN can ' \
+                    + 'only be colored by values per point.')
+        XYZ, triangles, kept, report = decimate_tin(XYZ, triangles,
+                                                    target_faces,
+                                                    max_vertical_error)
+        if isinstance(color, ColorScale):
+            color = color.take(kept)
+
+    if tile_size is not None:
+        report = report or {}
+        report['tiles'] = _tin_tiles(file, XYZ, triangles, tile_size, color,
+                                     name, mode, processes)
+        return report
+
+    file.write('\ngroup = Sketchup.active_model.entities.add_group\n')
+
+    # Points first, then triangles, both block by block. The bounding box of
+    # the points is accumulated on the way for the texture plane
+    points = 0
+    min_xyz = np.full(3, np.inf)
+    max_xyz = np.full(3, -np.inf)
+    for chunk in (iter_chunks(XYZ) if is_stream(XYZ) else [XYZ]):
+        if file.validate:
+            check_array('ruby_tin', 'XYZ', chunk, (None, 3))
+        if chunk.shape[0] == 0:
+            continue
+        if mode == 'mesh':
+            file.write_array('tin_v', '%s,%s,%s',
+                             SCALE_FACTOR * _local(file, chunk),
+                             append = points > 0)
+        else:
+            file.write_block('p%d = [%s,%s,%s]\n', np.column_stack((
+                np.arange(points, points + chunk.shape[0]),
+                SCALE_FACTOR * _local(file, chunk))))
+        points += chunk.shape[0]
+        min_xyz = np.minimum(min_xyz, np.min(chunk, axis = 0))
+        max_xyz = np.maximum(max_xyz, np.max(chunk, axis = 0))
+
+    if mode == 'faces':
+        file.newline()
+
+    # A color scale holds one value per triangle, or one value per point, the
+    # triangle then taking the mean value of its points
+    scaled = isinstance(color, ColorScale)
+    per_point = scaled and len(color) == points \
+        and (is_stream(triangles) or not (len(color) == triangles.shape[0]))
+    # Triangles of each color of the scale, in mode 'mesh'
+    meshes = {}
+
+    faces = 0
+    for chunk in (iter_chunks(triangles) if is_stream(triangles) else [triangles]):
+        if file.validate:
+            check_indices('ruby_tin', 'triangles', chunk, points)
+        if scaled:
+            if per_point:
+                entries = color.quantize(
+                    np.mean(color.values[chunk.astype(np.intp)], axis = 1))
+            else:
+                if file.validate and len(color) < faces + chunk.shape[0]:
+                    raise ValueError('Error in ruby_tin. Dimension of color ' \
+                        + 'is invalid.')
+                entries = color.entries(faces, faces + chunk.shape[0])
+            _tin_entries(file, chunk, color, entries, mode, meshes)
+        elif mode == 'mesh':
+            file.write_array('tin_t', '%d,%d,%d', chunk, append = faces > 0)
+        else:
+            file.write_block('group.entities.add_face(p%d,p%d,p%d)\n', chunk)
+        faces += chunk.shape[0]
 
-    if not(triangles.shape[1] == 3):
+    if file.validate and not(faces >= 1):
         raise ValueError('Error in ruby_tin. Dimension of triangles is invalid.')
+    if file.validate and scaled and not per_point:
+        check_color('ruby_tin', color, faces)
+
+    if mode == 'mesh' and scaled:
+        # One mesh per color, holding the points of its triangles only
+        for variable, (entry_color, count) in meshes.items():
+            file.write_lines([
+                'tin_mesh = Geom::PolygonMesh.new(' + str(points) + ',' \
+                    + str(count) + ')',
+                'tin_index = {}',
+                variable + '.each_slice(3) {|t| tin_mesh.add_polygon(*t.map {|a| ' \
+                    + 'tin_index[a] ||= ' \
+                    + 'tin_mesh.add_point(Geom::Point3d.new(tin_v[3*a,3]))})}',
+                'group.entities.add_faces_from_mesh(tin_mesh, 0, ' \
+                    + ruby_material(file, entry_color) + ', ' \
+                    + ruby_material(file, entry_color) + ')'])
+    elif mode == 'mesh':
+        file.write_lines([
+            'tin_mesh = Geom::PolygonMesh.new(' + str(points) + ',' \
+                + str(faces) + ')',
+            'tin_index = []',
+            'tin_v.each_slice(3) {|p| ' \
+                + 'tin_index << tin_mesh.add_point(Geom::Point3d.new(p))}',
+            'tin_t.each_slice(3) {|a,b,c| ' \
+                + 'tin_mesh.add_polygon(tin_index[a],tin_index[b],tin_index[c])}',
+            'group.entities.add_faces_from_mesh(tin_mesh, 0)'])
+
+    if not (scaled or color == 'n'):
+        file.write('\ngroup.material = ' + ruby_material(file, color) + '\n')
 
-    if not(triangles.shape[0] >= 1):
-        raise ValueError('Error in ruby_tin. Dimension of triangles is invalid.')
+    if not (name == ''):
+        file.write('\ngroup.name =\'' + name + '\'\n')
 
-    for elt in triangles:
-        if not(isinstance(elt[0], numbers.Real)) \
-            and not(isinstance(elt[1], numbers.Real)) \
-            and not(isinstance(elt[2], numbers.Real)):
-            raise TypeError('Error in ruby_tin. ',
-                'triangles should consist of only numeric values.')
+    if not(texture == ''):
+        _drape(file, min_xyz, max_xyz, texture)
 
-    if not isinstance(name, str):
-        TypeError('Error in ruby_tin. Type of name is not valid. Expects str')
-
-    if not texture == '':
-        if not isinstance(texture, str):
-            raise TypeError('Error in ruby_tin. ',
-                'Not a valid texture, expects a file path')
-        elif not(texture.endswith('.jpeg') \
-            or texture.endswith('jpg') \
-            or texture.endswith('.png')):
-            raise TypeError('Error in ruby_tin. Not a valid texture, ',
-                'expects file extension to be one of these: .png, .jpg, .jpeg')
-
-
-    if (triangles < 0).any():
-        raise ValueError('error in ruby_tin. ',
-            'triangles does not match with any point')
-
-    if (triangles > XYZ.shape[0]).any():
-        raise ValueError('error in ruby_tin. ',
-            'triangles does not match with any point')
-
-    ruby_newline(file)
-    file.write('group = Sketchup.active_model.entities.add_group')
-    ruby_newline(file)
-    count = 0
-    for point in XYZ:
-        file.write('p' + str(count) + ' = [' + \
-                   str(SCALE_FACTOR * point[0]) + ',' + \
-                   str(SCALE_FACTOR * point[1]) + ',' + \
-                   str(SCALE_FACTOR * point[2]) + ']' \
-                  )
-        ruby_newline(file)
-        count = count + 1
-
-    ruby_newline(file)
-
-    for t in triangles:
-        file.write('group.entities.add_face(p' + str(t[0]) + ',p' + str(t[1]) + \
-                   ',p' + str(t[2]) + ')' \
-                  )
-        ruby_newline(file)
+    return report
 
-    if not (color == 'n'):
-        ruby_newline(file)
-        file.write('group.material = ' + ruby_rgb_color(color))
+def _tin_tiles(file, XYZ, triangles, tile_size, color, name, mode,
+               processes):
+    """
+    Draws the TIN of ruby_tin tile by tile, see tile_size, and returns the
+    list of tiles. Triangles are sorted by tile at once, every tile then
+    holding its own points only.
+    """
+    size = np.broadcast_to(np.asarray(tile_size, dtype = float), (2,))
+    triangles = triangles.astype(np.intp)
+    if isinstance(color, ColorScale) and len(color) == XYZ.shape[0] \
+        and not (len(color) == triangles.shape[0]):
+        # Per point values are turned into per triangle values, which keep
+        # their meaning in every tile
+        color = color.take(triangles)
+
+    key = np.floor(np.mean(XYZ[triangles, 0:2], axis = 1) / size)
+    key = key.astype(np.int64)
+    order = np.lexsort((key[:, 1], key[:, 0]))
+    key = key[order]
+    bounds = np.concatenate(([0], np.flatnonzero(np.any(np.diff(key, axis = 0),
+                                                        axis = 1)) + 1,
+                             [order.size]))
+
+    calls = []
+    tiles = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        rows = order[start:stop]
+        used, local = np.unique(triangles[rows], return_inverse = True)
+        i, j = key[start]
+        tile = (name if name else 'tile') + '_%d_%d' % (i, j)
+        calls.append((_tin_tile, (XYZ[used], local.reshape(-1, 3), tile),
+                      {'color': color.take(rows) if isinstance(color, ColorScale)
+                                else color,
+                       'mode': mode}))
+        tiles.append({'name': tile, 'tile': (int(i), int(j)),
+                      'faces': int(stop - start), 'points': int(used.size)})
+
+    if processes is None:
+        for function, args, kwargs in calls:
+            file.split_point()
+            function(file, *args, **kwargs)
+    else:
+        ruby_parallel(file, calls, processes)
+    return tiles
+
+def _tin_tile(file, XYZ, triangles, tile, color, mode):
+    """
+    Draws one tile of a tiled TIN and lists it in ruby_lib_tiles.
+    """
+    file.define_once('ruby_lib_tiles', ['ruby_lib_tiles = {}'])
+    ruby_tin(file, XYZ, triangles, color = color, name = tile, mode = mode)
+    file.write('ruby_lib_tiles[\'' + tile + '\'] = group\n')
 
-    if not (name == ''):
-        ruby_newline(file)
-        file.write('group.name =\'' + name +'\'')
+def _drape(file, min_xyz, max_xyz, texture):
+    """
+    Drapes texture over the faces of the current group, projected from a
+    horizontal plane above the bounding box min_xyz, max_xyz of the group.
+    """
+    max_x, max_y, max_z = max_xyz
+    min_x, min_y, min_z = min_xyz
+
+    ruby_plane(file, np.array([ [min_x, min_y, max_z + 3], \
+                                [min_x, max_y, max_z + 3], \
+                                [max_x, max_y, max_z + 3], \
+                                [max_x, min_y, max_z + 3]]), \
+                              texture = texture \
+                             )
+    file.write_lines([
+        '',
+        'faces = group.entities.grep( Sketchup::Face ).each{|f| ' \
+            + 'f.material = plane_face.material }',
+        'faces = group.entities.grep( Sketchup::Face ).each{|f| ' \
+            + 'f.set_texture_projection(plane_face.normal, true) }',
+        'faces = group.entities.grep( Sketchup::Face ).each{|f| ' \
+            + 'f.back_material = plane_face.material }',
+        'faces = group.entities.grep( Sketchup::Face ).each{|f| ' \
+            + 'f.set_texture_projection(plane_face.normal, false) }',
+        'plane.each{|p| ',
+        'if p.is_a?(Sketchup::Edge )',
+        'p.erase!',
+        'end}'])
+
+def _tin_entries(file, triangles, color, entries, mode, meshes):
+    """
+    Writes a block of triangles of ruby_tin colored by a ColorScale, grouped
+    by palette entry. In mode 'faces', each face is painted on both sides.
+    In mode 'mesh', the triangles are appended to one array per color,
+    recorded in meshes with their count, and drawn by ruby_tin at the end.
+    """
+    for entry_color, rows in color.blocks(entries):
+        if mode == 'mesh':
+            variable = 'tin_t' + color_key(entry_color)
+            count = meshes.get(variable, (entry_color, 0))[1]
+            file.write_array(variable, '%d,%d,%d', triangles[rows],
+                             append = count > 0)
+            meshes[variable] = (entry_color, count + np.count_nonzero(rows))
+        else:
+            material = ruby_material(file, entry_color)
+            file.write_block('f = group.entities.add_face(p%d,p%d,p%d)\n' \
+                             + 'f.material = f.back_material = ' + material \
+                             + ' if f\n', triangles[rows])
+
+@primitive
+def ruby_grid_dem(file, z, x0, y0, dx, dy, nodata = None, color = 'n',
+                  texture = '', name = ''):
+    """
+    Draws DEM (Digital Elevation Model) given as a regular grid of heights,
+    as a single polygon mesh. Only the heights are written to the script: the
+    ruby script places the nodes on the grid and adds the two triangles of
+    every cell itself, so that no triangulation is computed in Python.
+    Triangles touching a missing node are left out.
 
-    max_x = max(XYZ[:, 0])
-    max_y = max(XYZ[:, 1])
-    max_z = max(XYZ[:, 2])
+    Parameters
+    ----------
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
+    z : np.ndarray, str
+        ny-by-nx array of heights, z[i, j] being the height of the node at
+        (x0 + j * dx, y0 + i * dy). May be memory-mapped or given as a path
+        to a .npy file, and is then read block by block. NaN marks missing
+        nodes
+    x0, y0 : float
+        Coordinates of the node z[0, 0]
+    dx, dy : float
+        Spacing of the nodes along x and y, negative for rasters stored
+        from east to west or from north to south
+    nodata : float (optional)
+        Height of missing nodes, besides NaN
+    color : str, tuple (optional)
+        One of the following colors:
+        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k',
+        or an (r, g, b) tuple of integers in [0, 255]
+    texture : str (optional)
+        Path to an image file with extension .png .jpg or .jpeg, draped over
+        the DEM as in ruby_tin
+    name : str (optional)
+        Label of the DEM
 
-    min_x = min(XYZ[:, 0])
-    min_y = min(XYZ[:, 1])
-    min_z = min(XYZ[:, 2])
+    Examples
+    --------
+    Draws a 1 m grid of 100 by 200 nodes
+    >>>x, y = np.meshgrid(np.arange(200), np.arange(100))
+    >>>ruby_grid_dem(file, np.sin(x / 20) + np.cos(y / 10), 0, 0, 1, 1)
 
-    abs_x = abs(max_x - min_x)
-    abs_y = abs(max_y - min_y)
-    abs_z = abs(max_z - min_z)
+    Draws a GeoTIFF tile stored north to south, with its missing values
+    >>>ruby_grid_dem(file, 'dem_tile.npy', 2600000, 1200999, 1, -1,
+    >>>    nodata = -9999, texture = '/images/orthophoto.jpg')
 
-    plane_size = max(max(abs_x, abs_y), abs_z)
+    """
+    if isinstance(z, str):
+        z = load_array(z)
+
+    if file.validate:
+        check_grid('ruby_grid_dem', 'z', z)
+        for label, value in (('x0', x0), ('y0', y0), ('dx', dx), ('dy', dy)):
+            check_number('ruby_grid_dem', label, value)
+        if dx == 0 or dy == 0:
+            raise ValueError('Error in ruby_grid_dem. dx and dy must not be zero.')
+        if nodata is not None:
+            check_number('ruby_grid_dem', 'nodata', nodata)
+        check_color('ruby_grid_dem', color)
+        check_texture('ruby_grid_dem', texture)
+        check_name('ruby_grid_dem', name)
+
+    ny, nx = z.shape
+    offset = np.zeros(3) if file.origin is None else file.origin
+
+    file.write('\ngroup = Sketchup.active_model.entities.add_group\n')
+
+    # Heights block by block of rows, missing nodes being written as 0 and
+    # listed in dem_s. The bounding box of the other nodes is accumulated on
+    # the way for the texture plane
+    missing = 0
+    min_z = np.inf
+    max_z = -np.inf
+    step = max(1, CHUNK_ROWS // nx)
+    for start in range(0, ny, step):
+        rows = np.asarray(z[start:start + step], dtype = float)
+        release(z)
+        skip = np.isnan(rows)
+        if nodata is not None:
+            skip |= rows == nodata
+        heights = np.where(skip, 0, SCALE_FACTOR * (rows - offset[2]))
+        file.write_array('dem_z', '%s', heights.reshape(-1, 1),
+                         append = start > 0)
+        if skip.any():
+            file.write_array('dem_s', '%d',
+                             (np.flatnonzero(skip) + start * nx)[:, np.newaxis],
+                             append = missing > 0)
+            missing += np.count_nonzero(skip)
+        if not skip.all():
+            min_z = min(min_z, np.min(rows[~skip]))
+            max_z = max(max_z, np.max(rows[~skip]))
+
+    # Triangles counterclockwise seen from above
+    a, b, c, d = 'k', 'k + 1', 'k + ' + str(nx + 1), 'k + ' + str(nx)
+    if dx * dy < 0:
+        b, d = d, b
+    triangles = []
+    for triangle in ((a, b, c), (a, c, d)):
+        line = 'dem_mesh.add_polygon(' \
+             + ', '.join(['dem_p.(' + k + ')' for k in triangle]) + ')'
+        if missing > 0:
+            line += ' if ' + ' && '.join(['dem_ok[' + k + ']' for k in triangle])
+        triangles.append(line)
+
+    lines = ['dem_mesh = Geom::PolygonMesh.new(' + str(nx * ny) + ',' \
+                 + str(2 * (nx - 1) * (ny - 1)) + ')',
+             'dem_index = Array.new(' + str(nx * ny) + ')']
+    if missing > 0:
+        lines += ['dem_ok = Array.new(' + str(nx * ny) + ', true)',
+                  'dem_s.each {|k| dem_ok[k] = false}']
+    lines += [file.format_block('dem_p = lambda {|k| dem_index[k] ||= ' \
+                  + 'dem_mesh.add_point(Geom::Point3d.new(' \
+                  + '%s + (k %% ' + str(nx) + ') * %r, ' \
+                  + '%s + (k / ' + str(nx) + ') * %r, dem_z[k]))}',
+                  np.array([SCALE_FACTOR * (x0 - offset[0]), SCALE_FACTOR * dx,
+                            SCALE_FACTOR * (y0 - offset[1]), SCALE_FACTOR * dy])),
+              '(0...' + str(ny - 1) + ').each {|i| (0...' + str(nx - 1) \
+                  + ').each {|j|',
+              'k = i * ' + str(nx) + ' + j'] \
+           + triangles[:-1] + [triangles[-1] + '}}',
+              'group.entities.add_faces_from_mesh(dem_mesh, 0)']
+    file.write_lines(lines)
 
-    if not(texture == ''):
-        ruby_plane(file, np.array([ [min_x, min_y, max_z + 3], \
-                                    [min_x, max_y, max_z + 3], \
-                                    [max_x, max_y, max_z + 3], \
-                                    [max_x, min_y, max_z + 3]]), \
-                                  texture = texture \
-                                 )
-        ruby_newline(file)
-        file.write('faces = group.entities.grep( Sketchup::Face ).each{|f| ' \
-            + 'f.material = plane_face.material }')
-        ruby_newline(file)
-        file.write('faces = group.entities.grep( Sketchup::Face ).each{|f| ' \
-            + 'f.set_texture_projection(plane_face.normal, true) }')
-        ruby_newline(file)
-        file.write('faces = group.entities.grep( Sketchup::Face ).each{|f| ' \
-            + 'f.back_material = plane_face.material }')
-        ruby_newline(file)
-        file.write('faces = group.entities.grep( Sketchup::Face ).each{|f| ' \
-            + 'f.set_texture_projection(plane_face.normal, false) }')
-        ruby_newline(file)
-        file.write('plane.each{|p| ')
-        ruby_newline(file)
-        file.write('if p.is_a?(Sketchup::Edge )')
-        ruby_newline(file)
-        file.write('p.erase!')
-        ruby_newline(file)
-        file.write('end}')
-        ruby_newline(file)
-
-def ruby_arrow(file, P, v, color = 'n', name = ''):
+    if not (color == 'n'):
+        file.write('\ngroup.material = ' + ruby_material(file, color) + '\n')
+
+    if not (name == ''):
+        file.write('\ngroup.name =\'' + name + '\'\n')
+
+    if not (texture == '') and min_z <= max_z:
+        corners = np.array([x0, x0 + (nx - 1) * dx, y0, y0 + (ny - 1) * dy])
+        _drape(file, [min(corners[:2]), min(corners[2:]), min_z],
+               [max(corners[:2]), max(corners[2:]), max_z], texture)
+
+@primitive
+def ruby_arrow(file, P, v, color = 'n', name = '', layout = 'columns'):
     """
-    Draws quiver plot with position P and direction v. Color and name can be
-    defined if required.
+    Draws quiver plot with positions P and directions v. Color and name can be
+    defined if required. All arrows of the call are written as one data array,
+    from which the ruby script places copies of the arrow prototype.
 
     Parameters
     ----------
-    file : file object
-        Open ruby script file descriptor
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
     P : np.ndarray
-        3-by-1 coordinate vector
+        3-by-N array of coordinates, one arrow per column, or N-by-3 array
+        with layout 'rows'
     v : np.ndarray
-        3-by-1 direction vector
-    color : str (optional)
+        Array of direction vectors, with the shape of P
+    color : str, tuple, ColorScale (optional)
         One of the following colors:
-        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k'
-    name : str (optional)
-        Name of the arrow
+        'n' (default), 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k',
+        an (r, g, b) tuple of integers in [0, 255], or a ColorScale of one
+        value per arrow (see colormap.ColorScale)
+    name : np.ndarray, str (optional)
+        Name of all arrows or N-by-1 array of individual names
+    layout : str (optional)
+        'columns' (default), P and v hold one arrow per column, or 'rows',
+        one arrow per row
 
     Examples
     --------
@@ -1736,88 +1962,91 @@ def ruby_arrow(file, P, v, color = 'n', name = ''):
     >>>ruby_arrow(file, np.array([[5], [5], [5]]), np.array([[0], [0], [1]]), \
     >>>    color = 'g', name = "arrow3")
 
-    """
-    if type(P) is not np.ndarray:
-        TypeError('Error in ruby_arrow. Type of P is not valid. ',
-            'Expects an numpy.ndarray')
-
-    if not(P.shape[0] == 3 and P.shape[1] == 1):
-        ValueError('Error in ruby_arrow. Dimension of P is not valid')
-
-    if type(v) is not np.ndarray:
-        TypeError('Error in ruby_arrow. Type of v is not valid. ',
-            'Expects an numpy.ndarray')
-
-    if not(v.shape[0] == 3 and v.shape[1] == 1):
-        ValueError('Error in ruby_arrow. Dimension of v is not valid')
+    Draws a displacement field of 10000 arrows
+    >>>ruby_arrow(file, 100 * np.random.rand(10000, 3),
+    >>>    np.random.randn(10000, 3), color = 'b', layout = 'rows')
 
-    for elt in P:
-        if not isinstance(elt[0], numbers.Real):
-            raise TypeError('Error in ruby_arrow. ',
-                'P should consist of only numeric values.')
+    Draws the same field colored by the length of the arrows
+    >>>v = np.random.randn(10000, 3)
+    >>>ruby_arrow(file, 100 * np.random.rand(10000, 3), v, layout = 'rows',
+    >>>    color = ColorScale(np.linalg.norm(v, axis = 1), 'jet', levels = 8))
 
-    for elt in v:
-        if not(isinstance(elt[0], numbers.Real)):
-            raise TypeError('Error in ruby_arrow. ',
-                'v should consist of only numeric values.')
-
-    if not isinstance(name, str):
-        TypeError('Error in ruby_arrow. Type of name is not valid. Expects str')
-
-    valid_colors = ['n', 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k']
-
-    if not isinstance(color, str) or color not in valid_colors:
-        raise TypeError('Error in ruby_arrow. Not a valid color.')
+    """
+    if file.validate:
+        check_choice('ruby_arrow', 'layout', layout, ['columns', 'rows'])
+        check_array('ruby_arrow', 'P', P,
+                    (3, None) if layout == 'columns' else (None, 3))
+        check_array('ruby_arrow', 'v', v, P.shape)
+
+    if layout == 'columns':
+        P = P.T
+        v = v.T
+
+    if file.validate:
+        check_name('ruby_arrow', name, P.shape[0])
+        check_color('ruby_arrow', color, P.shape[0])
+
+    if isinstance(color, ColorScale):
+        # One batch of arrows per palette entry, each with a single material
+        for entry_color, rows in color.blocks(color.entries()):
+            ruby_arrow(file, P[rows], v[rows], entry_color,
+                       _subset(name, rows), layout = 'rows')
+        return
+
+    # Arrows of null length cannot be drawn
+    scale = np.linalg.norm(v, axis = 1)
+    drawn = scale > 0
+    P = P[drawn]
+    v = v[drawn]
+    scale = scale[drawn]
 
     # Cross product with unity vector as rotation axis
-    V = np.array([[-v[1, 0]], [v[0, 0]], [0]])
+    V = np.column_stack((-v[:, 1], v[:, 0], np.zeros(v.shape[0])))
     # Angle around that axis
-    t = np.arctan2(np.linalg.norm(V), v[2, 0])
+    t = np.arctan2(np.linalg.norm(V, axis = 1), v[:, 2])
     # Min rotation angle used to avoid issue with 0 and pi rotation (norm(V)==0)
     tol_angle = 0.001 * np.pi / 180
 
-    file.write('arr1 = arr0.copy')
-    ruby_newline(file)
-
-    file.write('s = Geom::Transformation.scaling(' \
-        + str(np.linalg.norm(v)) + ',' \
-        + str(np.linalg.norm(v)) + ',' \
-        + str(np.linalg.norm(v)) + ')')
-    ruby_newline(file)
-
-    if np.absolute(t) > tol_angle :
-        if np.absolute(np.absolute(t) - np.pi) > tol_angle:
-            V = np.divide(V, np.linalg.norm(V))
-            file.write('r = Geom::Transformation.rotation([0,0,0],[' \
-                + str(V[0, 0]) + ',' + str(V[1, 0]) + ',' + str(V[2, 0]) + '],' \
-                + str(t) + ')')
-            ruby_newline(file)
-        else:
-            file.write('r = Geom::Transformation.rotation([0,0,0],[1,0,0],' \
-                + str(np.pi) + ')')
-            ruby_newline(file)
+    axis = np.zeros((v.shape[0], 3))
+    axis[:, 2] = 1
+    rotated = np.absolute(t) > tol_angle
+    flipped = rotated & (np.absolute(np.absolute(t) - np.pi) <= tol_angle)
+    rotated &= ~flipped
+    axis[rotated] = V[rotated] / np.linalg.norm(V[rotated], axis = 1)[:, np.newaxis]
+    axis[flipped] = [1, 0, 0]
+    t[flipped] = np.pi
+    t[~(rotated | flipped)] = 0
+
+    if P.shape[0] == 0:
+        return
+
+    file.write_array('arr_d', '%r,%r,%r,%r,%r,%s,%s,%s',
+                     np.column_stack((scale, axis, t,
+                                      SCALE_FACTOR * _local(file, P))))
+
+    loop = ['arr_d.each_slice(8) {|d|',
+            'arr1 = arr0.copy',
+            'arr1.entities.transform_entities(Geom::Transformation.new(d[5,3]) * ' \
+                + 'Geom::Transformation.rotation([0,0,0],d[1,3],d[4]) * ' \
+                + 'Geom::Transformation.scaling(d[0]),arr1)']
 
-    file.write('t = Geom::Transformation.new([' \
-        + str(P[0, 0]) + ',' + str(P[1, 0]) + ',' + str(P[2, 0]) + '])')
-    ruby_newline(file)
-
-    file.write('arr1.entities.transform_entities(s,arr1)')
-    ruby_newline(file)
-
-    if np.absolute(t) > tol_angle :
-        file.write('arr1.entities.transform_entities(r,arr1)')
-        ruby_newline(file)
+    if not (color == 'n'):
+        loop.append('arr1.material = ' + ruby_material(file, color))
 
-    file.write('arr1.entities.transform_entities(t,arr1)')
-    ruby_newline(file)
+    if isinstance(name, str):
+        if not (name == ''):
+            loop.append('arr1.name =\'' + name +'\'')
+    else:
+        name = name[drawn, 0]
+        named = np.flatnonzero(name != '')
+        loop.insert(0, 'arr_i = []')
+        loop.append('arr_i << arr1')
 
-    if not (color == 'n'):
-        ruby_newline(file)
-        file.write('arr1.material = ' + ruby_rgb_color(color))
+    loop[-1] += '}'
+    file.write_lines(loop)
 
-    if not (name == ''):
-        ruby_newline(file)
-        file.write('arr1.name =\'' + name +'\'')
+    if not isinstance(name, str):
+        file.write(''.join(['arr_i[' + str(index) + '].name =\'' + n + '\'\n'
+                            for index, n in zip(named, name[named])]))
 
-    ruby_newline(file)
-    ruby_newline(file)
+    file.newline()
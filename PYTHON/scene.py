@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import numbers
+
+from culling import Region
+from ruby_lib import ruby_point, ruby_line, ruby_ellipsoid, ruby_arrow, ruby_tin
+from validation import *
+
+# Corners of the unit box, around its outline in the XY plane at the bottom,
+# then at the top
+BOX_CORNERS = np.array([[-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+                        [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]])
+
+class Scene:
+    """
+    Deferred drawing of points, lines, TINs, ellipsoids and arrows. Calls are
+    recorded in
+    columns of NumPy arrays, one set of columns per primitive and style, and
+    written by flush as one batched call per (primitive, color, symbol or
+    texture). The script then holds far fewer groups and material
+    assignments than with one ruby_* call each, and every batch is
+    formatted at once.
+
+    Given a region (see culling), the elements outside of it are dropped
+    when recorded: points by their position, ellipsoids by their bounding
+    box, segments, arrows and triangles as a whole, those reaching into the
+    region being kept. Only Scene culls, the ruby_* functions write all the
+    elements they are given (see culling for direct calls).
+    The number of elements dropped per primitive is counted in culled.
+
+    Drawing order is by batch, in the order batches were first used, and in
+    call order within a batch.
+
+    Parameters
+    ----------
+    file : ScriptWriter
+        Open ruby script, as returned by ruby_create
+    point_mode : str (optional)
+        Mode of ruby_point used for the batches of points, 'components'
+        (default) draws each batch in a single group
+    region : culling.Region (optional)
+        Box, Polygon or Frustum outside of which elements are dropped
+
+    Examples
+    --------
+    Records three calls, written as two batches of points
+    >>>scene = Scene(file)
+    >>>scene.point(XYZ_1, issymbolic = 1, color = 'r')
+    >>>scene.point(XYZ_2, issymbolic = 1, color = 'b')
+    >>>scene.point(XYZ_3, issymbolic = 1, color = 'r')
+    >>>scene.flush()
+
+    Draws the points and TIN of a survey in the view of a pose only
+    >>>ruby_pose(file, P, R, focal = 0.5)
+    >>>scene = Scene(file, region = Frustum(P, R, focal = 0.5))
+    >>>scene.point(XYZ, issymbolic = 1)
+    >>>scene.tin(XYZ, triangles, color = 'g')
+    >>>scene.flush()
+    >>>print(scene.culled)
+
+    """
+
+    def __init__(self, file, point_mode = 'components', region = None):
+        check_choice('Scene', 'point_mode', point_mode, ['groups', 'components'])
+        if not (region is None or isinstance(region, Region)):
+            raise TypeError('Error in Scene. region should be a Box, ' \
+                'Polygon or Frustum.')
+
+        self.file = file
+        self.point_mode = point_mode
+        self.region = region
+        self.culled = {}
+        self.batches = {}
+
+    def _keep(self, primitive, kept):
+        """
+        Counts the elements dropped out of the mask kept.
+        """
+        self.culled[primitive] = self.culled.get(primitive, 0) \
+            + int(kept.size - np.count_nonzero(kept))
+        return kept
+
+    def _append(self, key, **columns):
+        batch = self.batches.setdefault(key, {label: [] for label in columns})
+        for label, values in columns.items():
+            batch[label].append(values)
+
+    def point(self, XYZ, issymbolic = 0, symbol = 'triangle', color = 'n',
+              name = ''):
+        """
+        Records points, see ruby_point. In mode 'components', names are
+        given to the points with a symbol only.
+        """
+        if self.file.validate:
+            check_array('Scene.point', 'XYZ', XYZ, (None, 3))
+            check_flags('Scene.point', 'issymbolic', issymbolic, XYZ.shape[0])
+            check_symbol('Scene.point', symbol)
+            check_color('Scene.point', color)
+            check_name('Scene.point', name, XYZ.shape[0])
+
+        rows = XYZ.shape[0]
+        issymbolic = np.broadcast_to(issymbolic, (rows, 1))
+        name = name_column(name, rows)
+        if self.point_mode == 'components':
+            name[issymbolic[:, 0] != 1] = ''
+        if self.region is not None:
+            kept = self._keep('point', self.region.contains(XYZ))
+            XYZ, issymbolic, name = XYZ[kept], issymbolic[kept], name[kept]
+
+        self._append(('point', color, symbol),
+                     XYZ = XYZ,
+                     issymbolic = issymbolic,
+                     name = name)
+
+    def line(self, XYZ, name = ''):
+        """
+        Records a line, see ruby_line. Dropped segments split the line, the
+        pieces being drawn by separate calls of ruby_line.
+        """
+        if self.file.validate:
+            check_array('Scene.line', 'XYZ', XYZ, (None, 3))
+            check_segment_names('Scene.line', name, XYZ.shape[0] - 1)
+
+        segments = XYZ.shape[0] - 1
+        if isinstance(name, dict):
+            names = np.full((segments, 1), '', dtype = object)
+            for index, n in name.items():
+                names[index, 0] = n
+        else:
+            names = name_column(name, segments)
+
+        kept = np.ones(segments, dtype = bool)
+        if self.region is not None:
+            kept = self._keep('line', self.region.reaches(
+                np.stack((XYZ[:-1], XYZ[1:]), axis = 1)))
+        # Runs of consecutive segments kept, start to stop
+        edges = np.diff(np.concatenate(([0], kept.astype(np.int8), [0])))
+        for start, stop in zip(np.flatnonzero(edges == 1),
+                               np.flatnonzero(edges == -1)):
+            self._append(('line', '', ''),
+                         XYZ = XYZ[start:stop + 1],
+                         name = names[start:stop])
+
+    def tin(self, XYZ, triangles, color = 'n'):
+        """
+        Records a TIN, see ruby_tin. The TINs of a color are drawn as a single
+        polygon mesh, holding the points of the triangles kept only.
+        """
+        if self.file.validate:
+            check_array('Scene.tin', 'XYZ', XYZ, (None, 3))
+            check_array('Scene.tin', 'triangles', triangles, (None, 3))
+            check_indices('Scene.tin', 'triangles', triangles, XYZ.shape[0])
+            check_color('Scene.tin', color)
+
+        triangles = triangles.astype(np.intp)
+        if self.region is not None:
+            triangles = triangles[self._keep('tin',
+                                             self.region.reaches(XYZ[triangles]))]
+        used, triangles = np.unique(triangles, return_inverse = True)
+        key = ('tin', color, '')
+        offset = sum(block.shape[0] for block
+                     in self.batches.get(key, {'XYZ': []})['XYZ'])
+        self._append(key,
+                     XYZ = XYZ[used],
+                     triangles = triangles.reshape(-1, 3) + offset)
+
+    def ellipsoid(self, P, K, color = 'n', name = '', texture = ''):
+        """
+        Records error ellipsoids, see ruby_ellipsoid.
+        """
+        if isinstance(K, np.ndarray) and K.ndim == 2:
+            K = K[np.newaxis]
+
+        if self.file.validate:
+            check_array('Scene.ellipsoid', 'P', P, (None, 3))
+            check_symmetric('Scene.ellipsoid', 'K', K)
+            if not(K.shape[0] == P.shape[0] or K.shape[0] == 1):
+                raise ValueError('Error in Scene.ellipsoid. ',
+                    'P and K should have the same number of entries')
+            check_color('Scene.ellipsoid', color)
+            check_name('Scene.ellipsoid', name, P.shape[0])
+            check_texture('Scene.ellipsoid', texture)
+
+        rows = P.shape[0]
+        K = np.broadcast_to(K, (rows, 3, 3))
+        name = name_column(name, rows)
+        if self.region is not None:
+            # Box bounding each ellipsoid, whose semi-axes along X, Y and Z
+            # are the square roots of the diagonal of K
+            half = np.sqrt(np.diagonal(K, axis1 = 1, axis2 = 2))
+            kept = self._keep('ellipsoid', self.region.reaches(
+                P[:, np.newaxis, :] + BOX_CORNERS * half[:, np.newaxis, :]))
+            P, K, name = P[kept], K[kept], name[kept]
+
+        self._append(('ellipsoid', color, texture),
+                     P = P,
+                     K = K,
+                     name = name)
+
+    def arrow(self, P, v, color = 'n', name = '', layout = 'columns'):
+        """
+        Records arrows, see ruby_arrow.
+        """
+        if self.file.validate:
+            check_choice('Scene.arrow', 'layout', layout, ['columns', 'rows'])
+            check_array('Scene.arrow', 'P', P,
+                        (3, None) if layout == 'columns' else (None, 3))
+            check_array('Scene.arrow', 'v', v, P.shape)
+
+        if layout == 'columns':
+            P = P.T
+            v = v.T
+
+        if self.file.validate:
+            check_color('Scene.arrow', color)
+            check_name('Scene.arrow', name, P.shape[0])
+
+        name = name_column(name, P.shape[0])
+        if self.region is not None:
+            kept = self._keep('arrow', self.region.reaches(
+                np.stack((P, P + v), axis = 1)))
+            P, v, name = P[kept], v[kept], name[kept]
+
+        self._append(('arrow', color, ''),
+                     P = P,
+                     v = v,
+                     name = name)
+
+    def flush(self):
+        """
+        Writes every batch to the script and empties the scene. Arguments
+        were checked when recorded, so the ruby_* calls skip validation.
+        """
+        validate = self.file.validate
+        self.file.validate = False
+        try:
+            for (primitive, color, style), batch in self.batches.items():
+                if primitive == 'line':
+                    # Pieces of lines are not joined
+                    for XYZ, name in zip(batch['XYZ'], batch['name']):
+                        ruby_line(self.file, XYZ,
+                                  '' if (name == '').all() else name)
+                    continue
+
+                columns = {label: np.concatenate(values)
+                           for label, values in batch.items()}
+                if primitive == 'tin':
+                    if columns['triangles'].shape[0] > 0:
+                        ruby_tin(self.file, columns['XYZ'],
+                                 columns['triangles'], color = color,
+                                 mode = 'mesh')
+                    continue
+
+                name = columns['name']
+                if (name == '').all():
+                    name = ''
+
+                if columns['P' if 'P' in columns else 'XYZ'].shape[0] == 0:
+                    continue
+                elif primitive == 'point':
+                    ruby_point(self.file, columns['XYZ'], columns['issymbolic'],
+                               symbol = style, color = color, name = name,
+                               mode = self.point_mode)
+                elif primitive == 'ellipsoid':
+                    ruby_ellipsoid(self.file, columns['P'], columns['K'],
+                                   color = color, name = name, texture = style)
+                else:
+                    ruby_arrow(self.file, columns['P'], columns['v'],
+                               color = color, name = name, layout = 'rows')
+        finally:
+            self.file.validate = validate
+
+        self.batches = {}
+
+def name_column(name, rows):
+    """
+    Returns name as a rows-by-1 array of names, repeating a single name.
+    """
+    if isinstance(name, str):
+        return np.full((rows, 1), name, dtype = object)
+    return name.astype(object)
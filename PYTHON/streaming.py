@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import collections.abc
+import mmap
+import numpy as np
+
+# Number of rows formatted at once when an array is streamed
+CHUNK_ROWS = 10000
+
+# Input of ruby_point, ruby_line and ruby_tin larger than memory can be given
+# as a path to a .npy file, a memory-mapped array or an iterator of arrays.
+# It is then read and written chunk by chunk, so that only one chunk is held
+# in memory at a time.
+
+def is_stream(values):
+    """
+    Returns whether values has to be read chunk by chunk: a path to a .npy
+    file, a memory-mapped array (np.memmap) or an iterator of arrays, e.g. a
+    generator. Other values, lists of rows included, are taken as arrays.
+    """
+    return isinstance(values, (str, np.memmap, collections.abc.Iterator))
+
+def iter_chunks(values, chunk_rows = CHUNK_ROWS):
+    """
+    Iterates over the rows of values by blocks of at most chunk_rows rows.
+
+    Parameters
+    ----------
+    values : str, np.ndarray, iterable
+        Path to a .npy file, which is memory mapped, array or iterable of
+        arrays. Arrays are split into views of chunk_rows rows, the chunks
+        of an iterable are passed through
+    chunk_rows : int (optional)
+        Number of rows per chunk of arrays
+
+    Yields
+    ------
+    np.ndarray
+        Successive blocks of rows
+
+    """
+    if isinstance(values, str):
+        values = np.load(values, mmap_mode = 'r')
+
+    if isinstance(values, np.ndarray):
+        for start in range(0, values.shape[0], chunk_rows):
+            yield np.asarray(values[start:start + chunk_rows])
+            release(values)
+    else:
+        for chunk in values:
+            yield np.asarray(chunk) if isinstance(chunk, np.ndarray) else chunk
+
+def take_rows(values, start, stop):
+    """
+    Returns the rows start to stop of values if it is an array, and values
+    itself otherwise (single value shared by all rows).
+    """
+    if isinstance(values, np.ndarray):
+        return np.asarray(values[start:stop])
+    return values
+
+def release(values):
+    """
+    Drops the pages of the memory-mapped array values from the resident
+    memory of the process once a block has been written. They are read again
+    from the file if needed. Does nothing for other arrays, nor for arrays
+    mapped in another mode than 'r', whose pages may hold changes that are
+    not in the file (copy-on-write mode 'c').
+    """
+    mapping = getattr(values, '_mmap', None)
+    if getattr(values, 'mode', None) == 'r' and mapping is not None \
+        and hasattr(mapping, 'madvise') \
+        and hasattr(mmap, 'MADV_DONTNEED'):
+        mapping.madvise(mmap.MADV_DONTNEED)
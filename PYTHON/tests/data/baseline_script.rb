@@ -0,0 +1,122 @@
+model = Sketchup.active_model
+
+sph0 = Sketchup.active_model.entities.add_group
+c1 = sph0.entities.add_circle(ORIGIN,Z_AXIS,39.3700787402,24)
+c2 = sph0.entities.add_circle(ORIGIN,X_AXIS,50,24)
+f  = sph0.entities.add_face(c1)
+f.followme(c2)
+c2.each {|edge| edge.erase!}
+
+arr0 = Sketchup.active_model.entities.add_group
+pts=[[0.0,0,0.0],[1.9685039370100001,0,0.0],[1.9685039370100001,0,31.496062992160002],[3.9370078740200003,0,31.496062992160002],[0.0,0,39.3700787402]]
+f = arr0.entities.add_face(pts)
+c1 = arr0.entities.add_circle(ORIGIN,Z_AXIS,39.3701,24)
+f.followme(c1)
+c1.each {|edge| edge.erase!}
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_cpoint Geom::Point3d.new(4.921259842525,118.1102362206,78.7401574804)
+
+
+group.entities.add_cpoint Geom::Point3d.new(59.0551181103,-127.95275590565001,157.4803149608)
+
+
+group.entities.add_cpoint Geom::Point3d.new(3939.4685039412625,196.850393701,157.4803149608)
+
+
+group.entities.add_cpoint Geom::Point3d.new(0.0,196.850393701,0.0787401574804)
+
+group = Sketchup.active_model.entities.add_group
+group = Sketchup.active_model.entities.add_group
+group.entities.add_cpoint Geom::Point3d.new(4.921259842525,118.1102362206,78.7401574804)
+
+group.entities.add_line([-5.078740157475,108.1102362206,78.7401574804],[14.921259842525,128.1102362206,78.7401574804])
+group.entities.add_line([-5.078740157475,128.1102362206,78.7401574804],[14.921259842525,108.1102362206,78.7401574804])
+
+group.name ='c'
+
+group.entities.add_cpoint Geom::Point3d.new(59.0551181103,-127.95275590565001,157.4803149608)
+
+group.name ='c'
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_cpoint Geom::Point3d.new(3939.4685039412625,196.850393701,157.4803149608)
+
+group.entities.add_line([3929.4685039412625,186.850393701,157.4803149608],[3949.4685039412625,206.850393701,157.4803149608])
+group.entities.add_line([3929.4685039412625,206.850393701,157.4803149608],[3949.4685039412625,186.850393701,157.4803149608])
+
+group.name ='c'
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_cpoint Geom::Point3d.new(0.0,196.850393701,0.0787401574804)
+
+group.entities.add_line([-10.0,186.850393701,0.0787401574804],[10.0,206.850393701,0.0787401574804])
+group.entities.add_line([-10.0,206.850393701,0.0787401574804],[10.0,186.850393701,0.0787401574804])
+
+group.name ='c'
+group = Sketchup.active_model.entities.add_group
+group = Sketchup.active_model.entities.add_group
+group.entities.add_cpoint Geom::Point3d.new(4.921259842525,118.1102362206,78.7401574804)
+
+f=group.entities.add_circle([4.921259842525,118.1102362206,78.7401574804],Z_AXIS,20)
+group.entities.add_face(f)
+
+group.name ='a'
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_cpoint Geom::Point3d.new(59.0551181103,-127.95275590565001,157.4803149608)
+
+f=group.entities.add_circle([59.0551181103,-127.95275590565001,157.4803149608],Z_AXIS,20)
+group.entities.add_face(f)
+
+group.name ='b'
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_cpoint Geom::Point3d.new(3939.4685039412625,196.850393701,157.4803149608)
+
+f=group.entities.add_circle([3939.4685039412625,196.850393701,157.4803149608],Z_AXIS,20)
+group.entities.add_face(f)
+
+group.name ='c'
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_cpoint Geom::Point3d.new(0.0,196.850393701,0.0787401574804)
+
+f=group.entities.add_circle([0.0,196.850393701,0.0787401574804],Z_AXIS,20)
+group.entities.add_face(f)
+
+group.name ='d'
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_line([4.921259842525,118.1102362206,78.7401574804], [59.0551181103,-127.95275590565001,157.4803149608])
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_line([59.0551181103,-127.95275590565001,157.4803149608], [3939.4685039412625,196.850393701,157.4803149608])
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_line([3939.4685039412625,196.850393701,157.4803149608], [0.0,196.850393701,0.0787401574804])
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_line([4.921259842525,118.1102362206,78.7401574804], [59.0551181103,-127.95275590565001,157.4803149608])
+group.name ='line1'
+
+group = Sketchup.active_model.entities.add_group
+group.entities.add_line([59.0551181103,-127.95275590565001,157.4803149608], [3939.4685039412625,196.850393701,157.4803149608])
+group.name ='line2'
+
+group.entities.add_line([4.921259842525,118.1102362206,78.7401574804], [4.921259842525,78.7401574804,78.7401574804])
+group.entities.add_line([4.921259842525,118.1102362206,78.7401574804], [44.291338582725004,118.1102362206,78.7401574804])
+group.entities.add_line([4.921259842525,118.1102362206,78.7401574804], [4.921259842525,118.1102362206,118.1102362206])
+group.entities.add_line([4.921259842525,114.17322834658,114.17322834658], [4.921259842525,118.1102362206,118.1102362206])
+group.entities.add_line([4.921259842525,122.04724409462,114.17322834658], [4.921259842525,118.1102362206,118.1102362206])
+group.entities.add_line([40.35433070870501,114.17322834658,78.7401574804], [44.291338582725004,118.1102362206,78.7401574804])
+group.entities.add_line([40.35433070870501,122.04724409462,78.7401574804], [44.291338582725004,118.1102362206,78.7401574804])
+group.entities.add_line([0.9842519685049997,82.67716535442,78.7401574804], [4.921259842525,78.7401574804,78.7401574804])
+group.entities.add_line([4.921259842525,82.67716535442,74.80314960638], [4.921259842525,78.7401574804,78.7401574804])
+group.name ='reference_axis'
+group.entities.add_text("x", [4.921259842525,78.7401574804,78.7401574804], [0, 0, 0])
+group.entities.add_text("y", [44.291338582725004,118.1102362206,78.7401574804], [0, 0, 0])
+group.entities.add_text("z", [4.921259842525,118.1102362206,118.1102362206], [0, 0, 0])
+
+sph0.entities.clear!
+arr0.entities.clear!
\ No newline at end of file
@@ -0,0 +1,103 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import pytest
+
+from culling import Box, Frustum, Polygon
+from scene import Scene
+
+def test_box():
+    box = Box([0, 0, 0], [1, 2, 3])
+    assert list(box.contains(np.array([[0.5, 1, 1], [0, 0, 0], [2, 1, 1],
+                                       [0.5, 1, -1e-9]]))) \
+        == [True, True, False, False]
+    segments = np.array([[[-1, 1, 1], [2, 1, 1]],    # through the box
+                         [[-1, 1, 1], [-1, 5, 1]],   # beside it
+                         [[2, 3, 1], [3, 4, 1]]])    # beyond a corner
+    assert list(box.reaches(segments)) == [True, False, False]
+
+def test_frustum():
+    # Looking down -Z from 10 m above the origin
+    frustum = Frustum(np.array([[0., 0, 10]]), np.eye(3), focal = 1,
+                      width = 0.5, height = 0.5, far = 20)
+    assert list(frustum.contains(np.array([[0., 0, 0], [4, 0, 0], [6, 0, 0],
+                                           [0, 0, 11], [0, 0, -11]]))) \
+        == [True, True, False, False, False]
+    assert list(frustum.reaches(np.array([[[6., 0, 0], [-6, 0, 0]],
+                                          [[6., 0, 0], [6, 6, 0]]]))) \
+        == [True, False]
+
+def test_polygon():
+    # U-shaped site, open towards +Y between x = 1 and x = 2
+    polygon = Polygon(np.array([[0., 0], [3, 0], [3, 3], [2, 3], [2, 1],
+                                [1, 1], [1, 3], [0, 3]]), zmax = 10)
+    assert list(polygon.contains(np.array([[0.5, 2, 0], [1.5, 2, 0],
+                                           [1.5, 0.5, 0], [0.5, 2, 11]]))) \
+        == [True, False, True, False]
+    segments = np.array([[[1.2, 2, 0], [1.8, 2, 0]],   # in the notch
+                         [[0.5, 2, 0], [2.5, 2, 0]]])  # across it
+    assert list(polygon.reaches(segments)) == [False, True]
+    # Triangle holding the whole polygon
+    assert polygon.reaches(np.array([[[-5., -5, 0], [20, -5, 0],
+                                      [-5, 20, 0]]]))[0]
+
+@pytest.mark.parametrize('region', [
+    Box([0, 0, 0], [10, 10, 10]),
+    Polygon(np.array([[0., 0], [10, 0], [10, 10], [0, 10]])),
+    Frustum(np.array([[5., 5, 30]]), np.eye(3), focal = 1, width = 0.2,
+            height = 0.2)])
+def test_ellipsoids_by_bounding_box(script, region):
+    P = np.array([[5., 5, 5],      # inside
+                  [11, 5, 5],      # outside, reaching in along X
+                  [5, 5, -1.5],    # outside, reaching in along Z
+                  [14, 5, 5]])     # outside
+    K = np.array([np.eye(3), np.diag([4., 0.01, 0.01]),
+                  np.diag([0.01, 0.01, 4]), np.diag([4., 0.01, 0.01])])
+    scene = Scene(script(), region = region)
+    scene.ellipsoid(P, K)
+    assert scene.culled['ellipsoid'] == 1
+    assert np.array_equal(scene.batches[('ellipsoid', 'n', '')]['P'][0],
+                          P[:3])
+
+def test_polygon_within_ellipsoid(script):
+    scene = Scene(script(), region = Polygon(np.array([[0., 0], [1, 0],
+                                                       [0, 1]])))
+    scene.ellipsoid(np.array([[0.5, 0.5, 0]]), 100 * np.eye(3))
+    assert scene.culled.get('ellipsoid', 0) == 0
+
+def test_direct_calls_select_as_scene(script):
+    # Documented selection for the ruby_* functions, which do not cull
+    region = Box([0, 0, 0], [10, 10, 10])
+    XYZ = np.array([[1., 1, 1], [12, 1, 1], [12, 12, 1], [12, 12, 12]])
+    triangles = np.array([[0, 1, 2], [1, 2, 3]])
+    scene = Scene(script(), region = region)
+    scene.point(XYZ)
+    scene.tin(XYZ, triangles)
+
+    assert np.array_equal(scene.batches[('point', 'n', 'triangle')]['XYZ'][0],
+                          XYZ[region.contains(XYZ)])
+    kept = triangles[region.reaches(XYZ[triangles])]
+    assert np.array_equal(kept, triangles[:1])
+    assert np.array_equal(scene.batches[('tin', 'n', '')]['XYZ'][0],
+                          XYZ[np.unique(kept)])
@@ -0,0 +1,95 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import pytest
+
+from decimation import decimate_tin, xy_area
+
+def grid(size, relief = 1.):
+    """
+    Returns the vertices and triangles of a smooth height field on a regular
+    size x size grid.
+    """
+    X, Y = np.meshgrid(np.linspace(0, 10, size), np.linspace(0, 10, size))
+    Z = relief * (np.sin(X / 2) * np.cos(Y / 3) \
+        + 0.01 * np.random.default_rng(0).random(X.shape))
+    XYZ = np.column_stack([X.ravel(), Y.ravel(), Z.ravel()])
+    corners = (np.arange(size - 1)[:, None] * size \
+               + np.arange(size - 1)).ravel()
+    triangles = np.vstack([
+        np.column_stack([corners, corners + 1, corners + size + 1]),
+        np.column_stack([corners, corners + size + 1, corners + size])])
+    return XYZ, triangles
+
+def vertical_error(XYZ, V, T):
+    """
+    Returns the largest vertical distance between the points XYZ and the
+    TIN (V, T), which covers them.
+    """
+    A, B, C = V[T[:, 0]], V[T[:, 1]], V[T[:, 2]]
+    area = 2 * xy_area(V, T)
+    error = 0
+    for x, y, z in XYZ:
+        # Barycentric coordinates of the point in every triangle
+        a = ((B[:, 0] - x) * (C[:, 1] - y) - (C[:, 0] - x) * (B[:, 1] - y)) \
+            / area
+        b = ((C[:, 0] - x) * (A[:, 1] - y) - (A[:, 0] - x) * (C[:, 1] - y)) \
+            / area
+        c = 1 - a - b
+        inside = (a > -1e-9) & (b > -1e-9) & (c > -1e-9)
+        assert inside.any()
+        height = a * A[:, 2] + b * B[:, 2] + c * C[:, 2]
+        error = max(error, np.abs(height[inside] - z).max())
+    return error
+
+def test_face_budget():
+    XYZ, triangles = grid(20)
+    V, T, kept, report = decimate_tin(XYZ, triangles, target_faces = 100)
+    assert T.shape[0] <= 100
+    assert report['faces'] == T.shape[0]
+    assert np.array_equal(V, XYZ[kept])
+    # Nothing folded over, nor left uncovered
+    assert (xy_area(V, T) > 0).all()
+    assert np.isclose(xy_area(V, T).sum(), 100)
+
+@pytest.mark.parametrize('bound', [0.01, 0.05, 0.2])
+def test_vertical_error_bound(bound):
+    XYZ, triangles = grid(15)
+    V, T, kept, report = decimate_tin(XYZ, triangles,
+                                      max_vertical_error = bound)
+    assert T.shape[0] < triangles.shape[0]
+    assert report['max_vertical_error'] <= bound
+    assert vertical_error(XYZ, V, T) <= bound + 1e-9
+
+def test_boundary_is_kept():
+    XYZ, triangles = grid(12)
+    V, T, kept, report = decimate_tin(XYZ, triangles, target_faces = 2)
+    boundary = np.flatnonzero((XYZ[:, 0] % 10 == 0) | (XYZ[:, 1] % 10 == 0))
+    assert np.isin(boundary, kept).all()
+
+def test_nothing_to_reach():
+    XYZ, triangles = grid(5)
+    V, T, kept, report = decimate_tin(XYZ, triangles)
+    assert np.array_equal(kept, np.arange(XYZ.shape[0]))
+    assert T.shape[0] == triangles.shape[0] and report['ratio'] == 1
@@ -0,0 +1,63 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import pytest
+
+from helpers import rotation_to_axis_angle
+
+def axis_angle_matrix(axis, angle):
+    """
+    Returns the rotations by angle about the unit vectors axis, N-by-3 and N
+    arrays.
+    """
+    k = np.zeros((axis.shape[0], 3, 3))
+    k[:, 0, 1], k[:, 0, 2], k[:, 1, 2] = -axis[:, 2], axis[:, 1], -axis[:, 0]
+    k -= np.transpose(k, (0, 2, 1))
+    return np.eye(3) + np.sin(angle)[:, None, None] * k \
+        + (1 - np.cos(angle))[:, None, None] * k @ k
+
+def random_axes(count, seed = 0):
+    axis = np.random.default_rng(seed).normal(size = (count, 3))
+    return axis / np.linalg.norm(axis, axis = 1)[:, None]
+
+@pytest.mark.parametrize('angle', [0, 1e-12, 1e-7, 1e-3, 0.5, np.pi / 2,
+                                   2, np.pi - 1e-3, np.pi - 1e-7,
+                                   np.pi - 1e-12, np.pi])
+def test_axis_angle(angle):
+    axis = random_axes(100)
+    R = axis_angle_matrix(axis, np.full(100, angle))
+    v, t = rotation_to_axis_angle(R)
+    assert np.allclose(np.linalg.norm(v, axis = 1), 1)
+    assert ((t >= 0) & (t <= np.pi)).all()
+    assert np.allclose(t, angle, atol = 1e-7)
+    assert np.allclose(axis_angle_matrix(v, t), R, atol = 1e-12)
+    if 1e-6 < angle < np.pi - 1e-6:
+        assert np.allclose(v, axis)
+
+def test_single_matrix():
+    v, t = rotation_to_axis_angle(np.array([[0., -1, 0], [1, 0, 0],
+                                            [0, 0, 1]]))
+    assert np.allclose(v, [[0, 0, 1]]) and np.allclose(t, [np.pi / 2])
+    v, t = rotation_to_axis_angle(np.eye(3))
+    assert np.allclose(v, [[0, 0, 1]]) and np.allclose(t, [0])
@@ -0,0 +1,56 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def imported(statements):
+    """
+    Returns the top-level modules imported by running statements in a new
+    interpreter.
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', statements + '\nimport sys\n'
+         + 'print(" ".join(sorted({name.split(".")[0] '
+         + 'for name in sys.modules})))'],
+        cwd = DIRECTORY, capture_output = True, text = True, check = True)
+    return output.stdout.split()
+
+@pytest.mark.parametrize('module', ['ruby_lib', 'scene', 'parallel',
+                                    'culling', 'voxels', 'decimation'])
+def test_import_needs_numpy_only(module):
+    modules = imported('import ' + module)
+    assert 'numpy' in modules
+    assert not {'scipy', 'matplotlib', 'pandas'} & set(modules)
+
+def test_scipy_imported_when_used():
+    pytest.importorskip('scipy')
+    modules = imported('import numpy as np\nfrom helpers import '
+                       + 'delaunay_triangles\n'
+                       + 'delaunay_triangles(np.random.rand(10, 2))')
+    assert 'scipy' in modules
@@ -0,0 +1,91 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import pytest
+
+from loaders import load_array, peak_rss
+from ruby_lib import ruby_close, ruby_ellipsoid
+from streaming import release
+
+@pytest.fixture
+def network(tmp_path):
+    rng = np.random.default_rng(0)
+    P = rng.random((30, 3))
+    A = rng.normal(size = (30, 3, 3))
+    K = A @ np.transpose(A, (0, 2, 1)) + 0.1 * np.eye(3)
+    np.save(tmp_path / 'P.npy', P)
+    np.savez(tmp_path / 'network.npz', P = P, K = K)
+    np.savez_compressed(tmp_path / 'compressed.npz', P = P, K = K)
+    return tmp_path, P, K
+
+def test_npy_and_npz_are_mapped(network):
+    directory, P, K = network
+    for values, expected in [(load_array(str(directory / 'P.npy')), P),
+        (load_array(str(directory / 'network.npz'), 'P'), P),
+        (load_array(str(directory / 'network.npz'), 'K'), K)]:
+        assert isinstance(values, np.memmap) and values.mode == 'r'
+        assert np.array_equal(values, expected)
+    # Compressed members are read
+    assert np.array_equal(load_array(str(directory / 'compressed.npz'), 'K'),
+                          K)
+
+def test_invalid_files(network):
+    directory = network[0]
+    with pytest.raises(ValueError):
+        load_array(str(directory / 'P.txt'))
+    with pytest.raises(ValueError):
+        load_array(str(directory / 'network.npz'))
+    with pytest.raises(KeyError):
+        load_array(str(directory / 'network.npz'), 'R')
+
+def test_mapped_ellipsoids_equal_arrays(script, network):
+    directory, P, K = network
+    texts = []
+    for mapped in [False, True]:
+        file = script(str(mapped) + '.rb')
+        if mapped:
+            ruby_ellipsoid(file, load_array(str(directory / 'network.npz'), 'P'),
+                           load_array(str(directory / 'network.npz'), 'K'))
+        else:
+            ruby_ellipsoid(file, P, K)
+        ruby_close(file)
+        with open(file.name) as text:
+            texts.append(text.read())
+    assert texts[0] == texts[1]
+
+def test_release_keeps_values(network):
+    directory, P, K = network
+    values = np.load(str(directory / 'P.npy'), mmap_mode = 'r')
+    release(values[:10])
+    assert np.array_equal(values, P)
+
+    # Changes of a copy-on-write map are only in memory
+    values = np.load(str(directory / 'P.npy'), mmap_mode = 'c')
+    values[0] = 7
+    release(values)
+    assert (values[0] == 7).all()
+
+def test_peak_rss():
+    peak = peak_rss()
+    assert peak is None or peak > 0
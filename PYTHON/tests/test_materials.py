@@ -0,0 +1,80 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import os
+import re
+
+import numpy as np
+
+from ruby_lib import ruby_close, ruby_ellipsoid, ruby_material, ruby_plane, \
+    ruby_point
+
+SQUARE = np.array([[0., 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+
+def read(file, directory):
+    """
+    Returns the text of a closed script, all its parts for sharded ones.
+    """
+    names = [os.path.join(directory, part) for part, layer
+             in getattr(file, 'parts', [])] or [file.name]
+    texts = []
+    for name in names:
+        with open(name) as text:
+            texts.append(text.read())
+    return ''.join(texts)
+
+def draw(file):
+    for index in range(20):
+        ruby_point(file, np.random.default_rng(index).random((10, 3)),
+                   issymbolic = 1, color = 'r')
+        ruby_plane(file, SQUARE + index, color = 'r')
+        ruby_plane(file, SQUARE + index, texture = '/images/color.jpg')
+        ruby_ellipsoid(file, np.zeros((1, 3)) + index, np.eye(3),
+                       texture = '/images/color.jpg')
+
+def test_materials_are_defined_once(script, tmp_path):
+    for options in [{}, {'shard_size': 2000}]:
+        file = script(str(len(options)) + '.rb', **options)
+        draw(file)
+        ruby_close(file)
+        text = read(file, str(tmp_path))
+        added = re.findall(r"materials\.add\('(.*)'\)", text)
+        assert sorted(added) == sorted(set(added))
+        assert text.count('mat_r = Sketchup') == 1
+        if options:
+            assert len(file.parts) > 5
+            assert text.count('mat_r = $ruby_lib[:mat_r]') > 0
+
+def test_textures_have_their_own_names(script):
+    file = script()
+    variables = [ruby_material(file, texture = '/images/a.jpg'),
+                 ruby_material(file, texture = '/images/b.jpg'),
+                 ruby_material(file, texture = '/images/a.jpg', size = 10.),
+                 ruby_material(file, texture = '/images/a.jpg')]
+    ruby_close(file)
+    with open(file.name) as text:
+        text = text.read()
+    assert len(set(variables)) == 3 and variables[0] == variables[3]
+    for variable in set(variables):
+        assert text.count(variable + ' = Sketchup.active_model.materials' \
+                          + '.add(\'ruby_lib_' + variable[4:] + '\')') == 1
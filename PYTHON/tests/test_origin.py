@@ -0,0 +1,85 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import re
+
+import numpy as np
+import pytest
+
+from ruby_lib import ruby_arrow, ruby_axis, ruby_close, ruby_ellipsoid, \
+    ruby_grid_dem, ruby_line, ruby_plane, ruby_point, ruby_pose, \
+    ruby_resection, ruby_tin
+
+ORIGIN = np.array([2600000., 1200000., 400.])
+NUMBER = r'-?\d+\.?\d*(?:e-?\d+)?'
+
+def draw(file, shift):
+    """
+    Draws elements around ORIGIN, with coordinates shifted by shift. They are
+    multiples of 1/8, which are shifted exactly.
+    """
+    rng = np.random.default_rng(0)
+    XYZ = rng.integers(0, 80, (6, 3)) / 8 + ORIGIN - shift
+    R = np.array([[0., 1, 0], [-1, 0, 0], [0, 0, 1]])
+    ruby_point(file, XYZ, issymbolic = np.array([[1], [0]] * 3),
+               color = 'r', name = 'cloud')
+    ruby_point(file, XYZ, issymbolic = 1, mode = 'components')
+    ruby_line(file, XYZ)
+    ruby_line(file, XYZ, mode = 'polyline')
+    ruby_axis(file, XYZ[:1], R)
+    ruby_pose(file, XYZ[1:2], R)
+    ruby_ellipsoid(file, XYZ, np.diag([1., 2, 3]))
+    ruby_plane(file, XYZ[[0, 1, 2]], color = 'b')
+    ruby_resection(file, XYZ[3:4], XYZ[4:])
+    ruby_tin(file, XYZ, np.array([[0, 1, 2], [2, 3, 4]]), mode = 'mesh')
+    ruby_tin(file, XYZ, np.array([[0, 1, 2], [2, 3, 4]]))
+    ruby_arrow(file, XYZ[:2], rng.random((2, 3)), layout = 'rows')
+    ruby_grid_dem(file, rng.integers(0, 8, (4, 5)) / 8 + ORIGIN[2] - shift[2],
+                  ORIGIN[0] - shift[0], ORIGIN[1] - shift[1], 2., 3.)
+
+def read(file):
+    ruby_close(file)
+    with open(file.name) as text:
+        return text.read()
+
+@pytest.mark.parametrize('precision', [None, 3])
+def test_origin_shifts_every_position(script, precision):
+    shifted = script('shifted.rb', precision = precision, origin = ORIGIN)
+    draw(shifted, np.zeros(3))
+    local = script('local.rb', precision = precision)
+    draw(local, ORIGIN)
+
+    text = read(shifted)
+    block = '# Coordinates relative to the local origin (m)\n' \
+        + 'ruby_lib_origin = [2600000.0,1200000.0,400.0]\n' \
+        + 'model.set_attribute(\'ruby_lib\', \'origin\', ruby_lib_origin)\n\n'
+    assert text.count(block) == 1
+    # Identical but for rounding, derived points being computed before the
+    # shift
+    texts = [text.replace(block, ''), read(local)]
+    numbers = [np.array(re.findall(NUMBER, text), dtype = float)
+               for text in texts]
+    assert re.sub(NUMBER, '0', texts[0]) == re.sub(NUMBER, '0', texts[1])
+    assert np.allclose(numbers[0], numbers[1], rtol = 0, atol = 1e-3)
+    # A few digits before the point, instead of 10 in model units
+    assert np.abs(numbers[0]).max() < 1e4
@@ -0,0 +1,90 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import pytest
+
+from parallel import ruby_parallel
+from ruby_lib import ruby_close, ruby_ellipsoid, ruby_layer, ruby_point, \
+    ruby_tin
+
+def grid(size):
+    """
+    Returns the vertices and triangles of a random height field on a regular
+    size x size grid.
+    """
+    X, Y = np.meshgrid(np.arange(size), np.arange(size))
+    Z = np.random.default_rng(1).random(X.shape)
+    XYZ = np.column_stack([X.ravel(), Y.ravel(), Z.ravel()]).astype(float)
+    corners = (np.arange(size - 1)[:, None] * size \
+               + np.arange(size - 1)).ravel()
+    triangles = np.vstack([
+        np.column_stack([corners, corners + 1, corners + size + 1]),
+        np.column_stack([corners, corners + size + 1, corners + size])])
+    return XYZ, triangles
+
+def calls():
+    rng = np.random.default_rng(0)
+    XYZ, triangles = grid(12)
+    return [(ruby_point, (rng.random((400, 3)),),
+             {'issymbolic': 1, 'color': 'r', 'mode': 'components',
+              'lod_levels': 3, 'lod_points': 50, 'name': 'cloud'}),
+            (ruby_tin, (XYZ, triangles), {'color': 'g', 'tile_size': 4,
+                                          'name': 'dem'}),
+            (ruby_ellipsoid, (rng.random((3, 3)), np.eye(3) / 100),
+             {'color': 'b'}),
+            (ruby_point, (rng.random((50, 3)),),
+             {'issymbolic': 1, 'color': 'r', 'mode': 'components'})]
+
+def read_script(file, directory):
+    """
+    Returns the text of the manifest and of each part of a closed script.
+    """
+    names = [file.name] + [str(directory / part) for part, layer
+                           in getattr(file, 'parts', [])]
+    texts = []
+    for name in names:
+        with open(name) as script:
+            texts.append(script.read())
+    return texts
+
+@pytest.mark.parametrize('options', [{}, {'shard_size': 3000}])
+def test_parallel_equals_serial(script, tmp_path, options):
+    texts = []
+    for parallel in [False, True]:
+        file = script(str(parallel) + '.rb', **options)
+        ruby_layer(file, 'survey')
+        if parallel:
+            ruby_parallel(file, calls(), processes = 2)
+        else:
+            for function, args, kwargs in calls():
+                function(file, *args, **kwargs)
+        ruby_close(file)
+        texts.append(read_script(file, tmp_path))
+        if 'shard_size' in options:
+            assert 'cloud_lod1' in [layer for part, layer in file.parts]
+
+    # Parts are named after their script
+    texts = [[text.replace('True', 'False') for text in parts]
+             for parts in texts]
+    assert texts[0] == texts[1]
@@ -0,0 +1,66 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import re
+
+import numpy as np
+import pytest
+
+from ruby_lib import SCALE_FACTOR, ruby_close, ruby_line
+from writer import decimals_for_tolerance
+
+@pytest.mark.parametrize('tolerance', [2, 1, 0.5, 0.1, 0.03, 1e-3, 7e-5, 1e-9])
+def test_decimals_for_tolerance(tolerance):
+    decimals = decimals_for_tolerance(tolerance)
+    # Rounding to decimals moves values by at most half of tolerance, and
+    # one decimal less would not
+    assert 10 ** -decimals <= tolerance * (1 + 1e-9)
+    assert decimals == 0 or 10 ** -(decimals - 1) > tolerance
+
+def test_decimals_for_tolerance_rejects_zero():
+    with pytest.raises(ValueError):
+        decimals_for_tolerance(0)
+
+def read_points(file):
+    with open(file.name) as script:
+        text = script.read()
+    values = re.findall(r'ln_v\.concat\(\[(.*)\]\)', text)
+    return np.array(','.join(values).split(','), dtype = float).reshape(-1, 3)
+
+@pytest.mark.parametrize('tolerance', [0.01, 0.001, 1e-5])
+def test_tolerance_bounds_written_coordinates(script, tolerance):
+    XYZ = np.random.default_rng(0).random((200, 3)) * 1000
+    file = script(tolerance = tolerance)
+    ruby_line(file, XYZ, mode = 'polyline')
+    ruby_close(file)
+    assert np.abs(read_points(file) / SCALE_FACTOR - XYZ).max() <= tolerance
+
+def test_prototypes_do_not_depend_on_precision(script):
+    texts = []
+    for precision in [None, 0]:
+        file = script(str(precision) + '.rb', precision = precision)
+        ruby_close(file)
+        with open(file.name) as text:
+            texts.append(text.read())
+    assert texts[0] == texts[1]
+    assert 'add_circle(ORIGIN,Z_AXIS,' + repr(SCALE_FACTOR) + ',24)' in texts[0]
@@ -0,0 +1,46 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+import numpy as np
+import pytest
+
+from ruby_lib import ruby_arrow, ruby_close
+
+def arrows(script, *args, **kwargs):
+    file = script(precision = 3)
+    ruby_arrow(file, *args, **kwargs)
+    ruby_close(file)
+    with open(file.name) as script_file:
+        return script_file.read()
+
+def test_layouts_of_three_arrows(script):
+    # A 3-by-3 array is read as given by layout, never guessed
+    P = np.array([[0., 1, 2], [10, 11, 12], [20, 21, 22]])
+    v = np.array([[1., 0, 0], [0, 2, 0], [0, 0, 3]])
+    assert arrows(script, P, v) == arrows(script, P.T, v.T, layout = 'rows')
+    assert arrows(script, P, v) != arrows(script, P, v, layout = 'rows')
+
+def test_rows_require_three_columns(script):
+    with pytest.raises(ValueError):
+        arrows(script, np.zeros((3, 2)), np.ones((3, 2)), layout = 'rows')
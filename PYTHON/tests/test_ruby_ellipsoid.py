@@ -0,0 +1,99 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import re
+
+import numpy as np
+
+from ruby_lib import SCALE_FACTOR, ruby_close, ruby_ellipsoid
+
+def axis_angle_matrix(axis, angle):
+    """
+    Returns the rotation by angle about the unit vector axis.
+    """
+    k = np.array([[0, -axis[2], axis[1]],
+                  [axis[2], 0, -axis[0]],
+                  [-axis[1], axis[0], 0]])
+    return np.eye(3) + np.sin(angle) * k + (1 - np.cos(angle)) * k @ k
+
+def read_ellipsoids(text):
+    """
+    Returns the positions and covariances of the ellipsoids of a script,
+    rebuilt from their transformations.
+    """
+    P = []
+    K = []
+    for block in text.split('sph1 = sph0.copy')[1:]:
+        s = re.search(r'scaling\((.*)\)', block).group(1).split(',')
+        rotation = re.search(r'rotation\(\[0,0,0\],\[(.*)\],(.*)\)', block)
+        R = np.eye(3) if rotation is None else axis_angle_matrix(
+            np.array(rotation.group(1).split(','), dtype = float),
+            float(rotation.group(2)))
+        t = re.search(r'Transformation.new\(\[(.*)\]\)', block).group(1)
+        P.append(np.array(t.split(','), dtype = float) / SCALE_FACTOR)
+        K.append(R @ np.diag(np.array(s, dtype = float) ** 2) @ R.T)
+    return np.array(P), np.array(K)
+
+def random_covariances(count, seed = 0):
+    A = np.random.default_rng(seed).normal(size = (count, 3, 3))
+    return A @ np.transpose(A, (0, 2, 1)) + 0.1 * np.eye(3)
+
+def test_covariances_from_transformations(script):
+    P = np.random.default_rng(1).random((50, 3)) * 100
+    K = random_covariances(50)
+    # Axis-aligned, drawn without rotation
+    K[0] = np.diag([1., 4, 9])
+    K[1] = np.diag([9., 4, 1])
+    file = script()
+    ruby_ellipsoid(file, P, K, color = 'r')
+    ruby_close(file)
+    with open(file.name) as text:
+        P_read, K_read = read_ellipsoids(text.read())
+    assert np.allclose(P_read, P)
+    assert np.allclose(K_read, K, atol = 1e-8)
+
+def test_batch_equals_single_calls(script):
+    P = np.random.default_rng(2).random((10, 3))
+    K = random_covariances(10, 3)
+    texts = []
+    for batched in [True, False]:
+        file = script(str(batched) + '.rb')
+        if batched:
+            ruby_ellipsoid(file, P, K, color = 'g')
+        else:
+            for i in range(P.shape[0]):
+                ruby_ellipsoid(file, P[i:i + 1], K[i], color = 'g')
+        ruby_close(file)
+        with open(file.name) as text:
+            texts.append(text.read())
+    assert texts[0] == texts[1]
+
+def test_shared_covariance(script):
+    P = np.random.default_rng(4).random((3, 3))
+    K = random_covariances(1, 5)[0]
+    file = script()
+    ruby_ellipsoid(file, P, K)
+    ruby_close(file)
+    with open(file.name) as text:
+        P_read, K_read = read_ellipsoids(text.read())
+    assert np.allclose(P_read, P) and np.allclose(K_read, K)
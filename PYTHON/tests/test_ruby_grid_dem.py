@@ -0,0 +1,145 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import json
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from decimation import xy_area
+from ruby_lib import SCALE_FACTOR, ruby_close, ruby_grid_dem
+
+# Stand-in for the SketchUp API recording the polygon meshes of a script
+MESH_STUB = '''
+require 'json'
+class Stub
+  def initialize(*args) end
+  def method_missing(name, *args, &block) Stub.new end
+  def respond_to_missing?(*) true end
+end
+module Sketchup
+  def self.method_missing(*) Stub.new end
+  def self.const_missing(name) Stub end
+end
+def Object.const_missing(name) Stub.new end
+module Geom
+  def self.const_missing(name) Stub end
+  class Point3d
+    attr_reader :xyz
+    def initialize(*xyz) @xyz = xyz.flatten end
+  end
+  class PolygonMesh
+    attr_reader :points, :polygons
+    def initialize(*)
+      @points = []
+      @polygons = []
+      $ruby_lib_meshes << self
+    end
+    def add_point(point)
+      @points << point.xyz
+      @points.size
+    end
+    def add_polygon(*indices) @polygons << indices end
+  end
+end
+$ruby_lib_meshes = []
+at_exit { puts JSON.generate($ruby_lib_meshes.map {|mesh|
+  {'points' => mesh.points, 'polygons' => mesh.polygons}}) }
+'''
+
+def run_mesh(path):
+    """
+    Runs the script at path and returns the vertices (m) and the triangles,
+    as 0-based indices, of its polygon mesh.
+    """
+    with open(path) as script:
+        text = script.read()
+    with open(path + '.test.rb', 'w') as script:
+        script.write(MESH_STUB + text)
+    output = subprocess.run(['ruby', path + '.test.rb'], capture_output = True,
+                            text = True, check = True).stdout
+    mesh, = json.loads(output)
+    return np.array(mesh['points']).reshape(-1, 3) / SCALE_FACTOR, \
+        np.array(mesh['polygons'], dtype = int).reshape(-1, 3) - 1
+
+def grid_triangles(z, x0, y0, dx, dy):
+    """
+    Returns the corners of the triangles of the cells of the grid z with
+    all their nodes, as an N-by-3-by-3 array.
+    """
+    ny, nx = z.shape
+    x, y = np.meshgrid(x0 + dx * np.arange(nx), y0 + dy * np.arange(ny))
+    nodes = np.column_stack([x.ravel(), y.ravel(), z.ravel()])
+    k = (np.arange(ny - 1)[:, None] * nx + np.arange(nx - 1)).ravel()
+    T = np.vstack([np.column_stack([k, k + 1, k + nx + 1]),
+                   np.column_stack([k, k + nx + 1, k + nx])])
+    return nodes[T][~np.isnan(nodes[T][:, :, 2]).any(axis = 1)]
+
+def same_triangles(A, B):
+    """
+    Returns whether the N-by-3-by-3 arrays A and B hold the same triangles,
+    whatever their order and the order of their corners.
+    """
+    def canonical(T):
+        T = np.round(T, 6).reshape(-1, 3)
+        T = T.reshape(-1, 3, 3)
+        order = np.lexsort(np.transpose(T, (2, 0, 1))[::-1], axis = -1)
+        T = np.take_along_axis(T, order[:, :, None], axis = 1).reshape(-1, 9)
+        return T[np.lexsort(T.T[::-1])]
+    return A.shape == B.shape and np.array_equal(canonical(A), canonical(B))
+
+@pytest.mark.skipif(shutil.which('ruby') is None, reason = 'needs ruby')
+@pytest.mark.parametrize('dx, dy', [(2., 3.), (2., -3.), (-2., -3.)])
+def test_grid_mesh(script, dx, dy):
+    z = np.random.default_rng(0).random((4, 6))
+    file = script()
+    ruby_grid_dem(file, z, 100., 200., dx, dy)
+    ruby_close(file)
+    V, T = run_mesh(file.name)
+
+    assert V.shape == (24, 3) and T.shape == (30, 3)
+    # Each node once, at its place on the grid
+    x, y = np.meshgrid(100 + dx * np.arange(6), 200 + dy * np.arange(4))
+    nodes = np.column_stack([x.ravel(), y.ravel(), z.ravel()])
+    assert np.allclose(np.sort(V, axis = 0), np.sort(nodes, axis = 0))
+    assert same_triangles(V[T], grid_triangles(z, 100., 200., dx, dy))
+    # Counterclockwise seen from above
+    assert (xy_area(V, T) > 0).all()
+
+@pytest.mark.skipif(shutil.which('ruby') is None, reason = 'needs ruby')
+def test_missing_nodes(script):
+    z = np.random.default_rng(1).random((5, 5))
+    z[1, 2] = np.nan
+    z[3, 3] = -9999
+    file = script()
+    ruby_grid_dem(file, z, 0., 0., 1., 1., nodata = -9999)
+    ruby_close(file)
+    V, T = run_mesh(file.name)
+
+    # Nodes of the triangles without missing nodes only
+    z[3, 3] = np.nan
+    expected = grid_triangles(z, 0., 0., 1., 1.)
+    assert V.shape[0] == np.unique(expected.reshape(-1, 3), axis = 0).shape[0]
+    assert same_triangles(V[T], expected)
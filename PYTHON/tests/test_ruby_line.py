@@ -0,0 +1,51 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+import numpy as np
+
+from ruby_lib import ruby_close, ruby_line
+
+def line(script, XYZ, **kwargs):
+    file = script()
+    ruby_line(file, XYZ, mode = 'polyline', **kwargs)
+    ruby_close(file)
+    with open(file.name) as script_file:
+        return script_file.read()
+
+def test_polyline_stream_with_empty_chunks(script):
+    XYZ = np.arange(15, dtype = float).reshape(5, 3)
+    stream = iter([np.empty((0, 3)), XYZ[:1], np.empty((0, 3)), XYZ[1:3],
+                   XYZ[3:]])
+    text = line(script, stream, name = 'track')
+    assert text.count('\ngroup = ') == 1
+    assert text.count('group.name =\'track\'') == 1
+    assert 'add_edges(ln_p[0..4])' in text
+    assert text.count('ln_v = ') == 1
+
+def test_polyline_of_one_point_draws_nothing(script):
+    empty = line(script, np.empty((0, 3)))
+    for XYZ in (np.zeros((1, 3)), iter([np.empty((0, 3)), np.zeros((1, 3))])):
+        text = line(script, XYZ, name = 'track')
+        assert text == empty
+        assert 'track' not in text
@@ -0,0 +1,75 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+import re
+
+import numpy as np
+import pytest
+
+from colormap import ColorScale
+from ruby_lib import SCALE_FACTOR, ruby_close, ruby_point
+
+def test_components_names_symbols(script):
+    file = script()
+    ruby_point(file, np.array([[0., 0, 0], [1, 0, 0]]), issymbolic = 1,
+               name = np.array([['a'], ['b']]), mode = 'components')
+    ruby_close(file)
+    with open(file.name) as script_file:
+        text = script_file.read()
+    assert 'pt_i[0].name =\'a\'' in text
+    assert 'pt_i[1].name =\'b\'' in text
+
+@pytest.mark.parametrize('validate', [True, False])
+def test_components_rejects_names_of_construction_points(script, validate):
+    file = script(validate = validate)
+    with pytest.raises(ValueError):
+        ruby_point(file, np.array([[0., 0, 0], [1, 0, 0]]),
+                   issymbolic = np.array([[1], [0]]),
+                   name = np.array([['a'], ['b']]), mode = 'components')
+
+def test_groups_keep_order_with_color_scale(script):
+    rng = np.random.default_rng(0)
+    XYZ = rng.random((40, 3))
+    issymbolic = (rng.random((40, 1)) < 0.5).astype(int)
+    file = script()
+    ruby_point(file, XYZ, issymbolic,
+               color = ColorScale(rng.random(40), 'jet', levels = 4))
+    ruby_close(file)
+    with open(file.name) as script_file:
+        text = script_file.read()
+
+    # One point per line, in the order of XYZ
+    points = re.findall(r'add_cpoint Geom::Point3d.new\((.*)\)', text)
+    assert np.allclose(np.array([point.split(',') for point in points],
+                                dtype = float) / SCALE_FACTOR, XYZ)
+    # Each point without a symbol follows the group of the previous one
+    assert len(re.findall('^group = ', text, re.M)) \
+        == 1 + np.count_nonzero(issymbolic)
+
+@pytest.mark.parametrize('validate', [True, False])
+def test_level_names_are_layer_names(script, validate):
+    file = script(validate = validate, shard_size = 1000)
+    with pytest.raises(ValueError, match = 'levels of detail'):
+        ruby_point(file, np.zeros((10, 3)), name = 'Jo\'s scan',
+                   lod_levels = 2)
@@ -0,0 +1,76 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import os
+import re
+
+import numpy as np
+import pytest
+
+from ruby_lib import SCALE_FACTOR, ruby_close, ruby_tin
+
+def strip(size):
+    """
+    Returns the vertices and triangles of a random strip of size triangles.
+    """
+    XYZ = np.column_stack([np.arange(size + 2) // 2, np.arange(size + 2) % 2,
+                           np.random.default_rng(0).random(size + 2)])
+    triangles = np.column_stack([np.arange(size), np.arange(size) + 1,
+                                 np.arange(size) + 2])
+    return XYZ, triangles
+
+def read_array(text, variable):
+    values = re.findall(variable + r'\.concat\(\[(.*)\]\)', text)
+    return np.array(','.join(values).split(','), dtype = float)
+
+@pytest.mark.parametrize('validate', [True, False])
+def test_tiles_reject_texture(script, validate):
+    XYZ = np.array([[0., 0, 0], [1, 0, 0], [0, 1, 0]])
+    with pytest.raises(ValueError, match = 'textured'):
+        ruby_tin(script(validate = validate), XYZ, np.array([[0, 1, 2]]),
+                 texture = 'image.png', tile_size = 1)
+
+def test_mesh_holds_triangles(script):
+    XYZ, triangles = strip(500)
+    file = script()
+    ruby_tin(file, XYZ, triangles, color = 'g', mode = 'mesh')
+    ruby_close(file)
+    with open(file.name) as text:
+        text = text.read()
+
+    V = read_array(text, 'tin_v').reshape(-1, 3) / SCALE_FACTOR
+    T = read_array(text, 'tin_t').astype(int).reshape(-1, 3)
+    assert np.allclose(V[T], XYZ[triangles])
+    assert 'Geom::PolygonMesh.new(' + str(len(V)) + ',' + str(len(T)) + ')' \
+        in text
+    assert text.count('add_faces_from_mesh') == 1
+
+def test_mesh_is_smaller_than_faces(script):
+    XYZ, triangles = strip(2000)
+    sizes = []
+    for mode in ['faces', 'mesh']:
+        file = script(mode + '.rb', precision = 3)
+        ruby_tin(file, XYZ, triangles, mode = mode)
+        ruby_close(file)
+        sizes.append(os.path.getsize(file.name))
+    assert sizes[1] < 0.6 * sizes[0]
@@ -0,0 +1,83 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+
+from ruby_lib import ruby_close, ruby_ellipsoid, ruby_point, ruby_tin
+from scene import Scene
+
+def read(file):
+    ruby_close(file)
+    with open(file.name) as text:
+        return text.read()
+
+def test_calls_are_batched_by_style(script):
+    rng = np.random.default_rng(0)
+    XYZ = [rng.random((5, 3)) for index in range(3)]
+    P = rng.random((4, 3))
+    K = np.array([np.diag([1., 2, 3]) * (index + 1) for index in range(4)])
+
+    file = script('scene.rb')
+    scene = Scene(file)
+    scene.point(XYZ[0], issymbolic = 1, color = 'r')
+    scene.ellipsoid(P[:2], K[:2], color = 'g')
+    scene.point(XYZ[1], issymbolic = 1, color = 'b')
+    scene.point(XYZ[2], issymbolic = 1, color = 'r')
+    scene.ellipsoid(P[2:], K[2:], color = 'g')
+    scene.flush()
+    assert scene.batches == {}
+
+    # One call per batch, in the order batches were first used
+    expected = script('calls.rb')
+    ruby_point(expected, np.vstack([XYZ[0], XYZ[2]]), issymbolic = 1,
+               color = 'r', mode = 'components')
+    ruby_ellipsoid(expected, P, K, color = 'g')
+    ruby_point(expected, XYZ[1], issymbolic = 1, color = 'b',
+               mode = 'components')
+    assert read(file) == read(expected)
+
+def test_tins_share_a_mesh(script):
+    XYZ = np.array([[0., 0, 0], [1, 0, 0], [0, 1, 1]])
+    triangles = np.array([[0, 1, 2]])
+    file = script('scene.rb')
+    scene = Scene(file)
+    scene.tin(XYZ, triangles, color = 'g')
+    scene.tin(XYZ + 5, triangles, color = 'g')
+    scene.flush()
+
+    expected = script('calls.rb')
+    ruby_tin(expected, np.vstack([XYZ, XYZ + 5]),
+             np.vstack([triangles, triangles + 3]), color = 'g', mode = 'mesh')
+    assert read(file) == read(expected)
+
+def test_names_and_validation_are_kept(script):
+    file = script(validate = True)
+    scene = Scene(file, point_mode = 'groups')
+    scene.point(np.zeros((2, 3)), issymbolic = np.array([[1], [0]]),
+                name = np.array([['a'], ['b']]))
+    scene.point(np.ones((1, 3)), name = 'c')
+    scene.flush()
+    assert file.validate
+    text = read(file)
+    for name in 'abc':
+        assert 'group.name =\'' + name + '\'' in text
@@ -0,0 +1,55 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+import numpy as np
+import pytest
+
+from ruby_lib import ruby_close, ruby_point
+from streaming import is_stream
+
+def test_streams():
+    assert is_stream('cloud.npy')
+    assert is_stream(iter([np.zeros((2, 3))]))
+    assert is_stream(chunk for chunk in [np.zeros((2, 3))])
+    assert not is_stream(np.zeros((2, 3)))
+    assert not is_stream([[0., 0, 0], [1, 1, 1]])
+
+def test_memmap_is_stream(tmp_path):
+    np.save(tmp_path / 'XYZ.npy', np.zeros((2, 3)))
+    assert is_stream(np.load(tmp_path / 'XYZ.npy', mmap_mode = 'r'))
+
+def test_list_of_rows_is_checked_as_array(script):
+    with pytest.raises(TypeError):
+        ruby_point(script(), [[0., 0, 0], [1, 1, 1]])
+
+def test_generator_draws_as_array(script, tmp_path):
+    XYZ = np.random.default_rng(0).random((25, 3))
+    texts = []
+    for values in (XYZ, (XYZ[i:i + 10] for i in range(0, 25, 10))):
+        file = script(str(len(texts)) + '.rb')
+        ruby_point(file, values, issymbolic = 1)
+        ruby_close(file)
+        with open(file.name) as script_file:
+            texts.append(script_file.read())
+    assert texts[0] == texts[1]
@@ -0,0 +1,89 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import pytest
+
+from ruby_lib import ruby_close, ruby_line, ruby_point, ruby_pose, ruby_tin
+from validation import check_array, check_color, check_flags, \
+    check_indices, check_rotation, check_symmetric
+
+@pytest.mark.parametrize('values, error', [
+    ([[0., 0, 0]], TypeError),                      # not an array
+    (np.zeros((2, 2)), ValueError),                 # shape
+    (np.array([['a', 'b', 'c']]), TypeError),       # not numeric
+    (np.array([[0., np.nan, 0]]), ValueError),      # not finite
+    (np.array([[0., np.inf, 0]]), ValueError)])
+def test_check_array_rejects(values, error):
+    with pytest.raises(error):
+        check_array('f', 'XYZ', values, (None, 3))
+
+def test_check_array_accepts():
+    check_array('f', 'XYZ', np.zeros((0, 3)), (None, 3))
+    check_array('f', 'XYZ', np.arange(6).reshape(2, 3), (None, 3))
+    check_array('f', 'XYZ', np.zeros((2, 3), dtype = np.float32), (2, 3))
+
+def test_other_checks():
+    with pytest.raises(ValueError):
+        check_indices('f', 'triangles', np.array([[0, 1, 3]]), 3)
+    with pytest.raises(TypeError):
+        check_indices('f', 'triangles', np.array([[0, 1, 1.5]]), 3)
+    with pytest.raises(ValueError):
+        check_flags('f', 'issymbolic', np.array([[0], [2]]), 2)
+    with pytest.raises(ValueError):
+        check_color('f', (255, 0, 256))
+    with pytest.raises(TypeError):
+        check_color('f', 'red')
+    with pytest.raises(ValueError):
+        check_rotation('f', 'R', np.diag([1., 1, 2]))
+    with pytest.raises(ValueError):
+        check_symmetric('f', 'K', np.array([[[1., 1, 0], [0, 1, 0],
+                                             [0, 0, 1]]]))
+    check_indices('f', 'triangles', np.array([[0, 1, 2.]]), 3)
+    check_flags('f', 'issymbolic', 1, None)
+    check_color('f', (0, 128, 255))
+
+def test_primitives_check_inputs(script):
+    file = script()
+    with pytest.raises(ValueError):
+        ruby_point(file, np.array([[0., np.nan, 0]]))
+    with pytest.raises(ValueError):
+        ruby_tin(file, np.zeros((3, 3)), np.array([[0, 1, 3]]))
+    with pytest.raises(ValueError):
+        ruby_pose(file, np.zeros((1, 3)), 2 * np.eye(3))
+
+def test_trusted_data_is_not_checked(script):
+    texts = []
+    XYZ = np.random.default_rng(0).random((20, 3))
+    for validate in [True, False]:
+        file = script(str(validate) + '.rb', validate = validate)
+        ruby_point(file, XYZ, issymbolic = 1, color = 'r')
+        ruby_line(file, XYZ)
+        ruby_close(file)
+        with open(file.name) as text:
+            texts.append(text.read())
+    assert texts[0] == texts[1]
+
+    # Invalid data then goes through
+    file = script(validate = False)
+    ruby_point(file, np.array([[0., np.nan, 0]]))
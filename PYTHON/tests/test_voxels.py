@@ -0,0 +1,136 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import pytest
+
+from voxels import KEY_BITS, morton, octree_levels, voxel_filter
+
+def cloud(count = 2000, seed = 0):
+    """
+    Returns a cloud with clusters of nearly duplicate points.
+    """
+    rng = np.random.default_rng(seed)
+    XYZ = rng.random((count, 3)) * 10 - 5
+    return np.vstack([XYZ, XYZ[:count // 4] + 1e-4])[rng.permutation(
+        count + count // 4)]
+
+def reference(XYZ, voxel_size):
+    """
+    Returns the first row of each voxel, in order, and the voxel of each
+    point as an index into them.
+    """
+    ijk = np.floor(XYZ / voxel_size).astype(np.int64)
+    _, first, voxel = np.unique(ijk, axis = 0, return_index = True,
+                                return_inverse = True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    return first[order], rank[voxel.ravel()]
+
+@pytest.mark.parametrize('voxel_size', [0.05, 0.5, 2.])
+def test_one_point_per_voxel(voxel_size):
+    XYZ = cloud()
+    first, voxel = reference(XYZ, voxel_size)
+    kept, rows, values, report = voxel_filter(XYZ, voxel_size,
+                                              policy = 'first')
+    assert np.array_equal(rows, first)
+    assert np.array_equal(kept, XYZ[first])
+    assert values is None
+    assert report == {'points': XYZ.shape[0], 'kept': first.size,
+                      'ratio': first.size / XYZ.shape[0]}
+
+def test_centroid_policy():
+    XYZ = cloud()
+    values = np.random.default_rng(1).random(XYZ.shape[0])
+    first, voxel = reference(XYZ, 0.5)
+    kept, rows, kept_values, report = voxel_filter(XYZ, 0.5, values = values)
+    counts = np.bincount(voxel)
+    assert np.array_equal(rows, first)
+    for axis in range(3):
+        assert np.allclose(kept[:, axis],
+                           np.bincount(voxel, XYZ[:, axis]) / counts)
+    assert np.allclose(kept_values, np.bincount(voxel, values) / counts)
+
+@pytest.mark.parametrize('policy', ['centroid', 'first'])
+def test_stream_equals_array(policy):
+    XYZ = cloud(5000)
+    values = np.arange(XYZ.shape[0], dtype = float)
+    expected = voxel_filter(XYZ, 0.3, policy, values)
+    streamed = voxel_filter((XYZ[i:i + 700] for i in range(0, len(XYZ), 700)),
+                            0.3, policy, values)
+    for array, other in zip(expected[:3], streamed[:3]):
+        assert np.allclose(array, other)
+    assert expected[3] == streamed[3]
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        voxel_filter(cloud(), 0)
+    with pytest.raises(ValueError):
+        voxel_filter(cloud(), 0.1, policy = 'last')
+    with pytest.raises(ValueError):
+        voxel_filter(cloud(), 1e-9)
+
+def cells(XYZ, depth):
+    """
+    Returns the index of the octree cell of depth holding each point, in the
+    cube of octree_levels.
+    """
+    low = XYZ.min(axis = 0)
+    scale = (1 << KEY_BITS) / np.max(XYZ.max(axis = 0) - low)
+    ijk = np.clip(np.floor((XYZ - low) * scale), 0, (1 << KEY_BITS) - 1)
+    return ijk.astype(np.int64) >> (KEY_BITS - depth)
+
+@pytest.mark.parametrize('levels, coarse_points', [(1, 100), (3, 50),
+                                                   (5, 200)])
+def test_levels_partition_cloud(levels, coarse_points):
+    XYZ = cloud(3000)
+    rows, depths = octree_levels(XYZ, levels, coarse_points)
+    assert len(rows) == levels and len(depths) == levels - 1
+    assert np.array_equal(np.sort(np.concatenate(rows)),
+                          np.arange(XYZ.shape[0]))
+    if levels > 1:
+        assert rows[0].size <= coarse_points
+
+    # The levels down to each depth hold one point per occupied cell
+    for level, depth in enumerate(depths):
+        upper = np.concatenate(rows[:level + 1])
+        ijk = cells(XYZ, depth)
+        assert np.unique(ijk[upper], axis = 0).shape \
+            == np.unique(ijk, axis = 0).shape == (upper.size, 3)
+
+def test_levels_of_stream():
+    XYZ = cloud(1000)
+    expected = octree_levels(XYZ, 3, 40)
+    streamed = octree_levels(iter([XYZ[:300], XYZ[300:]]), 3, 40)
+    assert expected[1] == streamed[1]
+    for rows, other in zip(expected[0], streamed[0]):
+        assert np.array_equal(rows, other)
+
+def test_morton_interleaves_bits():
+    cells = np.random.default_rng(0).integers(0, 1 << KEY_BITS, (100, 3))
+    codes = morton(cells)
+    for cell, code in zip(cells, codes):
+        assert int(code) == sum(((int(cell[axis]) >> bit) & 1) \
+                                << (3 * bit + axis)
+                                for bit in range(KEY_BITS) for axis in range(3))
@@ -0,0 +1,143 @@
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import glob
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from ruby_lib import ruby_axis, ruby_close, ruby_ellipsoid, ruby_layer, \
+    ruby_line, ruby_point
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+def draw_baseline(file):
+    """
+    Draws elements whose script is unchanged since the first writer, as in
+    data/baseline_script.rb.
+    """
+    R = np.array([[0., 1, 0], [-1, 0, 0], [0, 0, 1]])
+    XYZ = np.array([[0.125, 3, 2], [1.5, -3.25, 4], [100.0625, 5, 4],
+                    [0, 5, 2e-3]])
+    ruby_point(file, XYZ)
+    ruby_point(file, XYZ, issymbolic = np.array([[1], [0], [1], [1]]),
+               symbol = 'cross', name = 'c')
+    ruby_point(file, XYZ, issymbolic = 1, symbol = 'circle',
+               name = np.array([['a'], ['b'], ['c'], ['d']]))
+    ruby_line(file, XYZ)
+    ruby_line(file, XYZ[:3], name = np.array([['line1'], ['line2']]))
+    ruby_axis(file, XYZ[:1], R, name = 'reference_axis')
+
+@pytest.mark.parametrize('buffer_size', [None, 1, 100])
+def test_default_output_is_unchanged(script, buffer_size):
+    file = script()
+    if buffer_size is not None:
+        file.buffer_size = buffer_size
+    draw_baseline(file)
+    ruby_close(file)
+    with open(file.name) as text, \
+        open(os.path.join(DATA, 'baseline_script.rb')) as expected:
+        assert text.read() == expected.read()
+
+# Minimal stand-in for the SketchUp API, failing when a shared definition
+# is passed unbound (nil), to run the manifest of sharded scripts
+SKETCHUP_STUB = '''
+class Stub
+  def initialize(*args)
+    raise ArgumentError, 'new given nil' if args.include?(nil)
+  end
+  def method_missing(name, *args, &block)
+    raise ArgumentError, name.to_s + ' given nil' if args.include?(nil)
+    Stub.new
+  end
+  def respond_to_missing?(*) true end
+  def self.const_missing(name) Stub end
+  def self.method_missing(*) Stub.new end
+end
+module Sketchup
+  def self.const_missing(name) Stub end
+  def self.method_missing(*) Stub.new end
+end
+Geom = Stub
+def Object.const_missing(name) Stub.new end
+'''
+
+def load_manifest(path, layers):
+    with open(path) as manifest:
+        text = manifest.read().replace('ruby_lib_layers = []',
+            'ruby_lib_layers = [' + ', '.join(['\'' + layer + '\''
+                                               for layer in layers]) + ']')
+    loader = path + '.test.rb'
+    with open(loader, 'w') as script:
+        script.write(SKETCHUP_STUB + text)
+    return subprocess.run(['ruby', loader], capture_output = True,
+                          text = True, check = True).stdout
+
+@pytest.mark.skipif(shutil.which('ruby') is None, reason = 'needs ruby')
+@pytest.mark.parametrize('layers', [[], ['lod0'], ['lod2'], ['poses'],
+                                    ['lod1', 'poses']])
+def test_layers_load_on_their_own(script, layers):
+    rng = np.random.default_rng(0)
+    file = script(shard_size = 2000)
+    ruby_point(file, rng.random((300, 3)), issymbolic = 1, color = 'r',
+               mode = 'components', lod_levels = 3)
+    ruby_layer(file, 'poses')
+    ruby_ellipsoid(file, rng.random((2, 3)), np.eye(3) / 100)
+    ruby_point(file, rng.random((20, 3)), issymbolic = 1, color = 'r',
+               mode = 'components')
+    ruby_close(file)
+
+    assert load_manifest(file.name, layers) == ''
+
+def definitions(file, directory):
+    """
+    Returns the number of symbol definitions and of guarded ones made in the
+    parts of each layer of a closed sharded script.
+    """
+    counts = {}
+    for part, layer in file.parts:
+        with open(os.path.join(directory, part)) as script:
+            text = script.read()
+        made, guarded = counts.get(layer, (0, 0))
+        counts[layer] = (made + text.count('definitions.add'),
+                         guarded + text.count('if $ruby_lib[:sym_'))
+    return counts
+
+@pytest.mark.parametrize('layers, counts', [
+    # Made in a part without a layer, then bound from the shared hash
+    (['', 'a', 'b', 'a'], {'': (1, 0), 'a': (0, 0), 'b': (0, 0)}),
+    # Once per layer, guarded after the first one
+    (['a', 'b', 'a', '', 'b'], {'': (1, 1), 'a': (1, 0), 'b': (1, 1)})])
+def test_definitions_are_made_in_each_layer(script, tmp_path, layers,
+                                            counts):
+    file = script(shard_size = 1000)
+    for layer in layers:
+        ruby_layer(file, layer)
+        ruby_point(file, np.zeros((5, 3)), issymbolic = 1, color = 'r',
+                   mode = 'components')
+    ruby_close(file)
+
+    assert definitions(file, str(tmp_path)) == counts
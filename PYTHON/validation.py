@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import numbers
+
+from colormap import ColorScale
+
+VALID_COLORS = ['n', 'w', 'r', 'o', 'y', 'g', 'b', 'p', 'k']
+VALID_SYMBOLS = ['triangle', 'cross', 'circle', 'square']
+VALID_TEXTURES = ('.png', '.jpg', '.jpeg')
+TOL_ORTHOGONALITY = 1e-6
+
+# Input checks shared by the ruby_* functions. Each check costs a constant
+# number of NumPy calls, whatever the size of the arrays. They can be skipped
+# altogether for data that is already known to be valid, by passing
+# validate = False to ruby_create.
+
+def check_array(function, label, values, shape):
+    """
+    Checks that values is a numpy.ndarray of finite real numbers with the
+    given shape.
+
+    Parameters
+    ----------
+    function : str
+        Name of the calling function, used in error messages
+    label : str
+        Name of the checked argument, used in error messages
+    values : object
+        Checked argument
+    shape : tuple
+        Expected shape, None standing for any size along that axis
+
+    """
+    check_shape(function, label, values, shape)
+
+    if not(np.issubdtype(values.dtype, np.integer) \
+        or np.issubdtype(values.dtype, np.floating)):
+        raise TypeError('Error in ' + function + '. ' + label \
+            + ' should consist of only numeric values.')
+
+    if np.issubdtype(values.dtype, np.floating) and not np.isfinite(values).all():
+        raise ValueError('Error in ' + function + '. ' + label \
+            + ' should consist of only finite values.')
+
+def check_shape(function, label, values, shape):
+    """
+    Checks that values is a numpy.ndarray, possibly memory-mapped, with the
+    given shape, without reading its values.
+    """
+    if not isinstance(values, np.ndarray):
+        raise TypeError('Error in ' + function + '. ' + label \
+            + ' should be a numpy.array.')
+
+    if not(values.ndim == len(shape) \
+        and all(n is None or n == m for n, m in zip(shape, values.shape))):
+        raise ValueError('Error in ' + function + '. Dimension of ' + label \
+            + ' is invalid.')
+
+def check_grid(function, label, values):
+    """
+    Checks that values is a 2-D numpy.ndarray of at least 2-by-2 numeric
+    values, finite or NaN for missing values.
+    """
+    check_shape(function, label, values, (None, None))
+
+    if not (values.shape[0] >= 2 and values.shape[1] >= 2):
+        raise ValueError('Error in ' + function + '. Dimension of ' + label \
+            + ' is invalid.')
+
+    if not(np.issubdtype(values.dtype, np.integer) \
+        or np.issubdtype(values.dtype, np.floating)):
+        raise TypeError('Error in ' + function + '. ' + label \
+            + ' should consist of only numeric values.')
+
+    if np.issubdtype(values.dtype, np.floating) and np.isinf(values).any():
+        raise ValueError('Error in ' + function + '. ' + label \
+            + ' should consist of only finite values or NaN.')
+
+def check_indices(function, label, values, count):
+    """
+    Checks that values is an N-by-3 numpy.ndarray of integer indices in
+    [0, count).
+    """
+    check_array(function, label, values, (None, 3))
+
+    if np.issubdtype(values.dtype, np.floating) \
+        and not (np.floor(values) == values).all():
+        raise TypeError('Error in ' + function + '. ' + label \
+            + ' should consist of only integer values.')
+
+    if values.size > 0 and (values.min() < 0 or values.max() >= count):
+        raise ValueError('Error in ' + function + '. ' + label \
+            + ' does not match with any point')
+
+def check_flags(function, label, values, rows):
+    """
+    Checks that values is 0 or 1, or a rows-by-1 numpy.ndarray of 0 and 1.
+    """
+    if isinstance(values, numbers.Real):
+        values = np.array([[values]])
+        rows = 1
+    elif type(values) is not np.ndarray:
+        raise TypeError('Error in ' + function + '. Not a valid type for ' \
+            + label + '. ' + label + ' must be either an numpy.array or a number.')
+
+    check_array(function, label, values, (rows, 1))
+
+    if not np.isin(values, (0, 1)).all():
+        raise ValueError('Error in ' + function + '. Not a valid value for ' \
+            + label + '. Expects 0 or 1')
+
+def check_name(function, name, rows = None):
+    """
+    Checks that name is a str, or a rows-by-1 numpy.ndarray of names when
+    rows is given.
+    """
+    if isinstance(name, str):
+        return
+
+    if rows is None or not isinstance(name, np.ndarray):
+        raise TypeError('Error in ' + function + '. Not a valid type for name.')
+
+    if not (name.ndim == 2 and name.shape[0] == rows and name.shape[1] == 1):
+        raise ValueError('Error in ' + function + '. Dimension of name is invalid.')
+
+def check_rows(function, label, values, rows):
+    """
+    Checks that values has rows rows if it is a numpy.ndarray.
+    """
+    if isinstance(values, np.ndarray) and not (values.ndim == 2 \
+                                                and values.shape[0] == rows):
+        raise ValueError('Error in ' + function + '. Dimension of ' + label \
+            + ' is invalid.')
+
+def check_segment_names(function, name, segments):
+    """
+    Checks that name is a str, a segments-by-1 numpy.ndarray of names or a
+    dict mapping segment indices to names.
+    """
+    if not isinstance(name, dict):
+        check_name(function, name, segments)
+        return
+
+    for index in name:
+        if not isinstance(index, numbers.Integral) or not (0 <= index < segments):
+            raise ValueError('Error in ' + function + '. Not a valid segment ' \
+                + 'index in name.')
+
+def check_choice(function, label, value, choices):
+    """
+    Checks that value is one of choices.
+    """
+    if not isinstance(value, str) or value not in choices:
+        raise ValueError('Error in ' + function + '. Not a valid ' + label \
+            + ', expects one of ' + ', '.join(choices))
+
+def check_layer(function, label, layer):
+    """
+    Checks that layer is a str that can be quoted in the manifest of a
+    sharded script.
+    """
+    if not isinstance(layer, str) or '\'' in layer:
+        raise ValueError('Error in ' + function + '. Not a valid ' + label \
+            + '.')
+
+def check_color(function, color, rows = None):
+    """
+    Checks that color is one of VALID_COLORS or an (r, g, b) tuple of
+    integers in [0, 255]. When rows is given, color can also be a ColorScale
+    of rows values.
+    """
+    if isinstance(color, ColorScale) and rows is not None:
+        if not (len(color) == rows):
+            raise ValueError('Error in ' + function + '. Dimension of color ' \
+                + 'is invalid.')
+        return
+
+    if isinstance(color, tuple):
+        if not (len(color) == 3 and all(isinstance(c, numbers.Integral) \
+                                        and 0 <= c <= 255 for c in color)):
+            raise ValueError('Error in ' + function + '. Not a valid color, ' \
+                + 'expects an (r, g, b) tuple of integers in [0, 255].')
+    elif not isinstance(color, str) or color not in VALID_COLORS:
+        raise TypeError('Error in ' + function + '. Not a valid color.')
+
+def check_symbol(function, symbol):
+    if not isinstance(symbol, str) or symbol not in VALID_SYMBOLS:
+        raise TypeError('Error in ' + function + '. Not a valid symbol.')
+
+def check_texture(function, texture):
+    if not isinstance(texture, str):
+        raise TypeError('Error in ' + function + '. Not a valid texture, ' \
+            + 'expects a file path')
+
+    if not (texture == '') and not texture.lower().endswith(VALID_TEXTURES):
+        raise TypeError('Error in ' + function + '. Not a valid texture, ' \
+            + 'expects file extension to be one of these: ' \
+            + ', '.join(VALID_TEXTURES))
+
+def check_number(function, label, value):
+    if not isinstance(value, numbers.Real) or not np.isfinite(value):
+        raise TypeError('Error in ' + function + '. Not a valid type for ' \
+            + label + '. Expects a numeric type')
+
+def check_rotation(function, label, R):
+    """
+    Checks that R is a 3-by-3 orthogonal matrix.
+    """
+    check_array(function, label, R, (3, 3))
+
+    if not np.allclose(np.matmul(R, R.T), np.eye(3), rtol = 0,
+                       atol = TOL_ORTHOGONALITY):
+        raise ValueError('Error in ' + function + '. ' + label \
+            + ' should be an orthogonal matrix')
+
+def check_symmetric(function, label, K):
+    """
+    Checks that K is an N-by-3-by-3 array of symmetric matrices.
+    """
+    check_array(function, label, K, (None, 3, 3))
+
+    if not np.allclose(K, np.swapaxes(K, -1, -2)):
+        raise ValueError('Error in ' + function + '. ' + label \
+            + ' should be a symmetric matrix')
+
+def check_planar(function, XYZ, tol_cross_product, tol_coplanarity):
+    """
+    Checks that the polygon XYZ is neither degenerated to a line nor skewed.
+    """
+    # Against the point farthest from the first one, so that finely sampled
+    # outlines are not taken for lines
+    D = XYZ - XYZ[0]
+    far = np.argmax(np.einsum('ij,ij->i', D, D))
+    length = np.linalg.norm(D[far])
+    if not (length > 0 and (np.abs(np.cross(D, D[far] / length)) \
+                            > tol_cross_product).any()):
+        raise ValueError('Error in ' + function + '. The points are colinear.')
+
+    if XYZ.shape[0] > 3:
+        windows = np.stack((XYZ[:-3], XYZ[1:-2], XYZ[2:-1], XYZ[3:]), axis = 1)
+        volume = np.concatenate((windows, np.ones(windows.shape[:2] + (1,))),
+                                axis = 2)
+        if (np.abs(np.linalg.det(volume)) >= tol_coplanarity).any():
+            raise ValueError('Error in ' + function + '. The points are not coplanar')
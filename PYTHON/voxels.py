@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+
+import numpy as np
+
+from streaming import is_stream, iter_chunks
+
+# Number of bits of the key given to each voxel index, which is also the
+# depth of the octree of octree_levels
+KEY_BITS = 21
+
+# Point clouds are thinned on a grid of cubic voxels, keeping one point per
+# occupied voxel. The three voxel indices of a point are packed into one
+# integer key, relative to the voxel of the first point, so that the points
+# are grouped by voxel with a single sort of integers. Streamed clouds are
+# reduced chunk by chunk, only the voxels found so far being held in memory.
+
+def voxel_filter(XYZ, voxel_size, policy = 'centroid', values = None):
+    """
+    Keeps one point per voxel of the cubic grid of size voxel_size, which
+    removes duplicate and nearly duplicate points and thins dense clouds.
+
+    Parameters
+    ----------
+    XYZ : np.ndarray, str, iterator
+        N-by-3 array of coordinates, or path to a .npy file, memory-mapped
+        array or iterator of arrays (see streaming.iter_chunks)
+    voxel_size : float
+        Edge of the voxels, in the units of XYZ
+    policy : str (optional)
+        'centroid' (default), the point of a voxel is the mean of its points,
+        or 'first', the point of a voxel is the first of its points
+    values : np.ndarray (optional)
+        N array of values of the points, e.g. the values of a ColorScale,
+        averaged or taken alike
+
+    Returns
+    -------
+    np.ndarray
+        Coordinates of the points kept, in the order of the first point of
+        each voxel
+    np.ndarray
+        Rows of XYZ of the first point of each voxel
+    np.ndarray
+        Values of the points kept, None without values
+    dict
+        'points': number of points given, 'kept': number of points kept,
+        'ratio': kept over given
+
+    Examples
+    --------
+    Merges the points of a scan closer than 1 cm
+    >>>XYZ, rows, _, report = voxel_filter(XYZ, 0.01)
+
+    """
+    if not (isinstance(voxel_size, (int, float, np.number)) \
+            and np.isfinite(voxel_size) and voxel_size > 0):
+        raise ValueError('Error in voxel_filter. voxel_size must be a ' \
+            + 'strictly positive number.')
+    if policy not in ('centroid', 'first'):
+        raise ValueError('Error in voxel_filter. policy must be ' \
+            + '\'centroid\' or \'first\'.')
+    centroid = policy == 'centroid'
+    half = 1 << (KEY_BITS - 1)
+
+    # Voxels of the previous chunks, merged into one block once the blocks
+    # waiting for merging outweigh it, so that the voxels found so far are
+    # not sorted again for every chunk
+    merged = None
+    pending = []
+    waiting = 0
+    origin = None
+    start = 0
+    for chunk in (iter_chunks(XYZ) if is_stream(XYZ) else [XYZ]):
+        chunk = np.asarray(chunk, dtype = float)
+        if not (chunk.ndim == 2 and chunk.shape[1] == 3):
+            raise ValueError('Error in voxel_filter. XYZ should be an ' \
+                + 'N-by-3 array.')
+        stop = start + chunk.shape[0]
+        if chunk.shape[0] == 0:
+            continue
+        ijk = np.floor(chunk / voxel_size).astype(np.int64)
+        if origin is None:
+            origin = ijk[0].copy()
+            base = chunk[0].copy() if centroid else np.zeros(3)
+        ijk -= origin
+        if not ((ijk >= -half) & (ijk < half)).all():
+            raise ValueError('Error in voxel_filter. The points span more ' \
+                + 'than 2**' + str(KEY_BITS) + ' voxels along an axis, ' \
+                + 'voxel_size is too small.')
+        ijk += half
+        keys = (ijk[:, 0] << (2 * KEY_BITS)) | (ijk[:, 1] << KEY_BITS) \
+             | ijk[:, 2]
+        chunk_values = None if values is None \
+            else np.asarray(values[start:stop], dtype = float).reshape(-1)
+
+        block = _merge([(keys, np.arange(start, stop), chunk - base,
+                         np.ones(chunk.shape[0]), chunk_values)], centroid)
+        pending.append(block)
+        waiting += block[0].size
+        if merged is None:
+            merged = block
+            pending = []
+            waiting = 0
+        elif waiting >= merged[0].size:
+            merged = _merge([merged] + pending, centroid)
+            pending = []
+            waiting = 0
+        start = stop
+
+    if merged is None:
+        return np.empty((0, 3)), np.empty(0, dtype = np.intp), \
+            None if values is None else np.empty(0), \
+            {'points': 0, 'kept': 0, 'ratio': 1.0}
+    if pending:
+        merged = _merge([merged] + pending, centroid)
+    keys, rows, points, counts, sums = merged
+
+    order = np.argsort(rows, kind = 'stable')
+    rows = rows[order]
+    if centroid:
+        kept = points[order] / counts[order, None] + base
+        kept_values = None if values is None else sums[order] / counts[order]
+    else:
+        kept = points[order]
+        kept_values = None if values is None else sums[order]
+
+    report = {'points': start, 'kept': rows.size, 'ratio': rows.size / start}
+    return kept, rows, kept_values, report
+
+def _merge(blocks, centroid):
+    """
+    Merges blocks (keys, rows, points, counts, values) of voxels given in
+    the order of their points into one block with one row per voxel. The
+    first row of a voxel is its earliest one. Points and values are summed
+    for policy 'centroid', taken from the earliest row for policy 'first'.
+    """
+    keys, rows, points, counts = [np.concatenate([block[i] for block in blocks])
+                                  for i in range(4)]
+    values = None if blocks[0][4] is None \
+        else np.concatenate([block[4] for block in blocks])
+
+    keys, index, inverse = np.unique(keys, return_index = True,
+                                     return_inverse = True)
+    inverse = inverse.reshape(-1)
+    if centroid:
+        points = np.column_stack([np.bincount(inverse, points[:, i], keys.size)
+                                  for i in range(3)])
+        if values is not None:
+            values = np.bincount(inverse, values, keys.size)
+    else:
+        points = points[index]
+        if values is not None:
+            values = values[index]
+    return keys, rows[index], points, np.bincount(inverse, counts, keys.size), \
+        values
+
+# Levels of detail of point clouds are read from an octree given by the
+# Morton codes of the points: sorted by code, the points of every cell of
+# every depth are contiguous, and the depth at which two consecutive points
+# fall into separate cells is that of the highest bit in which their codes
+# differ. The whole octree is thus built with one sort.
+
+def octree_levels(XYZ, levels, coarse_points = 10000):
+    """
+    Splits a point cloud into levels of detail. The first level holds one
+    point per occupied cell of the deepest octree depth with at most
+    coarse_points occupied cells, every next level adds one point per cell
+    of the next depth that has none yet, and the last level holds all
+    remaining points. The point of a cell is the one closest to its center
+    along the Morton curve.
+
+    Parameters
+    ----------
+    XYZ : np.ndarray, str, iterator
+        N-by-3 array of coordinates, or path to a .npy file, memory-mapped
+        array or iterator of arrays (see streaming.iter_chunks). Iterators
+        are read into memory, files and memory-mapped arrays are read twice
+    levels : int
+        Number of levels
+    coarse_points : int (optional)
+        Largest number of points of the first level, 10000 by default
+
+    Returns
+    -------
+    list
+        Rows of XYZ of each level, in increasing order
+    list
+        Octree depth of each level but the last
+
+    Examples
+    --------
+    Splits a scan into an overview, two levels of detail and the rest
+    >>>rows, depths = octree_levels('scan.npy', 4, coarse_points = 50000)
+
+    """
+    if not (isinstance(levels, (int, np.integer)) and levels >= 1):
+        raise ValueError('Error in octree_levels. levels must be a ' \
+            + 'strictly positive integer.')
+    if not (isinstance(coarse_points, (int, np.integer)) and coarse_points >= 1):
+        raise ValueError('Error in octree_levels. coarse_points must be a ' \
+            + 'strictly positive integer.')
+    if isinstance(XYZ, str):
+        XYZ = np.load(XYZ, mmap_mode = 'r')
+    elif is_stream(XYZ) and not isinstance(XYZ, np.ndarray):
+        XYZ = np.concatenate(list(iter_chunks(XYZ)))
+    points = XYZ.shape[0]
+    if points == 0:
+        return [np.empty(0, dtype = np.intp)] * levels, []
+
+    # Cube holding the cloud, divided into 2**KEY_BITS cells along each axis
+    low = np.full(3, np.inf)
+    high = np.full(3, -np.inf)
+    for chunk in iter_chunks(XYZ):
+        low = np.minimum(low, chunk.min(axis = 0))
+        high = np.maximum(high, chunk.max(axis = 0))
+    scale = (1 << KEY_BITS) / max(float(np.max(high - low)), np.finfo(float).tiny)
+    codes = np.empty(points, dtype = np.uint64)
+    start = 0
+    for chunk in iter_chunks(XYZ):
+        cells = np.clip(np.floor((chunk - low) * scale), 0,
+                        (1 << KEY_BITS) - 1).astype(np.uint64)
+        codes[start:start + chunk.shape[0]] = morton(cells)
+        start += chunk.shape[0]
+
+    order = np.argsort(codes)
+    codes = codes[order]
+    # Depth at which each point is split from the previous one, KEY_BITS + 1
+    # for duplicates
+    split = np.full(points, KEY_BITS + 1, dtype = np.int8)
+    split[0] = 0
+    differ = codes[1:] ^ codes[:-1]
+    changed = np.flatnonzero(differ)
+    bits = np.floor(np.log2(differ[changed].astype(float))).astype(np.int64)
+    # The conversion to float may round up to the next power of two
+    bits -= np.left_shift(np.uint64(1), bits.astype(np.uint64)) \
+            > differ[changed]
+    split[changed + 1] = KEY_BITS - bits // 3
+    cells = np.cumsum(np.bincount(split, minlength = KEY_BITS + 2))
+    first = int(np.flatnonzero(cells[:KEY_BITS + 1] <= coarse_points)[-1])
+
+    taken = np.zeros(points, dtype = bool)
+    rows = []
+    depths = []
+    for depth in range(first, first + levels - 1):
+        depth = min(depth, KEY_BITS)
+        starts = np.flatnonzero(split <= depth)
+        shift = np.uint64(3 * (KEY_BITS - depth))
+        center = (codes >> shift << shift) \
+            | (np.uint64(7) << (shift - np.uint64(3)) if shift \
+               else np.uint64(0))
+        distance = np.abs(codes.astype(np.int64) - center.astype(np.int64))
+        nearest = np.minimum.reduceat(distance, starts)
+        hits = np.flatnonzero(distance == np.repeat(nearest, np.diff(
+            np.append(starts, points))))
+        # First nearest point of every cell, unless the cell holds a point of
+        # the previous levels
+        cell = np.searchsorted(starts, hits, side = 'right') - 1
+        first_hit = np.append(True, cell[1:] != cell[:-1])
+        chosen = hits[first_hit][~np.logical_or.reduceat(taken, starts)]
+        taken[chosen] = True
+        rows.append(np.sort(order[chosen]))
+        depths.append(depth)
+    rows.append(np.sort(order[~taken]))
+    return rows, depths
+
+def morton(cells):
+    """
+    Returns the Morton codes of an N-by-3 array of cell indices of at most
+    KEY_BITS bits each, interleaving the bits of the indices.
+    """
+    code = np.zeros(cells.shape[0], dtype = np.uint64)
+    for axis in range(3):
+        x = cells[:, axis].astype(np.uint64) & np.uint64(0x1fffff)
+        for shift, mask in ((32, 0x1f00000000ffff), (16, 0x1f0000ff0000ff),
+                            (8, 0x100f00f00f00f00f), (4, 0x10c30c30c30c30c3),
+                            (2, 0x1249249249249249)):
+            x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+        code |= x << np.uint64(axis)
+    return code
@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+# coding: utf-8
+#
+# Copyright 2019 TOPO EPFL
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+
+import numpy as np
+import math
+import os
+
+# Number of characters collected in memory before they are handed to the
+# underlying file in one write call
+BUFFER_SIZE = 1 << 20
+# Number of rows per statement when writing data arrays to the script
+ARRAY_ROWS_PER_LINE = 1000
+# Ruby global through which part files of a sharded script share variables
+SHARED_VARIABLES = '$ruby_lib'
+
+class ScriptWriter:
+    """
+    Buffered writer for generated ruby scripts, returned by ruby_create.
+    Text is collected in memory and written to the underlying file in large
+    chunks. Blocks of NumPy coordinates are formatted in one step from a row
+    template (see format_block).
+
+    Parameters
+    ----------
+    file : file object
+        Open text file the script is written to
+    buffer_size : int (optional)
+        Number of characters buffered before flushing to file
+    decimals : int (optional)
+        Number of decimals written for coordinates. None (default) writes
+        the shortest representation that round-trips the float64 value
+    validate : bool (optional)
+        Whether the ruby_* functions check their arguments before writing.
+        Defaults to True
+
+    """
+
+    def __init__(self, file, buffer_size = BUFFER_SIZE, decimals = None,
+                 validate = True):
+        if decimals is not None \
+            and (not isinstance(decimals, int) or decimals < 0):
+            raise ValueError('Error in ScriptWriter. ',
+                             'decimals must be a non-negative integer')
+
+        self.file = file
+        self.name = getattr(file, 'name', '')
+        self.buffer_size = buffer_size
+        self.decimals = decimals
+        self.validate = validate
+        # Local origin subtracted from positions, set by ruby_create
+        self.origin = None
+        self.definitions = set()
+        self.depth = 0
+        if decimals is None:
+            self.number_format = '%s'
+        else:
+            self.number_format = '%.' + str(decimals) + 'f'
+        self._chunks = []
+        self._size = 0
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+    def write(self, text):
+        """
+        Appends text to the buffer, flushing it when it is full.
+        """
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def newline(self, count = 1):
+        self.write('\n' * count)
+
+    def write_lines(self, lines):
+        """
+        Writes each string of lines followed by a newline.
+        """
+        if len(lines) > 0:
+            self.write('\n'.join(lines) + '\n')
+
+    def define_once(self, key, lines):
+        """
+        Writes lines only the first time key is given, so that ruby objects
+        shared by several calls (e.g. component definitions) are created once
+        per script.
+
+        Returns
+        -------
+        bool
+            True if lines were written. None when rendering in parallel (see
+            parallel.FragmentWriter), so drawing functions must not depend
+            on it
+
+        """
+        if key in self.definitions:
+            return False
+        self.definitions.add(key)
+        self.write_lines(lines)
+        self.persist(key)
+        return True
+
+    # Hooks of sharded output (see ShardedWriter), without effect on a
+    # single script
+
+    def persist(self, variable):
+        """
+        Declares the ruby variable as used by later calls.
+        """
+
+    def split_point(self):
+        """
+        Marks the start of a drawing call, where the script may be split.
+        """
+
+    def new_part(self, layer = ''):
+        """
+        Starts a new part of the script, loaded with layer.
+        """
+
+    def format_block(self, template, values):
+        """
+        Formats every row of values with template and returns the
+        concatenated text.
+
+        Parameters
+        ----------
+        template : str
+            printf-style template with one placeholder per column of values:
+            %s for coordinates in model units, written with the precision of
+            the writer, %r for values written exactly (scales, angles, unit
+            vectors) and %d for integers
+        values : np.ndarray
+            N-by-M array, or 1-by-M array for a single row
+
+        Returns
+        -------
+        str
+            Text of all formatted rows
+
+        """
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values.reshape(1, -1)
+        if values.shape[0] == 0:
+            return ''
+        if self.decimals is not None:
+            template = template.replace('%s', self.number_format)
+        return (template * values.shape[0]) % tuple(values.ravel().tolist())
+
+    def format_rows(self, template, values):
+        """
+        Same as format_block, but returns the list of formatted rows.
+        """
+        return self.format_block(template + '\0', values).split('\0')[:-1]
+
+    def write_block(self, template, values):
+        self.write(self.format_block(template, values))
+
+    def write_array(self, variable, template, values,
+                    rows_per_line = ARRAY_ROWS_PER_LINE, append = False):
+        """
+        Writes the rows of values as one flat ruby array assigned to variable.
+        The array is built by successive concat statements of rows_per_line
+        rows each, which keeps every line of the script short.
+
+        Parameters
+        ----------
+        variable : str
+            Name of the ruby variable
+        template : str
+            Template of one row without separator, e.g. '%s,%s,%s'
+        values : np.ndarray
+            N-by-M array of values
+        append : bool (optional)
+            Appends the rows to an existing array instead of creating it, to
+            write an array chunk by chunk
+
+        """
+        if not append:
+            self.write(variable + ' = []\n')
+        for start in range(0, values.shape[0], rows_per_line):
+            self.write(variable + '.concat([' \
+                + self.format_block(template + ',',
+                                    values[start:start + rows_per_line])[:-1] \
+                + '])\n')
+
+    def flush(self):
+        if self._chunks:
+            self.file.write(''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+class ShardedWriter(ScriptWriter):
+    """
+    Writer splitting the generated script into part files of about
+    shard_size characters each, returned by ruby_create when shard_size is
+    given. Parts are only split between two drawing calls. On close, a
+    manifest script is written at path, which loads the parts in order.
+
+    Ruby locals do not cross files, so the variables shared by several calls
+    (see persist) are stored in a global hash and bound again at the top of
+    every part, and an error in one part does not stop the others.
+
+    Parts can be given a layer (see new_part). The manifest loads the parts
+    of all layers, or only the layers listed in its ruby_lib_layers array,
+    parts without a layer being always loaded. A shared definition made in
+    a part with a layer is thus made again in the parts of other layers
+    using it, guarded so that it is created once when both are loaded.
+
+    Parameters
+    ----------
+    path : str
+        Path of the manifest script. Parts are written next to it, with
+        suffixes _part0001.rb, _part0002.rb...
+    shard_size : int
+        Number of characters after which a new part is started
+    buffer_size, decimals, validate
+        See ScriptWriter
+
+    """
+
+    def __init__(self, path, shard_size, buffer_size = BUFFER_SIZE,
+                 decimals = None, validate = True):
+        if not isinstance(shard_size, int) or shard_size <= 0:
+            raise ValueError('Error in ShardedWriter. ',
+                             'shard_size must be a strictly positive integer')
+
+        self.path = path
+        self.shard_size = shard_size
+        self.parts = []
+        self.persistent = []
+        self.layer = ''
+        # Layers of the parts holding each definition (see define_once)
+        self.defined_in = {}
+        self._part_size = 0
+        ScriptWriter.__init__(self, self._open_part(''), buffer_size,
+                              decimals, validate)
+        self.name = path
+        self.write(SHARED_VARIABLES + ' = {}\n')
+
+    def _open_part(self, layer):
+        """
+        Registers the next part in the manifest and opens it.
+        """
+        base = os.path.splitext(self.path)[0]
+        part = base + '_part%04d.rb' % (len(self.parts) + 1)
+        self.parts.append((os.path.basename(part), layer))
+        return open(part, 'w')
+
+    def _prologue(self):
+        return ''.join([variable + ' = ' + SHARED_VARIABLES + '[:' + variable \
+                        + ']\n' for variable in self.persistent])
+
+    def write(self, text):
+        self._part_size += len(text)
+        ScriptWriter.write(self, text)
+
+    def define_once(self, key, lines):
+        """
+        Writes lines the first time key is given in the parts of the current
+        layer, unless a part without a layer already holds them.
+        """
+        layers = self.defined_in.setdefault(key, set())
+        if '' in layers or self.layer in layers:
+            return False
+        if layers:
+            # Only defined in the parts of other layers, possibly not loaded
+            lines = guarded(key, lines)
+        layers.add(self.layer)
+        self.definitions.add(key)
+        self.write_lines(lines)
+        self.persist(key)
+        return True
+
+    def persist(self, variable):
+        """
+        Stores the ruby variable in the shared hash, to bind it again in the
+        next parts.
+        """
+        if variable not in self.persistent:
+            self.persistent.append(variable)
+            self.write(SHARED_VARIABLES + '[:' + variable + '] = ' + variable \
+                       + '\n')
+
+    def split_point(self):
+        """
+        Starts a new part if the current one has reached shard_size.
+        """
+        if self._part_size >= self.shard_size:
+            self.new_part(self.layer)
+
+    def new_part(self, layer = ''):
+        """
+        Starts a new part, loaded with the given layer. The following parts
+        keep that layer until the next call.
+        """
+        self.layer = layer
+        if self._part_size == 0:
+            # Nothing written yet to the current part
+            self.parts[-1] = (self.parts[-1][0], layer)
+            return
+
+        self.flush()
+        self.file.close()
+        self.file = self._open_part(layer)
+        self.write(self._prologue())
+        self._part_size = 0
+
+    def reserve_part(self, layer = ''):
+        """
+        Reserves the next part of the script for a separate writer and
+        returns it. It can be filled concurrently with this writer, e.g. from
+        another thread, and must be closed before this writer.
+
+        Returns
+        -------
+        ScriptWriter
+            Writer of the reserved part
+
+        """
+        self.flush()
+        self.file.close()
+        if self._part_size == 0:
+            # The reserved part replaces the current one, still empty
+            os.remove(self.file.name)
+            self.parts.pop()
+        part = _ReservedPart(self._open_part(layer), self.buffer_size,
+                             self.decimals, self.validate)
+        part.origin = self.origin
+        part.write(self._prologue())
+        self.file = self._open_part(self.layer)
+        self.write(self._prologue())
+        self._part_size = 0
+        return part
+
+    def close(self):
+        ScriptWriter.close(self)
+
+        with open(self.path, 'w') as manifest:
+            manifest.write('\n'.join([
+                '# Loads the parts of the script in order. To load only some',
+                '# layers, list them in ruby_lib_layers, e.g. [\'ellipsoids\']',
+                'ruby_lib_layers = []',
+                'ruby_lib_dir = File.dirname(__FILE__)',
+                '[' + ',\n '.join(['[\'' + part + '\', \'' + layer + '\']'
+                                   for part, layer in self.parts]) \
+                    + '].each {|part, layer|',
+                'if layer == \'\' or ruby_lib_layers.empty? ' \
+                    + 'or ruby_lib_layers.include?(layer)',
+                'begin',
+                'load File.join(ruby_lib_dir, part)',
+                'rescue Exception => e',
+                'puts \'Error in \' + part + \': \' + e.message',
+                'end',
+                'end}',
+                '']))
+
+class _ReservedPart(ScriptWriter):
+    """
+    Writer of a part reserved by ShardedWriter.reserve_part. The parts loaded
+    before it are not known when it is filled, so its shared definitions are
+    all guarded.
+    """
+
+    def define_once(self, key, lines):
+        if key in self.definitions:
+            return False
+        self.definitions.add(key)
+        self.write_lines(guarded(key, lines))
+        return True
+
+def guarded(key, lines):
+    """
+    Returns the lines of the shared definition of the ruby variable key, made
+    only if it is not bound yet and stored in the shared hash of
+    ShardedWriter.
+    """
+    shared = SHARED_VARIABLES + '[:' + key + ']'
+    return ['if ' + shared + '.nil?'] + lines \
+        + [shared + ' = ' + key, 'end', key + ' = ' + shared]
+
+def decimals_for_tolerance(tolerance):
+    """
+    Returns the smallest number of decimals for which rounding a value
+    changes it by at most half of tolerance.
+
+    Parameters
+    ----------
+    tolerance : float
+        Largest admissible spacing between two written values, strictly
+        positive
+
+    Returns
+    -------
+    int
+        Number of decimals
+
+    """
+    if not tolerance > 0:
+        raise ValueError('Error in decimals_for_tolerance. ',
+                         'tolerance must be strictly positive')
+
+    return max(0, math.ceil(-math.log10(tolerance) - 1e-9))